@@ -3,46 +3,75 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, current_user
 from flask_cors import CORS  # 导入CORS
 from models import User, UserCode, ErrorCode, Problem, Submission, SubmissionStatus, SimulationResult
-from exts import db
+from models import ProblemStats, VerdictCache
+from exts import db, migrate, database_uri, engine_options
+from flask_migrate import upgrade
 from models import BASE_DIR, PROB_DIR, login_required
-from app_submit.run_sim import simulation_queue, simulation_worker
+from app_submit.run_sim import run_judge
+from app_submit.events import event_relay
+from app_submit.job_queue import job_signal
+from app_submit.golden import record_all as record_golden_traces
+from app_submit.problem_stats import ensure_stats
 import threading
-import atexit
+import os
 
 
 def load_config(app):
-    CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "http://localhost:1234"], "supports_credentials": True}})
+    # 按需生成波形时波形接口返回 202，客户端按 Retry-After 重新请求
+    CORS(app, resources={r"/*": {"origins": ["http://localhost:5173", "http://localhost:1234"], "supports_credentials": True,
+                                 "expose_headers": ["Retry-After"]}})
     app.secret_key = 'verilog-oj-secret-key'
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///example.db'  # 使用 SQLite 数据库
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri()  # 数据库地址（DATABASE_URL），默认使用 SQLite
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])  # 连接池配置
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-app = Flask(__name__)
-load_config(app)
-db.init_app(app)
+    app.config['JUDGE_WORKERS'] = int(os.environ.get('JUDGE_WORKERS', os.cpu_count() or 1))  # 判题进程数，0 为本机不判题（只由远程判题节点判题）
+    app.config['JUDGE_NODE_TOKEN'] = os.environ.get('JUDGE_NODE_TOKEN', '')  # 远程判题节点令牌，为空时不开放节点接口
+    app.config['SUBMIT_RATE_PER_MINUTE'] = float(os.environ.get('SUBMIT_RATE_PER_MINUTE', 6))  # 每个用户每分钟可提交次数，0 为不限制
+    app.config['SUBMIT_BURST'] = int(os.environ.get('SUBMIT_BURST', 5))  # 每个用户可连续提交的次数
+    app.config['JUDGE_WAVEFORM'] = os.environ.get('JUDGE_WAVEFORM', 'on_demand')  # 波形输出：on_demand 按需重新仿真生成，always 每次判题都保存
+    app.config['JUDGE_PREWARM'] = os.environ.get('JUDGE_PREWARM', '1') != '0'  # 判题进程启动时预热题目配置与工作目录
+    app.config['CHECK_WORKERS'] = int(os.environ.get('CHECK_WORKERS', 2))  # 语法检查同时编译数
+    app.config['CHECK_RATE_PER_MINUTE'] = float(os.environ.get('CHECK_RATE_PER_MINUTE', 30))  # 每个用户每分钟可检查次数，0 为不限制
+    app.config['CHECK_BURST'] = int(os.environ.get('CHECK_BURST', 10))  # 每个用户可连续检查的次数
 
 # 初始化登录管理
 login_manager = LoginManager()
 login_manager.login_view = '/user/login'
-login_manager.init_app(app)
 
 @login_manager.user_loader
 def loaduser(user_id):
     return User.query.get(int(user_id))
 
-from app_auth.routes import user_bp
-from app_problem.routes import problem_bp
-from app_submit.routes import submit_bp
-from app_learningPath.routes import learningPath_bp
-from app_admin.routes import admin_bp  # 导入管理员蓝图
-app.register_blueprint(user_bp, url_prefix='/user')
-app.register_blueprint(problem_bp, url_prefix='/problem')
-app.register_blueprint(submit_bp, url_prefix='/submission')
-app.register_blueprint(learningPath_bp, url_prefix='/learningPath')
-app.register_blueprint(admin_bp, url_prefix='/admin')  # 注册管理员蓝图
+def create_app():
+    """
+    创建 Web 应用（不启动任何后台线程或进程，可由 gunicorn 等以多进程运行，见 wsgi.py）
+    判题端单独运行（python manage.py judge），两者只通过数据库中的判题任务与状态事件联系
+    """
+    app = Flask(__name__)
+    load_config(app)
+    db.init_app(app)
+    migrate.init_app(app, db, directory=str(BASE_DIR / 'migrations'))
+    login_manager.init_app(app)
+
+    from app_auth.routes import user_bp
+    from app_problem.routes import problem_bp
+    from app_submit.routes import submit_bp
+    from app_learningPath.routes import learningPath_bp
+    from app_admin.routes import admin_bp  # 导入管理员蓝图
+    from app_judge.routes import judge_bp
+    app.register_blueprint(user_bp, url_prefix='/user')
+    app.register_blueprint(problem_bp, url_prefix='/problem')
+    app.register_blueprint(submit_bp, url_prefix='/submission')
+    app.register_blueprint(learningPath_bp, url_prefix='/learningPath')
+    app.register_blueprint(admin_bp, url_prefix='/admin')  # 注册管理员蓝图
+    app.register_blueprint(judge_bp, url_prefix='/judge')  # 远程判题节点接口
+
+    @app.before_request
+    def start_event_relay():
+        # 每个 Web 进程在处理第一个请求时启动状态事件转发线程（fork 出的工作进程各自启动）
+        event_relay.ensure_started(app, on_enqueue=job_signal.notify)
 
-# 启动后台线程并传递 app 实例
-simulation_thread = threading.Thread(target=simulation_worker, args=(app,), daemon=True)
-simulation_thread.start()
+    return app
 
 # ---------- 更新Prob数据库 ----------
 def updateProblems():
@@ -146,19 +175,39 @@ def updateProblems():
             
     # 处理已删除的题目
     deleted_ids = set(existing_problems.keys()) - current_ids
+    # 仍有提交或草稿的题目保留数据库记录（外键引用），可在管理界面删除
+    referenced = {pid for (pid,) in db.session.query(Submission.problem_id).filter(
+        Submission.problem_id.in_(deleted_ids)).distinct()}
+    referenced |= {pid for (pid,) in db.session.query(UserCode.problem_id).filter(
+        UserCode.problem_id.in_(deleted_ids)).distinct()}
+    for prob_id in sorted(referenced):
+        print(f"题目 {prob_id} 的文件夹已不存在，但仍有提交记录，保留数据库记录")
+    deleted_ids -= referenced
     if deleted_ids:
+        for model in (ProblemStats, VerdictCache):
+            model.query.filter(model.problem_id.in_(deleted_ids)).delete(synchronize_session=False)
         Problem.query.filter(Problem.id.in_(deleted_ids)).delete(
             synchronize_session=False)
     db.session.commit()
+    # 参考波形模式的题目在导入时录制参考输出
+    record_golden_traces(PROB_DIR)
+
+def prepare_database():
+    """升级表结构（旧版本用 create_all 建立的数据库会补齐缺少的表与索引），导入题目并补齐统计"""
+    upgrade()
+    updateProblems()
+    ensure_stats()
 
 if __name__=='__main__':
+    # 开发时单进程运行：Web 应用 + 后台线程中的判题端
+    app = create_app()
     with app.app_context():
-        db.create_all()
-        updateProblems()
-    app.run(host='0.0.0.0', port=5000)  # 修改为监听所有地址
-
-@atexit.register
-def cleanup():
-    """清理后台线程"""
-    simulation_queue.put(None)  # 向队列发送结束信号
-    simulation_thread.join()
\ No newline at end of file
+        prepare_database()
+    stop = threading.Event()
+    judge_thread = threading.Thread(target=run_judge, args=(app, app.config['JUDGE_WORKERS'], stop), daemon=True)
+    judge_thread.start()
+    try:
+        app.run(host='0.0.0.0', port=5000)  # 修改为监听所有地址
+    finally:
+        stop.set()
+        judge_thread.join()
@@ -1,11 +1,22 @@
 from flask import Blueprint, request, jsonify
 from flask_cors import CORS
 from flask_login import current_user
-from models import User, Problem, db, login_required, admin_required
+from sqlalchemy import select
+from models import (User, UserCode, Problem, Submission, JudgeJob, JudgeMetrics, JudgeCase, VerdictCache, ProblemStats,
+                    UserProblemStatus, WaveformJob, db, login_required, admin_required)
+from app_submit.problem_stats import rebuild_stats
 
 admin_bp = Blueprint('admin', __name__)
 CORS(admin_bp, resources={r"/*": {"origins": "http://localhost:5173", "supports_credentials": True}})
 
+
+def _delete_submissions(criterion):
+    """删除符合条件的提交及其判题记录（PostgreSQL 会检查外键，删除用户或题目前需要先删除引用它们的记录）"""
+    ids = select(Submission.id).where(criterion)
+    for model in (JudgeJob, JudgeMetrics, JudgeCase, WaveformJob):
+        model.query.filter(model.submission_id.in_(ids)).delete(synchronize_session=False)
+    Submission.query.filter(criterion).delete(synchronize_session=False)
+
 # 获取所有用户
 @admin_bp.route('/user', methods=['GET'])
 @login_required
@@ -105,8 +116,12 @@ def delete_user(user_id):
             }), 403
     
     try:
+        UserProblemStatus.query.filter_by(user_id=user_id).delete()
+        UserCode.query.filter_by(user_id=user_id).delete()
+        _delete_submissions(Submission.user_id == user_id)
         db.session.delete(user)
-        db.session.commit()
+        # 题目统计随提交一起更新，并提交事务
+        rebuild_stats()
         return jsonify({"status": "success"})
     except Exception as e:
         db.session.rollback()
@@ -175,6 +190,11 @@ def update_problem(problem_id):
 def delete_problem(problem_id):
     problem = Problem.query.get_or_404(problem_id)
     try:
+        ProblemStats.query.filter_by(problem_id=problem_id).delete()
+        UserProblemStatus.query.filter_by(problem_id=problem_id).delete()
+        UserCode.query.filter_by(problem_id=problem_id).delete()
+        VerdictCache.query.filter_by(problem_id=problem_id).delete()
+        _delete_submissions(Submission.problem_id == problem_id)
         db.session.delete(problem)
         db.session.commit()
         return jsonify({"status": "success"})
@@ -10,6 +10,9 @@ from exts import db
 import os
 from pathlib import Path
 from models import BASE_DIR, PROB_DIR
+from app_submit.waveform import read_waveform_text
+from app_submit.run_sim import ensure_waveform
+from app_submit.waveform_jobs import WaveformPending
 
 from .deepseek_api import deepseek_api
 
@@ -88,16 +91,23 @@ def analyze_submission(submission_id):
         else:
             log_content = "日志文件不存在"
             
-        # 获取波形内容（可选）
-        if submission.waveform_path and os.path.exists(BASE_DIR / submission.waveform_path):
+        # 获取波形内容（可选，判题时未保存波形的提交在此请求判题端生成，生成期间不等待）
+        waveform_content = "波形文件不存在"
+        try:
+            waveform_path = ensure_waveform(submission)
+        except WaveformPending:
+            waveform_path = None
+            waveform_content = "波形正在生成"
+        except Exception as e:
+            db.session.rollback()
+            print(f"生成波形失败: {e}")
+            waveform_path = None
+        if waveform_path:
             try:
-                with open(BASE_DIR / submission.waveform_path, 'r', encoding='utf-8') as f:
-                    waveform_content = f.read()
+                waveform_content = read_waveform_text(BASE_DIR / waveform_path)
             except Exception as e:
                 print(f"读取波形失败: {e}")
                 waveform_content = "无法读取波形"
-        else:
-            waveform_content = "波形文件不存在"
             
         # 调用AI分析
         analysis_result = deepseek_api.analyze_code(
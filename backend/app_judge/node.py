@@ -0,0 +1,257 @@
+"""
+远程判题节点
+独立于 Web 应用运行的判题进程，可部署在其他机器上扩充判题能力：
+python manage.py judge-node --server http://web-host:5000 --token <JUDGE_NODE_TOKEN> --workers 4
+每个节点进程循环执行：长轮询领取任务 → 按工程哈希取得题目工程（本地缓存，缺失时下载）→
+在本机仿真（与 Web 应用所在机器上的判题进程使用相同的 run_sim.execute）→ 上传压缩的日志与波形 → 回报判定与耗时。
+判题期间通过心跳续约；节点退出或失联时租约过期，任务由 Web 应用重新排队。
+节点不访问数据库，只需要仿真工具与本项目代码。
+"""
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import shutil
+import tarfile
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from pathlib import Path
+import click
+from models import BASE_DIR, ErrorCode
+from app_submit import verdict_cache
+from app_submit.job_queue import LeaseKeeper, worker_identity
+from app_submit.metrics import RunMetrics
+from app_submit.run_sim import execute
+from app_submit.waveform import index_path_for
+from app_submit.workspace import default_scratch_root
+
+# 领取任务时的长轮询时间（秒）
+CLAIM_WAIT_SECONDS = 20
+# 连接 Web 应用失败后的最长重试间隔（秒）
+MAX_BACKOFF_SECONDS = 30
+# 题目工程缓存目录（同一台机器上的节点进程共用）
+DEFAULT_CACHE_DIR = BASE_DIR / "sub_data" / "node_packages"
+
+
+class LeaseLost(Exception):
+    """任务租约已失效"""
+
+
+class NodeClient:
+    """判题节点协议的 HTTP 客户端"""
+
+    def __init__(self, server, token, timeout=30):
+        self.server = server.rstrip("/")
+        self.token = token
+        self.timeout = timeout
+
+    def _request(self, method, path, payload=None, body=None, timeout=None):
+        """
+        :return: (状态码, 响应头, 响应内容)
+        :raises urllib.error.URLError: 无法连接
+        :raises urllib.error.HTTPError: 除 409 以外的错误状态码
+        """
+        headers = {"Authorization": f"Bearer {self.token}"}
+        if payload is not None:
+            body = json.dumps(payload).encode("utf-8")
+            headers["Content-Type"] = "application/json"
+        elif body is not None:
+            headers["Content-Type"] = "application/octet-stream"
+        request = urllib.request.Request(self.server + path, data=body, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            if e.code == 409:
+                raise LeaseLost() from e
+            raise
+
+    def claim(self, node, wait=CLAIM_WAIT_SECONDS):
+        """领取任务，没有任务时返回 None"""
+        status, _, content = self._request("POST", "/judge/claim", {"node": node, "wait": wait},
+                                           timeout=wait + self.timeout)
+        return json.loads(content) if status == 200 else None
+
+    def heartbeat(self, job_id, node):
+        try:
+            self._request("POST", f"/judge/jobs/{job_id}/heartbeat", {"node": node})
+            return True
+        except LeaseLost:
+            return False
+
+    def package(self, problem_id):
+        """下载题目工程，返回 (工程哈希, tar.gz 内容)"""
+        _, headers, content = self._request("GET", f"/judge/problems/{problem_id}/package")
+        return headers.get("X-Project-Hash"), content
+
+    def upload(self, job_id, node, name, content):
+        query = urllib.parse.urlencode({"node": node})
+        self._request("PUT", f"/judge/jobs/{job_id}/artifacts/{name}?{query}", body=content)
+
+    def report(self, job_id, payload):
+        self._request("POST", f"/judge/jobs/{job_id}/result", payload)
+
+
+class PackageCache:
+    """按工程哈希缓存题目工程，同一台机器上的多个节点进程可共用"""
+
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def project_dir(self, client, problem_id, digest):
+        """
+        返回工程哈希对应的题目工程目录，本地没有时下载
+        :return: (工程目录, 工程哈希)，题目工程在领取任务后被更新时哈希与 digest 不同
+        :raises ValueError: 下载的工程与声明的哈希不一致
+        """
+        path = self.root / digest / "project"
+        if path.is_dir():
+            return path, digest
+        digest, content = client.package(problem_id)
+        path = self.root / digest / "project"
+        if path.is_dir():
+            return path, digest
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp = self.root / f"{digest}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        try:
+            with tarfile.open(fileobj=io.BytesIO(content), mode="r:gz") as tar:
+                tar.extractall(tmp, filter="data")
+            actual = verdict_cache.project_hash(tmp / "project")
+            if actual != digest:
+                raise ValueError(f"题目工程 {problem_id} 的哈希不一致: {actual} != {digest}")
+            try:
+                os.rename(tmp, self.root / digest)
+            except OSError:
+                # 其他节点进程已放置相同的工程
+                if not path.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+        return path, digest
+
+
+class RemoteLeaseKeeper(LeaseKeeper):
+    """通过 HTTP 心跳续约"""
+
+    def __init__(self, client, job_id, node, interval):
+        super().__init__(None, job_id, node, interval)
+        self._client = client
+
+    def _renew(self):
+        return self._client.heartbeat(self._job_id, self._owner)
+
+
+class JudgeNode:
+    """一个判题节点进程"""
+
+    def __init__(self, client, name, cache):
+        self.client = client
+        self.name = name
+        self.cache = cache
+        self.staging = default_scratch_root() / f"node-{os.getpid()}"
+
+    def run(self):
+        """循环领取并执行任务，连接失败时退避重试"""
+        print(f"判题节点 {self.name} 已启动，服务器: {self.client.server}")
+        backoff = 1
+        while True:
+            try:
+                job = self.client.claim(self.name)
+                backoff = 1
+            except (urllib.error.URLError, OSError, ValueError) as e:
+                print(f"判题节点 {self.name} 领取任务失败: {e}，{backoff} 秒后重试")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+                continue
+            if job is None:
+                continue
+            try:
+                self.process(job)
+            except LeaseLost:
+                print(f"判题任务 {job['job_id']} 的租约已失效，丢弃结果")
+            except (urllib.error.URLError, OSError) as e:
+                # 未能回报的任务在租约过期后由 Web 应用重新排队
+                print(f"判题任务 {job['job_id']} 回报失败: {e}")
+
+    def process(self, job):
+        """执行一个任务并回报结果"""
+        job_id, submission_id = job["job_id"], job["submission_id"]
+        print(f"判题节点 {self.name} 开始仿真任务: {submission_id}")
+        metrics = RunMetrics()
+        shutil.rmtree(self.staging, ignore_errors=True)
+        with RemoteLeaseKeeper(self.client, job_id, self.name, job["heartbeat_interval"]):
+            try:
+                with metrics.phase("setup"):
+                    project_dir, digest = self.cache.project_dir(self.client, job["problem_id"], job["digest"])
+                result = execute(project_dir, digest, job["code"], self.staging, submission_id,
+                                 job["waveform"], metrics)
+            except Exception as e:
+                print(f"判题任务 {job_id} 执行失败: {e}")
+                digest = None
+                result = None
+            try:
+                if result is not None and result.log_path:
+                    with open(result.log_path, "rb") as f:
+                        self.client.upload(job_id, self.name, "log", gzip.compress(f.read()))
+                if result is not None and result.waveform_path:
+                    self.client.upload(job_id, self.name, "waveform", Path(result.waveform_path).read_bytes())
+                    self.client.upload(job_id, self.name, "waveform_index",
+                                       index_path_for(result.waveform_path).read_bytes())
+            finally:
+                shutil.rmtree(self.staging, ignore_errors=True)
+        self.client.report(job_id, {
+            "node": self.name,
+            "digest": digest,
+            "error_code": result.error_code.name if result is not None else ErrorCode.ERROR_UNKNOWN.name,
+            "metrics": {**metrics.as_dict(), "total_ms": round(metrics.total_ms)},
+            "cases": [run.to_dict() for run in result.cases] if result is not None and result.cases else None,
+        })
+        print(f"判题节点 {self.name} 完成仿真任务: {submission_id}, 结果: "
+              f"{result.error_code.name if result is not None else ErrorCode.ERROR_UNKNOWN.name}")
+
+
+def _node_main(server, token, worker_id, cache_dir):
+    client = NodeClient(server, token)
+    JudgeNode(client, worker_identity(worker_id), PackageCache(cache_dir)).run()
+
+
+def run_nodes(server, token, workers, cache_dir):
+    """启动 workers 个判题节点进程并等待，意外退出的进程会被重启"""
+    ctx = multiprocessing.get_context('spawn')
+
+    def spawn(worker_id):
+        process = ctx.Process(target=_node_main, args=(server, token, worker_id, cache_dir),
+                              name=f"judge-node-{worker_id}", daemon=True)
+        process.start()
+        return process
+
+    processes = [spawn(i) for i in range(workers)]
+    try:
+        while True:
+            time.sleep(1)
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    print(f"判题节点进程 {i} 已退出 (exitcode={process.exitcode})，正在重启")
+                    processes[i] = spawn(i)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(5)
+
+
+@click.command('judge-node')
+@click.option('--server', envvar='JUDGE_SERVER', required=True, help='Web 应用地址，如 http://127.0.0.1:5000')
+@click.option('--token', envvar='JUDGE_NODE_TOKEN', required=True, help='判题节点令牌（与 Web 应用的 JUDGE_NODE_TOKEN 相同）')
+@click.option('--workers', type=int, default=os.cpu_count() or 1, show_default=True, help='节点进程数')
+@click.option('--cache-dir', default=str(DEFAULT_CACHE_DIR), show_default=True, help='题目工程缓存目录')
+def judge_node_command(server, token, workers, cache_dir):
+    """作为远程判题节点运行：从 Web 应用领取任务并在本机仿真"""
+    run_nodes(server, token, max(1, workers), cache_dir)
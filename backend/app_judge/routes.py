@@ -0,0 +1,318 @@
+"""
+远程判题节点接口
+判题节点（manage.py judge-node，见 node.py）通过 HTTP 从 Web 应用领取任务、按工程哈希下载题目工程，
+在本机仿真后上传压缩的日志与波形并回报判定与耗时。任务仍由 JudgeJob 表的租约管理：
+节点失联后租约过期，任务由 Web 应用重新排队，与本机判题进程崩溃时相同。
+所有接口需要在请求头 Authorization: Bearer <JUDGE_NODE_TOKEN> 中携带节点令牌，未配置令牌时不开放。
+"""
+import gzip
+import hashlib
+import hmac
+import io
+import os
+import shutil
+import tarfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import Blueprint, request, jsonify, current_app, Response
+from exts import db
+from models import BASE_DIR, PROB_DIR, Problem, Submission, SimulationResult, ErrorCode, JudgeJob, JudgeJobStatus
+from app_submit import verdict_cache
+from app_submit.cases import CaseRun
+from app_submit.metrics import RunMetrics
+from app_submit.job_queue import claim_next_job, renew_lease, finish_job, job_signal, LEASE_SECONDS, HEARTBEAT_INTERVAL
+from app_submit.run_sim import (start_submission, apply_result, commit_result, quick_verdict, default_waveform,
+                                remove_waveform)
+from app_submit.waveform import index_path_for
+
+judge_bp = Blueprint('judge', __name__)
+
+# 领取任务时最长等待（长轮询）的时间（秒）；等待期间占用一个 Web 工作线程，与节点默认的等待时间相同
+MAX_WAIT_SECONDS = 20
+# 单个上传文件的大小上限（解压后）
+MAX_ARTIFACT_BYTES = 64 * 1024 * 1024
+# 内存中缓存的题目工程包数量
+PACKAGE_CACHE_SIZE = 16
+# 节点上传的产物暂存目录，回报结果时移入 sub_data
+INCOMING_DIR = BASE_DIR / "sub_data" / "incoming"
+# 可上传的产物：log 为 gzip 压缩的日志，waveform/waveform_index 为 store_waveform 生成的分块压缩波形及索引
+ARTIFACTS = ("log", "waveform", "waveform_index")
+
+_packages = OrderedDict()   # {工程哈希: tar.gz 内容}
+_packages_lock = threading.Lock()
+
+
+def node_required(func):
+    """校验判题节点令牌"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        token = current_app.config.get('JUDGE_NODE_TOKEN')
+        if not token:
+            return jsonify({"error": "未启用远程判题节点"}), 403
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied.encode('utf-8'), f"Bearer {token}".encode('utf-8')):
+            return jsonify({"error": "判题节点令牌无效"}), 401
+        return func(*args, **kwargs)
+    return wrapper
+
+
+def _node_name(value):
+    return str(value or "")[:100]
+
+
+def _leased_job(job_id, node):
+    """仍由 node 持有租约的任务，否则返回 None"""
+    return JudgeJob.query.filter_by(id=job_id, lease_owner=node, status=JudgeJobStatus.LEASED).first()
+
+
+def _project_dir(problem):
+    return PROB_DIR / problem.folder_path / "project" if problem else None
+
+
+def _prepare_job(job, node):
+    """
+    将领取到的任务标记为运行中；编译前检查未通过或命中判题缓存时直接在 Web 进程中给出结果
+    :return: 需要节点仿真时返回任务内容，否则返回 None
+    """
+    lease = (job.id, node)
+    submission = db.session.get(Submission, job.submission_id)
+    if submission is None:
+        finish_job(*lease)
+        db.session.commit()
+        return None
+    started_at = start_submission(submission)
+    project_dir = _project_dir(db.session.get(Problem, submission.problem_id))
+    metrics = RunMetrics()
+    if project_dir is None or not project_dir.exists():
+        result = SimulationResult()
+        result.error_code = ErrorCode.ERROR_UNKNOWN
+        result.metrics = metrics
+    else:
+        with metrics.phase("setup"):
+            digest = verdict_cache.project_hash(project_dir)
+        result = quick_verdict(submission, project_dir, digest, metrics)
+    if result is not None:
+        apply_result(submission, result, started_at, lease)
+        commit_result(submission, lease)
+        return None
+    return {
+        "job_id": job.id,
+        "submission_id": submission.id,
+        "problem_id": submission.problem_id,
+        "digest": digest,
+        "code": submission.code,
+        "waveform": default_waveform(),
+        "lease_seconds": LEASE_SECONDS,
+        "heartbeat_interval": HEARTBEAT_INTERVAL,
+    }
+
+
+# ---------- 领取任务 ----------
+@judge_bp.route('/claim', methods=['POST'])
+@node_required
+def claimJob():
+    """
+    领取下一个需要仿真的任务，没有任务时最多等待 wait 秒（长轮询）
+    请求体 {"node": 节点标识, "wait": 秒}；没有任务时返回 204
+    等待期间以及领取后的编译前检查、判题结果缓存查询都在处理该请求的 Web 工作线程中进行，
+    每个空闲的节点进程持续占用一个工作线程，部署时 Web 端的线程数应留出节点进程数的余量
+    """
+    data = request.get_json(silent=True) or {}
+    node = _node_name(data.get("node"))
+    if not node:
+        return jsonify({"error": "缺少节点标识"}), 400
+    try:
+        wait = min(max(float(data.get("wait") or 0), 0), MAX_WAIT_SECONDS)
+    except (TypeError, ValueError):
+        return jsonify({"error": "wait 应为数字"}), 400
+    deadline = time.monotonic() + wait
+    while True:
+        version = job_signal.version
+        job = claim_next_job(node)
+        if job is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return Response(status=204)
+            job_signal.wait(version, remaining)
+            continue
+        try:
+            payload = _prepare_job(job, node)
+        except Exception as e:
+            # 租约到期后任务会被重新排队
+            db.session.rollback()
+            print(f"判题节点 {node} 领取任务 {job.id} 失败: {e}")
+            continue
+        if payload is not None:
+            return jsonify(payload)
+
+
+# ---------- 续约 ----------
+@judge_bp.route('/jobs/<int:job_id>/heartbeat', methods=['POST'])
+@node_required
+def heartbeatJob(job_id):
+    """续约，租约已失效时返回 409，节点应放弃该任务"""
+    node = _node_name((request.get_json(silent=True) or {}).get("node"))
+    if not renew_lease(db.engine, job_id, node):
+        return jsonify({"error": "租约已失效"}), 409
+    return jsonify({"status": "success"})
+
+
+# ---------- 下载题目工程 ----------
+@judge_bp.route('/problems/<int:problem_id>/package', methods=['GET'])
+@node_required
+def getProblemPackage(problem_id):
+    """返回题目 project 目录的 tar.gz，响应头 X-Project-Hash 为工程哈希，节点按哈希缓存"""
+    project_dir = _project_dir(db.session.get(Problem, problem_id))
+    if project_dir is None or not project_dir.exists():
+        return jsonify({"error": "题目工程不存在"}), 404
+    digest = verdict_cache.project_hash(project_dir)
+    with _packages_lock:
+        content = _packages.get(digest)
+        if content is not None:
+            _packages.move_to_end(digest)
+    if content is None:
+        buffer = io.BytesIO()
+        with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+            tar.add(str(project_dir), arcname="project")
+        content = buffer.getvalue()
+        with _packages_lock:
+            _packages[digest] = content
+            while len(_packages) > PACKAGE_CACHE_SIZE:
+                _packages.popitem(last=False)
+    response = Response(content, mimetype="application/gzip")
+    response.headers['X-Project-Hash'] = digest
+    return response
+
+
+def _incoming_dir(job_id, node):
+    """节点上传产物的暂存目录；按节点区分，租约已转移时旧节点的上传不会与新节点混在一起"""
+    return INCOMING_DIR / f"job_{job_id}-{hashlib.sha1(node.encode('utf-8')).hexdigest()[:12]}"
+
+
+def _copy_limited(src, dest):
+    """复制上传内容，超过大小上限时返回 False"""
+    size = 0
+    with open(dest, "wb") as out:
+        while True:
+            chunk = src.read(64 * 1024)
+            if not chunk:
+                return True
+            size += len(chunk)
+            if size > MAX_ARTIFACT_BYTES:
+                return False
+            out.write(chunk)
+
+
+# ---------- 上传产物 ----------
+@judge_bp.route('/jobs/<int:job_id>/artifacts/<name>', methods=['PUT'])
+@node_required
+def uploadArtifact(job_id, name):
+    """上传任务的日志或波形（请求体为文件内容，查询参数 node 为节点标识），回报结果前有效"""
+    if name not in ARTIFACTS:
+        return jsonify({"error": "未知的产物类型"}), 404
+    if request.content_length and request.content_length > MAX_ARTIFACT_BYTES:
+        return jsonify({"error": "文件过大"}), 413
+    node = _node_name(request.args.get("node"))
+    if _leased_job(job_id, node) is None:
+        return jsonify({"error": "租约已失效"}), 409
+    db.session.remove()
+    incoming = _incoming_dir(job_id, node)
+    incoming.mkdir(parents=True, exist_ok=True)
+    dest = incoming / name
+    try:
+        if name == "log":
+            with gzip.GzipFile(fileobj=request.stream) as src:
+                ok = _copy_limited(src, dest)
+        else:
+            ok = _copy_limited(request.stream, dest)
+    except (OSError, EOFError):
+        dest.unlink(missing_ok=True)
+        return jsonify({"error": "文件内容无效"}), 400
+    if not ok:
+        dest.unlink(missing_ok=True)
+        return jsonify({"error": "文件过大"}), 413
+    return jsonify({"status": "success"})
+
+
+def _artifact_moves(job_id, node, submission_id):
+    """
+    暂存的产物及其在 sub_data 中的目标位置
+    :return: ([(暂存文件, 目标文件)], 日志路径, 波形路径)，路径相对 BASE_DIR，未上传时为空
+    """
+    incoming = _incoming_dir(job_id, node)
+    save_dir = BASE_DIR / "sub_data"
+    moves = []
+    log_path = waveform_path = ""
+    if (incoming / "log").exists():
+        dest_log = save_dir / f"sim_{submission_id}.log"
+        moves.append((incoming / "log", dest_log))
+        log_path = str(dest_log.relative_to(BASE_DIR))
+    if (incoming / "waveform").exists() and (incoming / "waveform_index").exists():
+        dest_vcd = save_dir / f"wave_{submission_id}.vcd.gz"
+        # 先替换波形再替换索引，与 store_waveform 一致
+        moves.append((incoming / "waveform", dest_vcd))
+        moves.append((incoming / "waveform_index", index_path_for(dest_vcd)))
+        waveform_path = str(dest_vcd.relative_to(BASE_DIR))
+    return moves, log_path, waveform_path
+
+
+def _move_artifacts(job_id, node, submission_id, moves, waveform):
+    """
+    结果提交后将暂存的产物替换到 sub_data（暂存目录与 sub_data 位于同一文件系统，os.replace 是原子的）
+    租约失效的节点不会执行到这里，其产物不会覆盖当前持有任务的节点的产物
+    """
+    for src, dest in moves:
+        os.replace(src, dest)
+    if not waveform and not any(dest.name.endswith(".vcd.gz") for _, dest in moves):
+        # 重新判题时删除上次判题保存的波形，查看时按本次结果重新生成
+        remove_waveform(BASE_DIR / "sub_data" / f"wave_{submission_id}.vcd.gz")
+    shutil.rmtree(_incoming_dir(job_id, node), ignore_errors=True)
+
+
+# ---------- 回报结果 ----------
+@judge_bp.route('/jobs/<int:job_id>/result', methods=['POST'])
+@node_required
+def reportResult(job_id):
+    """
+    回报判题结果并结束任务
+    请求体 {"node", "digest": 判题时的工程哈希, "error_code", "metrics": RunMetrics.as_dict() 与 total_ms,
+            "cases": [CaseRun.to_dict()] 或 null}
+    """
+    data = request.get_json(silent=True) or {}
+    node = _node_name(data.get("node"))
+    job = _leased_job(job_id, node)
+    if job is None:
+        shutil.rmtree(_incoming_dir(job_id, node), ignore_errors=True)
+        return jsonify({"error": "租约已失效"}), 409
+    try:
+        result = SimulationResult()
+        result.error_code = ErrorCode[data["error_code"]]
+        result.metrics = RunMetrics.from_dict(data.get("metrics") or {})
+        if data.get("cases") is not None:
+            result.cases = [CaseRun.from_dict(case) for case in data["cases"]]
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": f"结果格式错误: {e}"}), 400
+    submission = db.session.get(Submission, job.submission_id)
+    lease = (job_id, node)
+    if submission is None:
+        finish_job(*lease)
+        db.session.commit()
+        shutil.rmtree(_incoming_dir(job_id, node), ignore_errors=True)
+        return jsonify({"status": "success"})
+    moves, result.log_path, result.waveform_path = _artifact_moves(job_id, node, submission.id)
+    apply_result(submission, result, job.claimed_at or datetime.now(), lease)
+    if not commit_result(submission, lease):
+        shutil.rmtree(_incoming_dir(job_id, node), ignore_errors=True)
+        return jsonify({"error": "租约已失效"}), 409
+    (BASE_DIR / "sub_data").mkdir(parents=True, exist_ok=True)
+    _move_artifacts(job_id, node, submission.id, moves, default_waveform())
+    # 节点判题期间题目工程未变化时写入判题结果缓存
+    project_dir = _project_dir(db.session.get(Problem, submission.problem_id))
+    if project_dir is not None and project_dir.exists() \
+            and data.get("digest") == verdict_cache.project_hash(project_dir):
+        verdict_cache.store(submission.problem_id, data["digest"], verdict_cache.code_hash(submission.code),
+                            result, submission.id)
+    return jsonify({"status": "success"})
@@ -2,16 +2,25 @@ from flask import Blueprint, request, jsonify, url_for, send_from_directory
 from flask_login import login_user, logout_user, login_required, current_user
 from flask_cors import CORS
 from werkzeug.security import generate_password_hash, check_password_hash
-from models import User, UserCode, Problem, Submission, SubmissionStatus, login_required
+from models import User, UserCode, Problem, Submission, SubmissionStatus, UserProblemStatus, login_required, PROB_DIR
 from datetime import datetime
 from exts import db
-from app_submit.run_sim import simulation_queue
+from app_submit.run_sim import precheck_submission
+from app_submit.job_queue import enqueue_submission, coalesce_pending
+from app_submit.events import record_event
+from app_submit.scheduling import submit_limiter, check_limiter
+from app_submit.syntax_check import check_code, LaneBusy
+from app_submit.problem_stats import record_submission, load_stats, load_completion
 import re
 import os
 from pathlib import Path
 from flask import current_app, abort
 
 problem_bp = Blueprint('problem', __name__)
+# 尚无提交的题目的统计
+EMPTY_STATS = {"submitted_users_count": 0, "passed_users_count": 0, "attempts": 0, "avg_judge_ms": None}
+# 没有提交过的题目的完成状态
+NOT_STARTED = "未完成"
 CORS(problem_bp, resources={r"/*": {"origins": "http://localhost:5173", "supports_credentials": True}})
 
 
@@ -79,9 +88,20 @@ def submitSolution(id):
     """提交代码"""
     user_id = current_user.id
     code = request.get_json().get('code')
+    problem = Problem.query.get(id)
     # 验证存在性
-    if not (User.query.get(user_id)) or not (Problem.query.get(id)):
+    if not (User.query.get(user_id)) or not problem:
         return jsonify({"error": "用户或问题不存在"}), 404
+    # 按用户限制提交频率
+    retry_after = submit_limiter.acquire(
+        user_id,
+        current_app.config.get('SUBMIT_RATE_PER_MINUTE', 0),
+        current_app.config.get('SUBMIT_BURST', 0)
+    )
+    if retry_after:
+        response = jsonify({"error": f"提交过于频繁，请 {retry_after} 秒后再试", "retry_after": retry_after})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
     # 创建提交记录
     submission = Submission(
         user_id=user_id,
@@ -91,30 +111,83 @@ def submitSolution(id):
         created_at=datetime.now()
     )
     db.session.add(submission)
+    # 明显无法编译的代码直接给出编译错误，不进入判题队列
+    prechecked = precheck_submission(submission, problem)
+    # 更新题目统计与用户完成状态，与提交记录在同一事务中写入
+    record_submission(submission)
+    if prechecked:
+        record_event(submission.id, submission.status, submission.error_code)
+        db.session.commit()
+        return jsonify({
+            "status": "success",
+            "submission_id": submission.id
+            })
+    # 创建持久化判题任务，与提交记录在同一事务中写入
+    enqueue_submission(submission)
+    # 同一题目仍在排队的旧提交不再判题
+    cancelled = coalesce_pending(submission)
+    for cancelled_id in cancelled:
+        record_event(cancelled_id, SubmissionStatus.CANCELLED)
+    # 入队事件提交后由判题端读取并唤醒判题进程
+    record_event(submission.id, SubmissionStatus.QUEUED, user_id=user_id)
     db.session.commit()
-    # 将 submission_id 加入队列
     print(f"将提交ID {submission.id} 加入仿真队列")
-    simulation_queue.put(submission.id)
-    print(f"仿真队列大小: {simulation_queue.qsize()}")
     return jsonify({
         "status": "success",
         "submission_id": submission.id
         })
 
 
+# ---------- 语法检查（只编译不仿真） ----------
+@problem_bp.route('/<int:id>/check', methods=['POST'])
+@login_required
+def checkSyntax(id):
+    """只编译用户代码，返回编译诊断信息，不创建提交记录"""
+    user_id = current_user.id
+    code = request.get_json().get('code') or ""
+    problem = Problem.query.get(id)
+    if not problem:
+        return jsonify({"error": "问题不存在"}), 404
+    retry_after = check_limiter.acquire(
+        user_id,
+        current_app.config.get('CHECK_RATE_PER_MINUTE', 0),
+        current_app.config.get('CHECK_BURST', 0)
+    )
+    if retry_after:
+        response = jsonify({"error": f"检查过于频繁，请 {retry_after} 秒后再试", "retry_after": retry_after})
+        response.headers['Retry-After'] = str(retry_after)
+        return response, 429
+    project_dir = PROB_DIR / problem.folder_path / "project"
+    if not project_dir.exists():
+        return jsonify({"error": "题目工程不存在"}), 404
+    # 编译期间不占用数据库连接
+    db.session.remove()
+    try:
+        result = check_code(project_dir, code, current_app.config.get('CHECK_WORKERS', 2))
+    except LaneBusy:
+        response = jsonify({"error": "检查繁忙，请稍后再试", "retry_after": 1})
+        response.headers['Retry-After'] = '1'
+        return response, 503
+    except (OSError, ValueError) as e:
+        return jsonify({"error": f"编译环境不可用: {e}"}), 503
+    return jsonify({"status": "success", **result})
+
+
 # ---------- 获取Prob列表 ----------
 @problem_bp.route('/all', methods=['GET'])
 def getProblems():
     """获取问题列表，返回ID、标题、难度、标签、前置题目、后置题目以及用户是否完成解答（仅登录用户可见）"""
     user_id = current_user.id if current_user.is_authenticated else None
     problems = Problem.query.all()
+    # 各题目的统计（提交与判题时增量维护）
+    all_stats = load_stats()
+    # 用户对各题目的完成状态，仅在用户登录时查询
+    completion = load_completion(user_id) if user_id else {}
     # 构建响应数据结构
     problems_list = []
     for p in problems:
-        # 获取提交用户数和通过用户数
-        stats = get_problem_statistics(p.id)
-        # 检查用户是否完成解答，仅在用户登录时检查
-        is_completed = get_completion_status(user_id, p.id) if user_id else None
+        stats = all_stats.get(p.id, EMPTY_STATS)
+        is_completed = completion.get(p.id, NOT_STARTED) if user_id else None
         # 处理前置和后置题目
         pre_problems = process_problem_ids(p.pre_problems)
         next_problems = process_problem_ids(p.next_problems)
@@ -127,6 +200,8 @@ def getProblems():
             "next_problems": next_problems,  # 注意：普通用户接口中的 next_problems 是整数数组
             "submitted_users_count": stats["submitted_users_count"],
             "passed_users_count": stats["passed_users_count"],
+            "attempts": stats["attempts"],
+            "avg_judge_ms": stats["avg_judge_ms"],
             **({"is_completed": is_completed} if user_id else {})
         })
     return jsonify(problems_list)
@@ -189,13 +264,13 @@ def getUserCompletionStatus():
     if not User.query.get(user_id):
         return jsonify({"error": "用户不存在"}), 404
     problems = Problem.query.all()
+    completion = load_completion(user_id)
     # 构建响应数据结构
     completion_status_list = []
     for p in problems:
-        is_completed = get_completion_status(user_id, p.id)
         completion_status_list.append({
             "id": p.id,
-            "completion_status": is_completed
+            "completion_status": completion.get(p.id, NOT_STARTED)
         })
     return jsonify(completion_status_list)
 
@@ -234,45 +309,8 @@ def get_completion_status(user_id, problem_id):
     :param problem_id: 问题ID
     :return: 完成状态字符串（"已完成"、"失败"、"运行中"、"未完成"）
     """
-    success_submission = Submission.query.filter_by(
-        user_id=user_id,
-        problem_id=problem_id,
-        status=SubmissionStatus.SUCCESS
-    ).first()
-    if success_submission:
-        return "已完成"
-    latest_submission = Submission.query.filter_by(
-        user_id=user_id,
-        problem_id=problem_id
-    ).order_by(Submission.created_at.desc()).first()
-    if latest_submission:
-        if latest_submission.status == SubmissionStatus.FAILED:
-            return "失败"
-        elif latest_submission.status in [SubmissionStatus.QUEUED, SubmissionStatus.RUNNING]:
-            return "运行中"
-    return "未完成"
-
-def get_problem_statistics(problem_id):
-    """
-    获取某个问题的统计信息。
-    :param problem_id: 问题ID
-    :return: 一个字典，包含提交用户数和通过用户数
-    """
-    # 获取提交了该问题的用户数（去重）
-    submitted_users_count = db.session.query(Submission.user_id).filter_by(
-        problem_id=problem_id
-    ).distinct().count()
-
-    # 获取通过了该问题的用户数（去重）
-    passed_users_count = db.session.query(Submission.user_id).filter_by(
-        problem_id=problem_id,
-        status=SubmissionStatus.SUCCESS
-    ).distinct().count()
-
-    return {
-        "submitted_users_count": submitted_users_count,
-        "passed_users_count": passed_users_count
-    }
+    status = db.session.get(UserProblemStatus, (user_id, problem_id))
+    return status.completion_status() if status else NOT_STARTED
 
 def process_tags(tags_str):
     """处理标签字符串，支持中英文逗号，并删除空格"""
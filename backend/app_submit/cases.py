@@ -0,0 +1,168 @@
+"""
+多测试用例
+题目可以在 project/judge.json 中声明多个测试用例（不同的测试平台或激励），每个用例单独编译、仿真并给出判定：
+    "cases": [
+        {"name": "basic", "file_list": "sim_file_list.f"},
+        {"name": "random", "file_list": "random_file_list.f", "defines": {"SEED": 7}, "timeout": 20, "hidden": true}
+    ],
+    "stop_on_failure": true
+字段：name 用例名；file_list 编译文件列表（默认 sim_file_list.f）；defines 编译时预定义的宏；
+timeout 超时时间（默认取题目的 timeout）；hidden 隐藏用例只公开判定与耗时，不公开日志和波形。
+未声明 cases 时题目只有一个用例，判题过程与单测试平台时相同。
+
+各用例在各自的工作目录中由判题进程的同一个事件循环并行运行（并发数受本机仿真槽位限制，见 sim_engine），
+stop_on_failure 为真（默认）时任一用例失败即终止其余用例，被终止的用例没有判定。
+提交的判定取声明顺序中第一个失败用例的结果，全部通过时为 SUCCESS。
+"""
+import asyncio
+import shutil
+from models import ErrorCode
+from app_submit import golden
+from app_submit.manifest import load_cases, fail_markers
+from app_submit.metrics import RunMetrics
+from app_submit.sim_engine import run_simulation_async
+from app_submit.workspace import replacing
+
+
+class CaseRun:
+    """一个用例的运行结果"""
+
+    def __init__(self, index, case, path, options):
+        self.index = index
+        self.case = case
+        self.path = path            # 工作目录
+        self.log_file = path / "simulation.log" if path is not None else None   # 本用例的日志
+        self.options = options      # run_simulation 的附加参数
+        self.error_code = None      # None 表示因其他用例失败被提前终止
+        self.metrics = RunMetrics()
+
+    @property
+    def name(self):
+        return self.case["name"]
+
+    @property
+    def hidden(self):
+        return self.case["hidden"]
+
+    @property
+    def verdict(self):
+        """错误码名称，被提前终止时为 None"""
+        return self.error_code.name if self.error_code is not None else None
+
+    def to_dict(self):
+        """远程判题节点上报的用例结果"""
+        return {"index": self.index, "name": self.name, "hidden": self.hidden, "error_code": self.verdict,
+                "metrics": self.metrics.as_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        run = cls(int(data["index"]), {"name": str(data["name"]), "hidden": bool(data.get("hidden"))}, None, None)
+        run.error_code = ErrorCode[data["error_code"]] if data.get("error_code") else None
+        run.metrics = RunMetrics.from_dict(data.get("metrics") or {})
+        return run
+
+
+def run_options(project_dir, digest, manifest, backend, case):
+    """
+    用例的 run_simulation 附加参数：编译文件列表、预定义宏，以及输出扫描器
+    （参考波形模式下为逐周期比较器，否则为带题目失败标记的扫描器）
+    """
+    options = {"file_list": case["file_list"], "defines": case["defines"]}
+    options.update(golden.run_options(project_dir, digest, manifest, backend, case))
+    if "scanner_factory" not in options:
+        markers = fail_markers(manifest)
+        options["scanner_factory"] = lambda log: backend.make_scanner(log, markers)
+    return options
+
+
+def compile_options(manifest):
+    """只编译时的附加参数（语法检查），使用第一个用例的编译文件列表与宏"""
+    case = load_cases(manifest)[0]
+    return {"file_list": case["file_list"], "defines": case["defines"]}
+
+
+async def _run_all(runs, backend, waveform, stop_on_failure):
+    tasks = {
+        asyncio.ensure_future(run_simulation_async(run.path, run.case["timeout"], run.metrics, backend, waveform,
+                                                   log_file=run.log_file, **run.options)): run
+        for run in runs
+    }
+    pending = set(tasks)
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                tasks[task].error_code = task.result()
+            if stop_on_failure and any(tasks[task].error_code != ErrorCode.SUCCESS for task in done):
+                break
+    finally:
+        # 取消尚未结束的用例；取消时判题引擎会终止其仿真进程组
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def run_cases(runs, backend, waveform=True, stop_on_failure=True, metrics=None):
+    """
+    并行运行各用例，结果写入各自的 CaseRun
+    :param metrics: 合并各用例阶段耗时与子进程资源使用的总统计
+    :return: runs
+    """
+    asyncio.run(_run_all(runs, backend, waveform, stop_on_failure))
+    if metrics is not None:
+        metrics.merge_parallel([run.metrics for run in runs])
+    return runs
+
+
+def overall_code(runs):
+    """提交的判定：声明顺序中第一个失败用例的结果，全部通过时为 SUCCESS"""
+    for run in runs:
+        if run.error_code is not None and run.error_code != ErrorCode.SUCCESS:
+            return run.error_code
+    if any(run.error_code is None for run in runs):
+        return ErrorCode.ERROR_UNKNOWN
+    return ErrorCode.SUCCESS
+
+
+def waveform_case(cases, verdicts):
+    """
+    保存波形的用例：第一个失败的公开用例，没有时为第一个公开用例
+    :param verdicts: {用例名: 错误码名称或 None}
+    :return: 用例下标，全部为隐藏用例时返回 None
+    """
+    visible = [index for index, case in enumerate(cases) if not case["hidden"]]
+    for index in visible:
+        code = verdicts.get(cases[index]["name"])
+        if code is not None and code != ErrorCode.SUCCESS.name:
+            return index
+    return visible[0] if visible else None
+
+
+def write_log(runs, dest):
+    """
+    合并各用例的日志；只有一个公开用例时直接使用其日志
+    隐藏用例只写入判定，被提前终止的用例注明未完成
+    """
+    if len(runs) == 1 and not runs[0].hidden:
+        src = runs[0].log_file
+        if not src.exists():
+            return False
+        with replacing(dest) as tmp:
+            shutil.move(str(src), str(tmp))
+        return True
+    with replacing(dest) as tmp, open(tmp, "w", encoding="utf-8") as log:
+        for run in runs:
+            log.write(f"=== Case {run.index + 1}/{len(runs)}: {run.name}{' (hidden)' if run.hidden else ''} ===\n")
+            if run.error_code is None:
+                log.write("INFO: Skipped after another case failed\n\n")
+                continue
+            src = run.log_file
+            if not run.hidden and src.exists():
+                with open(src, "r", encoding="utf-8", errors="replace") as case_log:
+                    shutil.copyfileobj(case_log, log)
+            log.write(f"RESULT: {run.error_code.name}\n\n")
+        log.write("=== Cases Summary ===\n")
+        for run in runs:
+            log.write(f"{run.name}: {run.verdict or 'SKIPPED'}\n")
+        log.write("=====================\n")
+    return True
@@ -0,0 +1,354 @@
+"""
+提交状态推送
+提交的 QUEUED → RUNNING → SUCCESS/FAILED 状态变化由写入方（Web 进程、判题进程、远程判题节点接口、重新判题）
+以 JudgeEvent 记录与状态变化在同一事务中写入数据库，事务回滚时事件一并丢弃。
+每个 Web 进程中的 EventRelay 线程按 id 顺序读取新事件，交给进程内的发布/订阅中心 StatusHub，
+再分发给订阅了对应提交的 SSE 连接；判题端以同样的方式得知新任务并唤醒判题进程。
+Web 进程与判题进程之间只通过数据库联系，可以分别以多进程、多台机器部署。
+PostgreSQL 下写入事件的事务同时发出 NOTIFY（提交时才送达），读取方 LISTEN 等待，有新事件时立即读取，
+空闲时只按 EVENT_LISTEN_TIMEOUT 兜底读取；SQLite 没有跨进程通知，按 EVENT_POLL_INTERVAL 轮询。
+StatusHub 同时维护等待中的提交，按与判题进程相同的公平调度规则计算并推送排队位置。
+"""
+import os
+import select
+import threading
+import time
+from datetime import datetime, timedelta
+from queue import Queue
+from sqlalchemy import func, text
+from exts import db
+from models import SubmissionStatus, JudgeEvent, JudgeJob, JudgeJobStatus, Submission
+from app_submit.scheduling import fair_order
+
+# 读取新事件的间隔（秒，SQLite）
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 0.2))
+# PostgreSQL 下等待通知的最长时间（秒），超时后照常读取一次，防止漏掉连接中断期间的通知
+EVENT_LISTEN_TIMEOUT = 2
+# NOTIFY 通道名
+EVENT_CHANNEL = "judge_event"
+# 事件保留时间（秒），由判题端定期清理
+EVENT_RETENTION_SECONDS = 600
+# 较小的 id 可能晚于较大的 id 提交（并发事务），出现空缺的 id 在这段时间内仍会被读取（秒）
+EVENT_GAP_SECONDS = 10
+# 按数据库重建排队顺序的间隔（秒）
+RESYNC_SECONDS = 60
+
+FINAL_STATUSES = (SubmissionStatus.SUCCESS, SubmissionStatus.FAILED, SubmissionStatus.CANCELLED)
+
+
+class StatusHub:
+    """提交状态的进程内发布/订阅中心"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}      # {submission_id: set(Queue)}
+        self._pending = {}          # 等待判题的提交 {submission_id: user_id}，按入队顺序
+        self._sent_positions = {}   # 已推送给订阅者的排队位置
+
+    def subscribe(self, submission_id):
+        """订阅一个提交的状态变化，返回接收事件的队列"""
+        queue = Queue()
+        with self._lock:
+            self._subscribers.setdefault(submission_id, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, submission_id, queue):
+        with self._lock:
+            queues = self._subscribers.get(submission_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self._subscribers[submission_id]
+
+    def _deliver(self, submission_id, event):
+        for queue in self._subscribers.get(submission_id, ()):
+            queue.put(event)
+
+    def _positions(self):
+        """按公平调度规则计算等待中提交的位置（不计正在判题的任务）"""
+        order = fair_order(list(self._pending.items()))
+        return {submission_id: i + 1 for i, submission_id in enumerate(order)}
+
+    def _push_positions(self):
+        """向排队位置发生变化的订阅者推送新位置"""
+        waiting = [sid for sid in self._pending if sid in self._subscribers]
+        if not waiting:
+            self._sent_positions.clear()
+            return
+        positions = self._positions()
+        sent = {}
+        for submission_id in waiting:
+            position = positions[submission_id]
+            sent[submission_id] = position
+            if self._sent_positions.get(submission_id) != position:
+                self._deliver(submission_id, {
+                    "submission_id": submission_id,
+                    "status": SubmissionStatus.QUEUED,
+                    "error_code": None,
+                    "position": position
+                })
+        self._sent_positions = sent
+
+    def position(self, submission_id):
+        """提交在等待队列中的位置（从 1 开始），不在队列中时返回 None"""
+        with self._lock:
+            if submission_id not in self._pending:
+                return None
+            return self._positions()[submission_id]
+
+    def reset_pending(self, entries):
+        """
+        用数据库中的等待任务重建排队顺序（启动或回收任务后调用）
+        :param entries: [(submission_id, user_id)]，按入队顺序排列
+        """
+        with self._lock:
+            self._pending = dict(entries)
+            self._push_positions()
+
+    def enqueued(self, submission_id, user_id=None):
+        """提交入队"""
+        with self._lock:
+            self._pending.setdefault(submission_id, user_id)
+            self._push_positions()
+
+    def publish(self, submission_id, status, error_code=None):
+        """发布状态变化；提交离开等待队列时，向仍在排队的订阅者推送新位置"""
+        with self._lock:
+            left = status != SubmissionStatus.QUEUED and self._pending.pop(submission_id, None) is not None
+            if left:
+                self._sent_positions.pop(submission_id, None)
+            position = None
+            if status == SubmissionStatus.QUEUED and submission_id in self._pending:
+                position = self._positions()[submission_id]
+                self._sent_positions[submission_id] = position
+            self._deliver(submission_id, {
+                "submission_id": submission_id,
+                "status": status,
+                "error_code": error_code,
+                "position": position
+            })
+            if left:
+                self._push_positions()
+
+status_hub = StatusHub()
+
+
+def record_event(submission_id, status, error_code=None, user_id=None):
+    """
+    记录提交状态变化（随调用方的事务一起提交）
+    :param user_id: 提交进入等待队列（新提交或重新排队）时传入，用于计算排队位置
+    """
+    db.session.add(JudgeEvent(
+        submission_id=submission_id,
+        user_id=user_id,
+        status=status,
+        error_code=error_code,
+        created_at=datetime.now()
+    ))
+    if db.session.get_bind().dialect.name == "postgresql":
+        # 事务提交时送达，同一事务中的多次通知会被合并
+        db.session.execute(text("SELECT pg_notify(:channel, '')"), {"channel": EVENT_CHANNEL})
+
+
+def prune_events(seconds=EVENT_RETENTION_SECONDS):
+    """删除过期事件，返回删除数"""
+    deleted = JudgeEvent.query.filter(
+        JudgeEvent.created_at < datetime.now() - timedelta(seconds=seconds)
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+class EventTail:
+    """
+    按 id 顺序读取新增的 JudgeEvent
+    并发事务中较小的 id 可能较晚提交，读到较大的 id 时记下其间空缺的 id，
+    在 EVENT_GAP_SECONDS 内继续读取，避免漏掉事件（回滚事务留下的空缺到期后放弃）
+    """
+
+    def __init__(self):
+        self._last_id = None
+        self._gaps = {}     # {空缺的 id: 发现时间}
+
+    def start(self):
+        """从当前最新的事件之后开始读取（需要应用上下文）"""
+        self._last_id = db.session.query(func.max(JudgeEvent.id)).scalar() or 0
+        self._gaps.clear()
+        db.session.rollback()
+
+    def poll(self):
+        """
+        读取新事件（需要应用上下文）
+        :return: [(submission_id, status, error_code, user_id)]，按 id 顺序
+        """
+        now = time.monotonic()
+        self._gaps = {i: seen for i, seen in self._gaps.items() if now - seen < EVENT_GAP_SECONDS}
+        floor = min(self._gaps, default=self._last_id + 1) - 1
+        rows = db.session.query(
+            JudgeEvent.id, JudgeEvent.submission_id, JudgeEvent.status, JudgeEvent.error_code, JudgeEvent.user_id
+        ).filter(JudgeEvent.id > floor).order_by(JudgeEvent.id).all()
+        db.session.rollback()
+        events = []
+        for row in rows:
+            if row.id > self._last_id:
+                for missing in range(self._last_id + 1, row.id):
+                    self._gaps[missing] = now
+                self._last_id = row.id
+            elif self._gaps.pop(row.id, None) is None:
+                continue    # 已读取过
+            events.append((row.submission_id, row.status, row.error_code, row.user_id))
+        return events
+
+
+class EventSignal:
+    """
+    等待新事件：PostgreSQL 下以一条独立连接 LISTEN，收到通知或超时后返回；
+    其他数据库（或 LISTEN 连接出错时）等待 EVENT_POLL_INTERVAL 后返回，调用方随后读取事件；
+    连接出错后每隔 EVENT_LISTEN_TIMEOUT 秒尝试重新 LISTEN
+    """
+
+    def __init__(self):
+        self._engine = None     # PostgreSQL 时为数据库引擎
+        self._conn = None       # 执行 LISTEN 的 DBAPI 连接（不在连接池中）
+        self._retry_at = 0.0
+
+    def start(self):
+        """建立 LISTEN 连接（需要应用上下文），失败时退回轮询"""
+        if db.engine.dialect.name == "postgresql":
+            self._engine = db.engine
+            self._listen()
+
+    def _listen(self):
+        try:
+            raw = self._engine.raw_connection()
+            conn = raw.driver_connection
+            raw.detach()
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {EVENT_CHANNEL}")
+            cursor.close()
+            self._conn = conn
+        except Exception as e:
+            print(f"监听状态事件失败，改为轮询: {e}")
+            self._conn = None
+            self._retry_at = time.monotonic() + EVENT_LISTEN_TIMEOUT
+
+    def _drain(self):
+        conn = self._conn
+        if callable(getattr(conn, "notifies", None)):
+            # psycopg 3
+            for _ in conn.notifies(timeout=0):
+                pass
+        else:
+            # psycopg2
+            conn.poll()
+            conn.notifies.clear()
+
+    def wait(self, stop=None):
+        """
+        等待新事件或超时
+        :param stop: threading.Event，设置后尽快返回
+        :return: stop 是否已设置
+        """
+        if self._conn is None and self._engine is not None and time.monotonic() >= self._retry_at:
+            self._listen()
+        if self._conn is None:
+            if stop is not None:
+                return stop.wait(EVENT_POLL_INTERVAL)
+            time.sleep(EVENT_POLL_INTERVAL)
+            return False
+        try:
+            readable, _, _ = select.select([self._conn], [], [], EVENT_LISTEN_TIMEOUT)
+            if readable:
+                self._drain()
+        except Exception as e:
+            print(f"监听状态事件出错，改为轮询: {e}")
+            self.close()
+            self._retry_at = time.monotonic() + EVENT_LISTEN_TIMEOUT
+        return stop is not None and stop.is_set()
+
+    def close(self):
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+            self._conn = None
+
+
+def is_enqueue(event):
+    """事件是否表示提交进入等待队列（需要唤醒判题进程）"""
+    _, status, _, user_id = event
+    return status == SubmissionStatus.QUEUED and user_id is not None
+
+
+class EventRelay:
+    """
+    Web 进程中的事件转发线程：读取新事件并交给 status_hub，有新任务时调用 on_enqueue（唤醒等待领取任务的远程判题节点）
+    每个进程在处理第一个请求时启动（ensure_started），gunicorn 等在导入应用后 fork 出的工作进程各自启动自己的线程
+    """
+
+    def __init__(self, hub):
+        self._hub = hub
+        self._lock = threading.Lock()
+        self._pid = None
+        self._on_enqueue = None
+
+    def ensure_started(self, app, on_enqueue=None):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._on_enqueue = on_enqueue
+            tail = EventTail()
+            event_signal = EventSignal()
+            with app.app_context():
+                event_signal.start()
+                tail.start()
+                self._resync()
+            threading.Thread(target=self._run, args=(app, tail, event_signal), name="event-relay", daemon=True).start()
+            self._pid = os.getpid()
+
+    def _resync(self):
+        """按数据库中的等待任务重建排队顺序"""
+        pending = db.session.query(JudgeJob.submission_id, Submission.user_id) \
+            .join(Submission, Submission.id == JudgeJob.submission_id) \
+            .filter(JudgeJob.status == JudgeJobStatus.PENDING) \
+            .order_by(JudgeJob.id).all()
+        db.session.rollback()
+        self._hub.reset_pending([(row.submission_id, row.user_id) for row in pending])
+
+    def _run(self, app, tail, event_signal):
+        resynced = time.monotonic()
+        while True:
+            event_signal.wait()
+            with app.app_context():
+                try:
+                    events = tail.poll()
+                    if time.monotonic() - resynced >= RESYNC_SECONDS:
+                        self._resync()
+                        resynced = time.monotonic()
+                except Exception as e:
+                    db.session.rollback()
+                    print(f"读取状态事件失败: {e}")
+                    continue
+                finally:
+                    db.session.remove()
+            for event in events:
+                self._dispatch(event)
+
+    def _dispatch(self, event):
+        submission_id, status, error_code, user_id = event
+        try:
+            if is_enqueue(event):
+                self._hub.enqueued(submission_id, user_id)
+                if self._on_enqueue is not None:
+                    self._on_enqueue()
+            else:
+                self._hub.publish(submission_id, status, error_code)
+        except Exception as e:
+            print(f"状态推送失败: {e}")
+
+
+event_relay = EventRelay(status_hub)
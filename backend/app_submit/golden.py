@@ -0,0 +1,237 @@
+"""
+参考波形（golden trace）模式
+默认的测试平台每次判题都同时编译、仿真参考模块和用户模块。参考波形模式下，题目提供一个只实例化被测模块的
+跟踪测试平台，参考模块的输出只在导入题目时（或首次判题时）仿真一次并压缩保存；判题时只仿真用户模块，
+由流式比较器逐周期比较输出，并给出第一个不匹配的周期。
+
+在 project/judge.json 中开启：
+    "golden": {
+        "file_list": "trace_file_list.f",   // 跟踪测试平台的编译文件列表（包含 user_module.v，不包含参考模块）
+        "reference": "ref_module.v",        // 参考模块文件
+        "module": "ref_module"              // 参考模块名
+    }
+也可以写 "golden": true 使用以上默认值。
+题目声明了多个测试用例（见 cases.py）时，每个用例按各自的编译文件列表和宏分别录制参考波形，
+用例未指定 file_list 时使用上面的跟踪测试平台文件列表。
+跟踪测试平台（模块名仍为 test_bench）通过宏 `DUT 实例化被测模块（录制时为参考模块名），
+每个采样周期输出一行 "TRACE <时间> <输出值...>"，结束前输出一行 "TRACE_END"。
+"""
+import gzip
+import os
+import threading
+from pathlib import Path
+from models import BASE_DIR, ErrorCode
+from app_submit import verdict_cache
+from app_submit.manifest import load_manifest, load_cases, golden_config
+from app_submit.output_scan import MAX_OUTPUT_BYTES
+from app_submit.sim_engine import run_simulation
+from app_submit.simulators import get_backend
+from app_submit.workspace import get_workspace_manager, write_run_file
+
+# 参考波形保存目录，按题目工程哈希与用例名命名，工程文件变化后自动重新录制
+GOLDEN_DIR = BASE_DIR / "sub_data" / "golden"
+TRACE_PREFIX = "TRACE "
+TRACE_END = "TRACE_END"
+
+_record_lock = threading.Lock()
+
+
+def golden_path(digest, case_name):
+    return GOLDEN_DIR / f"{digest}-{case_name}.trace.gz"
+
+
+class _TraceScanner:
+    """跟踪输出扫描的公共部分：输出上限、非跟踪行写入日志"""
+
+    def __init__(self, log, max_bytes=MAX_OUTPUT_BYTES):
+        self.log = log
+        self.max_bytes = max_bytes
+        self.bytes_seen = 0
+        self.samples = 0
+        self.passed = False
+        self.failed = False
+        self.overflow = False
+
+    @property
+    def decided(self):
+        return self.passed or self.failed
+
+    def mark_overflow(self):
+        self.overflow = True
+        self.log.write(f"ERROR: Output limit exceeded ({self.max_bytes} bytes), simulation aborted\n")
+
+    def feed(self, raw_line):
+        """
+        处理一行输出
+        :return: 是否应当立即结束仿真
+        """
+        self.bytes_seen += len(raw_line)
+        if self.bytes_seen > self.max_bytes:
+            self.mark_overflow()
+            return True
+        line = raw_line.decode("utf-8", errors="replace").rstrip("\r\n")
+        if line.startswith(TRACE_PREFIX):
+            self.samples += 1
+            return self._sample(line[len(TRACE_PREFIX):].strip())
+        if line.strip() == TRACE_END:
+            return self._end()
+        self.log.write(line + "\n")
+        return False
+
+    def _summary(self, *lines):
+        self.log.write("\n=== Simulation Summary ===\n")
+        for line in lines:
+            self.log.write(line + "\n")
+        self.log.write("========================\n")
+
+    def _sample(self, sample):
+        raise NotImplementedError
+
+    def _end(self):
+        raise NotImplementedError
+
+
+class TraceRecorder(_TraceScanner):
+    """录制参考模块的跟踪输出"""
+
+    def __init__(self, log, dest, max_bytes=MAX_OUTPUT_BYTES):
+        super().__init__(log, max_bytes)
+        self.dest = dest
+
+    def _sample(self, sample):
+        self.dest.write(sample + "\n")
+        return False
+
+    def _end(self):
+        self.passed = True
+        self._summary(f"Recorded {self.samples} samples")
+        return True
+
+
+class TraceComparator(_TraceScanner):
+    """将用户模块的跟踪输出与参考波形逐周期比较，第一个不匹配的周期即判为失败"""
+
+    def __init__(self, log, golden_file, max_bytes=MAX_OUTPUT_BYTES):
+        super().__init__(log, max_bytes)
+        self.golden_file = golden_file
+        self._expected = None
+
+    def _next_expected(self):
+        if self._expected is None:
+            self._expected = gzip.open(self.golden_file, "rt", encoding="utf-8")
+        line = self._expected.readline()
+        return line.rstrip("\n") if line else None
+
+    def _fail(self, *lines):
+        self.failed = True
+        self._summary("** x TEST FAILED! x **", *lines)
+        self.close()
+        return True
+
+    def _sample(self, sample):
+        expected = self._next_expected()
+        if expected is None:
+            return self._fail(f"Trace longer than reference at cycle {self.samples}: got {sample}")
+        if sample != expected:
+            time = expected.split(" ", 1)[0]
+            return self._fail(f"First mismatch at: cycle {self.samples} ({time} ps)",
+                              f"Expected: {expected}",
+                              f"Got:      {sample}")
+        return False
+
+    def _end(self):
+        expected = self._next_expected()
+        if expected is not None:
+            return self._fail(f"Trace ended early at cycle {self.samples + 1}: expected {expected}")
+        self.passed = True
+        self._summary("** √ TEST PASSED! √ **", f"Compared {self.samples} cycles against reference trace")
+        self.close()
+        return True
+
+    def close(self):
+        if self._expected is not None:
+            self._expected.close()
+            self._expected = None
+
+
+def record_golden(project_dir, digest, manifest, backend, case):
+    """
+    仿真参考模块并保存其在一个用例下的跟踪输出
+    :return: 参考波形路径
+    :raises RuntimeError: 录制失败（日志附在异常信息中）
+    """
+    config = golden_config(manifest)
+    dest = golden_path(digest, case["name"])
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    project_dir = Path(project_dir)
+    manager = get_workspace_manager()
+    with manager.workspace(project_dir, digest) as path:
+        reference = (project_dir / config["reference"]).read_text(encoding="utf-8", errors="replace")
+        write_run_file(path / "user_module.v", reference)
+        try:
+            with gzip.open(tmp, "wt", encoding="utf-8") as trace:
+                error_code = run_simulation(
+                    path, timeout_sec=case["timeout"], backend=backend, waveform=False,
+                    file_list=case["file_list"], defines={**case["defines"], "DUT": config["module"]},
+                    scanner_factory=lambda log: TraceRecorder(log, trace)
+                )
+            if error_code != ErrorCode.SUCCESS:
+                log_file = path / "simulation.log"
+                log = log_file.read_text(encoding="utf-8", errors="replace") if log_file.exists() else ""
+                raise RuntimeError(f"录制用例 {case['name']} 的参考波形失败（{error_code.name}）:\n{log[-2000:]}")
+            os.replace(tmp, dest)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+    print(f"已录制 {project_dir.parent.name} 用例 {case['name']} 的参考波形")
+    return dest
+
+
+def ensure_golden(project_dir, digest, manifest, backend, case):
+    """返回当前工程版本下用例的参考波形，不存在时录制"""
+    dest = golden_path(digest, case["name"])
+    if dest.exists():
+        return dest
+    with _record_lock:
+        if dest.exists():
+            return dest
+        return record_golden(project_dir, digest, manifest, backend, case)
+
+
+def run_options(project_dir, digest, manifest, backend, case):
+    """
+    判题时 run_simulation 的附加参数：参考波形模式下使用逐周期比较器
+    :return: 未开启参考波形模式时返回空字典
+    """
+    if golden_config(manifest) is None:
+        return {}
+    golden_file = ensure_golden(project_dir, digest, manifest, backend, case)
+    return {"scanner_factory": lambda log: TraceComparator(log, golden_file)}
+
+
+def remove_stale(keep_digests):
+    """删除不再对应任何题目工程版本的参考波形"""
+    if not GOLDEN_DIR.is_dir():
+        return
+    for path in GOLDEN_DIR.glob("*.trace.gz"):
+        if path.name.split("-", 1)[0] not in keep_digests:
+            path.unlink()
+
+
+def record_all(prob_dir):
+    """导入题目时录制所有参考波形模式题目的参考波形，并清理过期的参考波形"""
+    keep = set()
+    for project_dir in sorted(Path(prob_dir).glob("*/project")):
+        try:
+            manifest = load_manifest(project_dir)
+            if golden_config(manifest) is None:
+                continue
+            digest = verdict_cache.project_hash(project_dir)
+            keep.add(digest)
+            backend = get_backend(manifest["simulator"])
+            for case in load_cases(manifest):
+                ensure_golden(project_dir, digest, manifest, backend, case)
+        except Exception as e:
+            print(f"录制 {project_dir.parent.name} 的参考波形失败: {e}")
+    remove_stale(keep)
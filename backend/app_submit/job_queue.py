@@ -0,0 +1,260 @@
+"""
+持久化判题队列
+判题任务保存在 JudgeJob 表中，判题进程通过条件更新原子地领取任务并持有租约，
+运行期间定期心跳续约；进程崩溃或重启后，租约过期的任务会被重新排队。
+"""
+from datetime import datetime, timedelta
+import socket
+import os
+import threading
+from sqlalchemy import update, func
+from exts import db
+from models import Submission, SubmissionStatus, ErrorCode, JudgeJob, JudgeJobStatus
+from app_submit.events import record_event
+from app_submit import problem_stats
+from app_submit.scheduling import fair_order
+
+LEASE_SECONDS = 60          # 租约时长
+HEARTBEAT_INTERVAL = 15     # 心跳间隔
+MAX_ATTEMPTS = 3            # 最多领取次数，超过后判定为异常任务
+FAIR_SCAN_LIMIT = 500       # 公平调度时每次参与排序的最早等待任务数
+
+
+def worker_identity(worker_id=None):
+    """生成判题进程的租约持有者标识"""
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    return name if worker_id is None else f"{name}:{worker_id}"
+
+
+def enqueue_submission(submission):
+    """为提交创建判题任务（随调用方的事务一起提交）"""
+    if submission.id is None:
+        db.session.flush()
+    job = JudgeJob(
+        submission_id=submission.id,
+        status=JudgeJobStatus.PENDING,
+        created_at=datetime.now()
+    )
+    db.session.add(job)
+    return job
+
+
+def coalesce_pending(submission):
+    """
+    取消同一用户对同一题目仍在等待的旧提交，只保留最新的一次（不提交事务）
+    :return: 被取消的提交ID列表
+    """
+    rows = db.session.query(JudgeJob.id, JudgeJob.submission_id).join(
+        Submission, Submission.id == JudgeJob.submission_id
+    ).filter(
+        Submission.user_id == submission.user_id,
+        Submission.problem_id == submission.problem_id,
+        Submission.id != submission.id,
+        JudgeJob.status == JudgeJobStatus.PENDING
+    ).all()
+    now = datetime.now()
+    cancelled = []
+    for job_id, submission_id in rows:
+        # 已被判题进程领取的任务照常完成
+        updated = JudgeJob.query.filter_by(
+            id=job_id,
+            status=JudgeJobStatus.PENDING
+        ).update({
+            JudgeJob.status: JudgeJobStatus.CANCELLED,
+            JudgeJob.finished_at: now,
+            JudgeJob.updated_at: now
+        }, synchronize_session=False)
+        if updated == 1:
+            Submission.query.filter_by(id=submission_id).update(
+                {Submission.status: SubmissionStatus.CANCELLED}, synchronize_session=False)
+            cancelled.append(submission_id)
+    return cancelled
+
+
+def _pick_fair_candidate():
+    """按公平调度规则选出下一个待领取的任务ID"""
+    pending = db.session.query(JudgeJob.id, Submission.user_id).join(
+        Submission, Submission.id == JudgeJob.submission_id
+    ).filter(
+        JudgeJob.status == JudgeJobStatus.PENDING
+    ).order_by(JudgeJob.id).limit(FAIR_SCAN_LIMIT).all()
+    if not pending:
+        return None
+    running = dict(db.session.query(Submission.user_id, func.count(JudgeJob.id)).join(
+        Submission, Submission.id == JudgeJob.submission_id
+    ).filter(
+        JudgeJob.status == JudgeJobStatus.LEASED
+    ).group_by(Submission.user_id).all())
+    return fair_order([(row.id, row.user_id) for row in pending], running)[0]
+
+
+def claim_next_job(owner):
+    """
+    原子地领取下一个待判任务（按用户公平调度）
+    :param owner: 租约持有者标识
+    :return: 领取到的 JudgeJob，没有任务时返回 None
+    """
+    while True:
+        candidate_id = _pick_fair_candidate()
+        if candidate_id is None:
+            db.session.rollback()
+            return None
+        now = datetime.now()
+        # 仅当任务仍处于 PENDING 时才能领取成功，多个进程竞争时只有一个会命中
+        claimed = JudgeJob.query.filter_by(
+            id=candidate_id,
+            status=JudgeJobStatus.PENDING
+        ).update({
+            JudgeJob.status: JudgeJobStatus.LEASED,
+            JudgeJob.lease_owner: owner,
+            JudgeJob.lease_expires_at: now + timedelta(seconds=LEASE_SECONDS),
+            JudgeJob.heartbeat_at: now,
+            JudgeJob.claimed_at: now,
+            JudgeJob.attempts: JudgeJob.attempts + 1,
+            JudgeJob.updated_at: now
+        }, synchronize_session=False)
+        db.session.commit()
+        if claimed == 1:
+            return db.session.get(JudgeJob, candidate_id)
+
+
+def renew_lease(engine, job_id, owner):
+    """续约（在心跳线程中使用独立连接执行）"""
+    now = datetime.now()
+    stmt = update(JudgeJob.__table__).where(
+        JudgeJob.__table__.c.id == job_id,
+        JudgeJob.__table__.c.lease_owner == owner,
+        JudgeJob.__table__.c.status == JudgeJobStatus.LEASED
+    ).values(
+        heartbeat_at=now,
+        lease_expires_at=now + timedelta(seconds=LEASE_SECONDS)
+    )
+    with engine.begin() as conn:
+        return conn.execute(stmt).rowcount == 1
+
+
+def finish_job(job_id, owner):
+    """
+    将任务标记为完成（不提交事务，与判题结果在同一事务中写回）
+    :return: 租约仍由 owner 持有时返回 True；租约已被收回时返回 False，调用方应丢弃结果
+    """
+    now = datetime.now()
+    finished = JudgeJob.query.filter_by(
+        id=job_id,
+        lease_owner=owner,
+        status=JudgeJobStatus.LEASED
+    ).update({
+        JudgeJob.status: JudgeJobStatus.DONE,
+        JudgeJob.finished_at: now,
+        JudgeJob.updated_at: now
+    }, synchronize_session=False)
+    return finished == 1
+
+
+def requeue_expired_jobs():
+    """
+    回收租约过期的任务并补齐缺失的任务记录
+    多个判题端同时回收时，已被其他判题端锁定的记录会被跳过（PostgreSQL 等支持 SKIP LOCKED 的数据库）
+    :return: 重新排队的任务数
+    """
+    now = datetime.now()
+    requeued = 0
+    expired = JudgeJob.query.filter(
+        JudgeJob.status == JudgeJobStatus.LEASED,
+        JudgeJob.lease_expires_at < now
+    ).with_for_update(skip_locked=True).all()
+    for job in expired:
+        submission = Submission.query.get(job.submission_id)
+        if job.attempts >= MAX_ATTEMPTS:
+            # 多次领取均未完成，判定为异常任务
+            job.status = JudgeJobStatus.DONE
+            job.finished_at = now
+            if submission:
+                previous_status = submission.status
+                submission.status = SubmissionStatus.FAILED
+                submission.error_code = ErrorCode.ERROR_UNKNOWN.name
+                problem_stats.record_verdict(submission, previous_status)
+                record_event(submission.id, submission.status, submission.error_code)
+            print(f"判题任务 {job.id} 多次超时未完成，已标记失败")
+        else:
+            job.status = JudgeJobStatus.PENDING
+            job.lease_owner = None
+            job.lease_expires_at = None
+            if submission:
+                submission.status = SubmissionStatus.QUEUED
+                problem_stats.record_status(submission)
+                record_event(submission.id, submission.status, user_id=submission.user_id)
+            requeued += 1
+        job.updated_at = now
+    # 持久化队列上线前遗留的排队中/运行中提交没有任务记录，补齐后重新判题
+    orphans = Submission.query.outerjoin(
+        JudgeJob, JudgeJob.submission_id == Submission.id
+    ).filter(
+        JudgeJob.id.is_(None),
+        Submission.status.in_([SubmissionStatus.QUEUED, SubmissionStatus.RUNNING])
+    ).with_for_update(of=Submission, skip_locked=True).all()
+    for submission in orphans:
+        submission.status = SubmissionStatus.QUEUED
+        problem_stats.record_status(submission)
+        enqueue_submission(submission)
+        record_event(submission.id, submission.status, user_id=submission.user_id)
+        requeued += 1
+    db.session.commit()
+    return requeued
+
+
+class JobSignal:
+    """新任务到达的通知，远程判题节点领取任务时在 Web 进程中等待（由 events.EventRelay 读到新任务时触发）"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._version = 0
+
+    @property
+    def version(self):
+        return self._version
+
+    def notify(self):
+        with self._cond:
+            self._version += 1
+            self._cond.notify_all()
+
+    def wait(self, version, timeout):
+        """等待 version 之后的通知（先取 version 再查询任务，避免错过两者之间的通知），超时返回 False"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._version != version, timeout)
+
+
+job_signal = JobSignal()
+
+
+class LeaseKeeper:
+    """在判题期间后台定期续约（子类可覆盖 _renew，例如远程判题节点通过 HTTP 续约）"""
+
+    def __init__(self, engine, job_id, owner, interval=HEARTBEAT_INTERVAL):
+        self._engine = engine
+        self._job_id = job_id
+        self._owner = owner
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self._interval):
+            try:
+                if not self._renew():
+                    print(f"判题任务 {self._job_id} 的租约已失效")
+                    return
+            except Exception as e:
+                print(f"判题任务 {self._job_id} 续约失败: {e}")
+
+    def _renew(self):
+        return renew_lease(self._engine, self._job_id, self._owner)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
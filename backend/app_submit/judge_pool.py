@@ -0,0 +1,133 @@
+"""
+判题进程池
+每个判题进程拥有独立的 Flask 应用上下文、数据库会话和临时工作目录，
+iverilog/vvp 的调用和日志检查分布在多个进程中并行执行，不受 GIL 限制。
+判题进程常驻运行，启动时预热（JUDGE_PREWARM，见 run_sim.warm_up），任务经进程间队列唤醒，
+每个任务不再重复建立连接、解析配置和构建工作目录。
+提交状态变化由判题进程随判题结果写入数据库（JudgeEvent），不经过启动进程池的进程。
+"""
+import multiprocessing
+import os
+import time
+from queue import Empty
+from flask import Flask
+from exts import db
+
+# 空闲判题进程主动轮询数据库的间隔（秒），新任务到达时通过任务队列提前唤醒
+POLL_INTERVAL = 5
+
+# 判题进程需要继承的配置项
+WORKER_CONFIG_KEYS = (
+    'SQLALCHEMY_DATABASE_URI',
+    'SQLALCHEMY_TRACK_MODIFICATIONS',
+    'SQLALCHEMY_ENGINE_OPTIONS',
+    'JUDGE_WAVEFORM',
+    'JUDGE_PREWARM',
+)
+
+
+def default_worker_count():
+    """默认判题进程数：CPU 核心数"""
+    return os.cpu_count() or 1
+
+
+def create_worker_app(config, root_path, instance_path):
+    """在判题进程中创建仅包含数据库的最小 Flask 应用"""
+    app = Flask(__name__, root_path=root_path, instance_path=instance_path)
+    app.config.update(config)
+    db.init_app(app)
+    return app
+
+
+def _worker_main(worker_id, wakeups, config, root_path, instance_path):
+    """判题进程入口：被唤醒或轮询到期时，从持久化队列中领取任务并判题"""
+    from app_submit.run_sim import judge_submission, warm_up
+    from app_submit.job_queue import claim_next_job, worker_identity, LeaseKeeper
+    app = create_worker_app(config, root_path, instance_path)
+    owner = worker_identity(worker_id)
+    with app.app_context():
+        if app.config.get('JUDGE_PREWARM', True):
+            try:
+                started = time.perf_counter()
+                warmed = warm_up()
+                print(f"判题进程 {worker_id} 已预热 {warmed} 道题目，"
+                      f"耗时 {(time.perf_counter() - started) * 1000:.0f} ms")
+            except Exception as e:
+                print(f"判题进程 {worker_id} 预热失败: {e}")
+            finally:
+                db.session.remove()
+        print(f"判题进程 {worker_id} 已启动 (owner={owner})")
+        engine = db.engine
+        while True:
+            try:
+                if wakeups.get(timeout=POLL_INTERVAL) is None:
+                    break
+            except Empty:
+                pass
+            # 一次唤醒后持续领取，直到队列为空
+            while True:
+                try:
+                    job = claim_next_job(owner)
+                    if job is None:
+                        break
+                    job_id, submission_id = job.id, job.submission_id
+                    with LeaseKeeper(engine, job_id, owner):
+                        judge_submission(submission_id, lease=(job_id, owner))
+                except Exception as e:
+                    print(f"判题进程 {worker_id} 执行任务失败: {e}")
+                    db.session.rollback()
+                    break
+                finally:
+                    # 每个任务结束后释放会话，避免读到过期数据
+                    db.session.remove()
+
+
+class JudgePool:
+    """固定大小的判题进程池"""
+
+    def __init__(self, app, workers=None):
+        self.workers = max(1, int(workers or default_worker_count()))
+        self._config = {k: app.config[k] for k in WORKER_CONFIG_KEYS if k in app.config}
+        self._root_path = app.root_path
+        self._instance_path = app.instance_path
+        # 统一使用 spawn，保证 Windows 与 Linux 行为一致，且子进程不继承父进程的线程与连接
+        self._ctx = multiprocessing.get_context('spawn')
+        self._wakeups = self._ctx.Queue()
+        self._processes = []
+
+    def _spawn(self, worker_id):
+        process = self._ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self._wakeups, self._config, self._root_path, self._instance_path),
+            name=f"judge-worker-{worker_id}",
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def start(self):
+        """启动全部判题进程"""
+        self._processes = [self._spawn(i) for i in range(self.workers)]
+        print(f"判题进程池已启动，进程数: {self.workers}")
+
+    def _revive(self):
+        """重启意外退出的判题进程"""
+        for i, process in enumerate(self._processes):
+            if not process.is_alive():
+                print(f"判题进程 {i} 已退出 (exitcode={process.exitcode})，正在重启")
+                self._processes[i] = self._spawn(i)
+
+    def notify(self):
+        """有新任务入队，唤醒一个空闲的判题进程"""
+        self._revive()
+        self._wakeups.put(True)
+
+    def shutdown(self, timeout=10):
+        """通知所有判题进程退出并等待结束"""
+        for _ in self._processes:
+            self._wakeups.put(None)
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self._processes = []
@@ -0,0 +1,407 @@
+"""
+编译前检查
+用纯 Python 对用户代码做轻量的词法与结构检查，在复制工作目录、启动编译器之前拒绝明显无法编译的代码：
+未闭合的注释/字符串、括号或 begin/end 不配对、module/endmodule 不配对、模块重复定义，
+测试平台实例化的模块不存在或缺少其连接的端口，以及实例化了未定义的模块。
+测试平台期望的模块与端口从题目工程中解析，按工程哈希缓存，每道题目只解析一次。
+检查只报告确定会导致编译失败的问题；代码中除 `timescale 等整行指令外出现任何反引号（预处理指令或宏调用）时不做检查，
+交由编译器判断。
+"""
+import re
+import threading
+from pathlib import Path
+from app_submit import verdict_cache
+from app_submit.manifest import load_manifest
+
+USER_FILE = "user_module.v"
+
+_TOKEN_RE = re.compile(r"""
+      (?P<ws>\s+)
+    | (?P<comment>//[^\n]*|/\*.*?\*/)
+    | (?P<open_comment>/\*)
+    | (?P<string>"(?:\\.|[^"\\\n])*")
+    | (?P<open_string>")
+    | (?P<directive>`[A-Za-z_]\w*)
+    | (?P<number>(?:\d[\d_]*)?\s*'[sS]?[bBoOdDhH]\s*[0-9a-fA-FxXzZ?_]+|\d[\d_]*(?:\.\d[\d_]*)?(?:[eE][+-]?\d+)?)
+    | (?P<ident>[A-Za-z_][\w$]*|\\\S+)
+    | (?P<system>\$[\w$]+)
+    | (?P<op>.)
+""", re.S | re.X)
+
+# 只影响编译选项的整行指令，忽略该行其余内容；其他反引号开头的词（预处理指令、宏调用）无法可靠地静态分析
+_LINE_DIRECTIVES = {
+    "`timescale", "`default_nettype", "`celldefine", "`endcelldefine", "`resetall", "`line",
+}
+
+_BRACKETS = {"(": ")", "[": "]", "{": "}"}
+_CLOSERS = {v: k for k, v in _BRACKETS.items()}
+
+# 可以出现在模块项开头、后接 "标识符 (" 的关键字，不是模块实例化
+_KEYWORDS = {
+    "always", "and", "assign", "automatic", "begin", "buf", "bufif0", "bufif1", "case", "casex", "casez",
+    "cmos", "deassign", "default", "defparam", "disable", "edge", "else", "end", "endcase", "endfunction",
+    "endgenerate", "endmodule", "endprimitive", "endspecify", "endtable", "endtask", "event", "for",
+    "force", "forever", "fork", "function", "generate", "genvar", "highz0", "highz1", "if", "ifnone",
+    "initial", "inout", "input", "integer", "join", "large", "localparam", "macromodule", "medium",
+    "module", "nand", "negedge", "nmos", "nor", "not", "notif0", "notif1", "or", "output", "parameter",
+    "pmos", "posedge", "primitive", "pull0", "pull1", "pulldown", "pullup", "rcmos", "real", "realtime",
+    "reg", "release", "repeat", "rnmos", "rpmos", "rtran", "rtranif0", "rtranif1", "scalared", "signed",
+    "small", "specify", "specparam", "strong0", "strong1", "supply0", "supply1", "table", "task", "time",
+    "tran", "tranif0", "tranif1", "tri", "tri0", "tri1", "triand", "trior", "trireg", "unsigned", "vectored",
+    "wait", "wand", "weak0", "weak1", "while", "wire", "wor", "xnor", "xor", "logic", "bit", "byte", "int",
+    "var", "always_comb", "always_ff", "always_latch", "return", "assert", "wreal", "uwire",
+}
+
+# 模块实例化只能出现在这些记号之后（上一个模块项结束处）
+_ITEM_STARTS = {";", "begin", "end", "generate", "endgenerate", "endfunction", "endtask", "endcase", "else"}
+
+_cache = {}     # {工程哈希: 期望接口}
+_cache_lock = threading.Lock()
+
+
+class LintSkipped(Exception):
+    """代码无法静态分析，交由编译器判断"""
+
+
+class _Token:
+    __slots__ = ("kind", "text", "line")
+
+    def __init__(self, kind, text, line):
+        self.kind = kind
+        self.text = text
+        self.line = line
+
+
+class _Module:
+    __slots__ = ("name", "line", "ports", "ports_known", "instances", "primitive")
+
+    def __init__(self, name, line, primitive=False):
+        self.name = name
+        self.line = line
+        self.primitive = primitive      # 用户自定义原语（primitive ... endprimitive）
+        self.ports = []
+        self.ports_known = True
+        self.instances = []     # [(模块类型, 行号, 命名连接的端口集合, 按位置连接的端口数, 是否 .*)]
+
+
+def tokenize(code, filename=USER_FILE):
+    """
+    切分记号，去掉空白、注释和 `timescale 等指令行
+    :raises SyntaxError: 未闭合的注释或字符串
+    :raises LintSkipped: 使用了无法静态分析的预处理指令或宏
+    """
+    tokens = []
+    line = 1
+    skip_line = None
+    for match in _TOKEN_RE.finditer(code):
+        kind = match.lastgroup
+        text = match.group()
+        if kind == "open_comment":
+            raise SyntaxError(f"{filename}:{line}: error: 块注释没有结束（缺少 */）")
+        if kind == "open_string":
+            raise SyntaxError(f"{filename}:{line}: error: 字符串没有结束")
+        if kind == "directive":
+            if text not in _LINE_DIRECTIVES:
+                raise LintSkipped(text)
+            skip_line = line
+        elif kind not in ("ws", "comment") and skip_line != line:
+            tokens.append(_Token(kind, text, line))
+        line += text.count("\n")
+    return tokens
+
+
+def _check_brackets(tokens, filename):
+    stack = []
+    for token in tokens:
+        if token.kind != "op":
+            continue
+        if token.text in _BRACKETS:
+            stack.append(token)
+        elif token.text in _CLOSERS:
+            if not stack:
+                raise SyntaxError(f"{filename}:{token.line}: error: 多余的 '{token.text}'")
+            opener = stack.pop()
+            if opener.text != _CLOSERS[token.text]:
+                raise SyntaxError(f"{filename}:{token.line}: error: '{token.text}' 与第 {opener.line} 行的 "
+                                  f"'{opener.text}' 不匹配")
+    if stack:
+        raise SyntaxError(f"{filename}:{stack[-1].line}: error: '{stack[-1].text}' 没有闭合")
+
+
+def _skip_group(tokens, i):
+    """i 指向左括号，返回匹配的右括号之后的位置（括号已检查过配对）"""
+    depth = 0
+    while i < len(tokens):
+        token = tokens[i]
+        if token.kind == "op" and token.text in _BRACKETS:
+            depth += 1
+        elif token.kind == "op" and token.text in _CLOSERS:
+            depth -= 1
+            if depth == 0:
+                return i + 1
+        i += 1
+    return i
+
+
+def _split_top_level(tokens, start, end):
+    """将 (start, end) 之间的记号按顶层逗号切分"""
+    parts, current, depth = [], [], 0
+    for token in tokens[start:end]:
+        if token.kind == "op" and token.text in _BRACKETS:
+            depth += 1
+        elif token.kind == "op" and token.text in _CLOSERS:
+            depth -= 1
+        if depth == 0 and token.kind == "op" and token.text == ",":
+            parts.append(current)
+            current = []
+        else:
+            current.append(token)
+    if current or parts:
+        parts.append(current)
+    return parts
+
+
+def _parse_ports(module, tokens, start, end):
+    """解析模块头的端口列表（ANSI 与非 ANSI 两种写法）"""
+    for part in _split_top_level(tokens, start, end):
+        if part and part[0].text == ".":
+            module.ports_known = False
+            return
+        # 去掉默认值和位宽，剩下的最后一个非关键字标识符即端口名
+        names = []
+        depth = 0
+        for token in part:
+            if token.kind == "op" and token.text == "=" and depth == 0:
+                break
+            if token.kind == "op" and token.text in _BRACKETS:
+                depth += 1
+            elif token.kind == "op" and token.text in _CLOSERS:
+                depth -= 1
+            elif depth == 0 and token.kind == "ident" and token.text not in _KEYWORDS:
+                names.append(token.text)
+        if not names:
+            module.ports_known = False
+            return
+        module.ports.append(names[-1])
+
+
+def _parse_instance(tokens, i, module):
+    """i 指向可能的模块类型名，是实例化时记录下来并返回其后的位置，否则返回 None"""
+    type_token = tokens[i]
+    j = i + 1
+    if j < len(tokens) and tokens[j].text == "#":
+        if j + 1 >= len(tokens) or tokens[j + 1].text != "(":
+            return None
+        j = _skip_group(tokens, j + 1)
+    if j + 1 >= len(tokens) or tokens[j].kind != "ident" or tokens[j + 1].text != "(":
+        return None
+    j += 1
+    end = _skip_group(tokens, j)
+    named, positional, wildcard = set(), 0, False
+    for part in _split_top_level(tokens, j + 1, end - 1):
+        if len(part) >= 2 and part[0].text == "." and part[1].kind == "ident":
+            named.add(part[1].text)
+        elif len(part) >= 2 and part[0].text == "." and part[1].text == "*":
+            wildcard = True
+        else:
+            positional += 1
+    module.instances.append((type_token.text, type_token.line, named, positional, wildcard))
+    return end
+
+
+def parse_modules(tokens, filename=USER_FILE):
+    """
+    提取模块与用户自定义原语的定义：名称、端口列表以及模块内的实例化
+    :raises SyntaxError: 结构错误
+    :raises LintSkipped: 模块之外出现了无法分析的内容（属性 (* ... *)、config 等），交由编译器判断
+    """
+    _check_brackets(tokens, filename)
+    modules = []
+    current = None
+    blocks = []     # 未闭合的 begin
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        text = token.text
+        if token.kind == "ident" and text == "primitive" and current is None:
+            i = _parse_primitive(tokens, i, modules, filename)
+            continue
+        if token.kind == "ident" and text in ("module", "macromodule"):
+            if current is not None:
+                raise SyntaxError(f"{filename}:{current.line}: error: 模块 {current.name} 缺少 endmodule")
+            if i + 1 >= len(tokens) or tokens[i + 1].kind != "ident" or tokens[i + 1].text in _KEYWORDS:
+                raise SyntaxError(f"{filename}:{token.line}: error: module 之后缺少模块名")
+            current = _Module(tokens[i + 1].text, token.line)
+            i += 2
+            if i < len(tokens) and tokens[i].text == "#":
+                if i + 1 >= len(tokens) or tokens[i + 1].text != "(":
+                    raise SyntaxError(f"{filename}:{tokens[i].line}: error: 参数列表格式错误")
+                i = _skip_group(tokens, i + 1)
+            if i < len(tokens) and tokens[i].text == "(":
+                end = _skip_group(tokens, i)
+                _parse_ports(current, tokens, i + 1, end - 1)
+                i = end
+            if i >= len(tokens) or tokens[i].text != ";":
+                line = tokens[i].line if i < len(tokens) else tokens[-1].line
+                raise SyntaxError(f"{filename}:{line}: error: 模块 {current.name} 的端口列表之后缺少 ';'")
+            i += 1
+            continue
+        if token.kind == "ident" and text == "endmodule":
+            if current is None:
+                raise SyntaxError(f"{filename}:{token.line}: error: 多余的 endmodule")
+            if blocks:
+                raise SyntaxError(f"{filename}:{blocks[-1].line}: error: begin 没有对应的 end")
+            modules.append(current)
+            current = None
+        elif current is None:
+            # 合法的 Verilog 在模块之外还可以有属性、config 等，不确定是否会编译失败
+            raise LintSkipped(f"{filename}:{token.line}: 模块之外出现了 '{text}'")
+        elif token.kind == "ident" and text == "begin":
+            blocks.append(token)
+        elif token.kind == "ident" and text == "end":
+            if not blocks:
+                raise SyntaxError(f"{filename}:{token.line}: error: 多余的 end")
+            blocks.pop()
+        elif token.kind == "ident" and text not in _KEYWORDS and i > 0 and tokens[i - 1].text in _ITEM_STARTS:
+            end = _parse_instance(tokens, i, current)
+            if end is not None:
+                i = end
+                continue
+        i += 1
+    if current is not None:
+        raise SyntaxError(f"{filename}:{current.line}: error: 模块 {current.name} 缺少 endmodule")
+    return modules
+
+
+def _parse_primitive(tokens, i, modules, filename):
+    """i 指向模块之外的 primitive，记录原语名与端口，返回 endprimitive 之后的位置"""
+    token = tokens[i]
+    if i + 1 >= len(tokens) or tokens[i + 1].kind != "ident" or tokens[i + 1].text in _KEYWORDS:
+        raise SyntaxError(f"{filename}:{token.line}: error: primitive 之后缺少原语名")
+    primitive = _Module(tokens[i + 1].text, token.line, primitive=True)
+    j = i + 2
+    if j < len(tokens) and tokens[j].text == "(":
+        end = _skip_group(tokens, j)
+        _parse_ports(primitive, tokens, j + 1, end - 1)
+    while j < len(tokens) and tokens[j].text != "endprimitive":
+        if tokens[j].text in ("module", "macromodule", "endmodule"):
+            break
+        j += 1
+    if j >= len(tokens) or tokens[j].text != "endprimitive":
+        raise SyntaxError(f"{filename}:{token.line}: error: 原语 {primitive.name} 缺少 endprimitive")
+    modules.append(primitive)
+    return j + 1
+
+
+def _project_files(project_dir):
+    """sim_file_list.f 中除用户代码之外的文件"""
+    project_dir = Path(project_dir)
+    list_file = project_dir / "sim_file_list.f"
+    names = []
+    with open(list_file, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.split("//", 1)[0].strip()
+            if not line or line.startswith(("-", "+")) or Path(line).name == USER_FILE:
+                continue
+            names.append(project_dir / line)
+    return names
+
+
+def _parse_expected(project_dir):
+    """
+    解析题目工程：已定义的模块，以及需要用户代码提供的模块和测试平台连接的端口
+    :return: {"defined": set, "required": {模块名: (命名连接的端口集合, 按位置连接的最大端口数, 是否 .*)}}
+    """
+    defined = set()
+    instances = []
+    for path in _project_files(project_dir):
+        code = path.read_text(encoding="utf-8", errors="replace")
+        for module in parse_modules(tokenize(code, path.name), path.name):
+            defined.add(module.name)
+            instances.extend(module.instances)
+    required = {}
+    for name, _, named, positional, wildcard in instances:
+        if name in defined:
+            continue
+        ports, count, any_wildcard = required.get(name, (set(), 0, False))
+        required[name] = (ports | named, max(count, positional), any_wildcard or wildcard)
+    return {"defined": defined, "required": required}
+
+
+def expected_interface(project_dir, digest):
+    """
+    题目工程期望的接口（按工程哈希缓存），工程无法解析时返回 None
+    :param digest: verdict_cache.project_hash 给出的工程哈希
+    """
+    with _cache_lock:
+        if digest in _cache:
+            return _cache[digest]
+    try:
+        expected = _parse_expected(project_dir)
+    except (OSError, SyntaxError, LintSkipped) as e:
+        print(f"无法解析题目工程 {project_dir} 的模块接口: {e}")
+        expected = None
+    with _cache_lock:
+        _cache[digest] = expected
+    return expected
+
+
+def lint_code(code, expected=None):
+    """
+    检查用户代码
+    :param expected: expected_interface 的结果，为 None 时只做结构检查
+    :return: 错误信息列表，为空表示未发现问题（或代码无法静态分析）
+    """
+    try:
+        modules = parse_modules(tokenize(code or ""))
+    except SyntaxError as e:
+        return [str(e)]
+    except LintSkipped:
+        return []
+    errors = []
+    if not modules:
+        return [f"{USER_FILE}:1: error: 没有找到任何模块定义"]
+    # 重名、端口与实例化检查中，用户自定义原语与模块相同
+    by_name = {}
+    for module in modules:
+        if module.name in by_name:
+            errors.append(f"{USER_FILE}:{module.line}: error: 模块 {module.name} 重复定义")
+        by_name[module.name] = module
+    if expected is None:
+        return errors
+    for module in modules:
+        if module.name in expected["defined"]:
+            errors.append(f"{USER_FILE}:{module.line}: error: 模块 {module.name} 与题目工程中的模块重名")
+    for name, (named, positional, wildcard) in expected["required"].items():
+        module = by_name.get(name)
+        if module is None:
+            defined = "、".join(by_name) or "无"
+            errors.append(f"{USER_FILE}:1: error: 未找到测试平台需要的模块 {name}（代码中定义的模块：{defined}）")
+            continue
+        if not module.ports_known or wildcard:
+            continue
+        missing = sorted(named - set(module.ports))
+        if missing:
+            errors.append(f"{USER_FILE}:{module.line}: error: 模块 {name} 缺少端口: {', '.join(missing)}")
+        if positional > len(module.ports):
+            errors.append(f"{USER_FILE}:{module.line}: error: 模块 {name} 只有 {len(module.ports)} 个端口，"
+                          f"测试平台连接了 {positional} 个")
+    known = set(by_name) | expected["defined"]
+    for module in modules:
+        for name, line, _, _, _ in module.instances:
+            if name not in known:
+                errors.append(f"{USER_FILE}:{line}: error: 未定义的模块 {name}")
+    return errors
+
+
+def check_project_code(project_dir, code, digest=None):
+    """
+    按题目工程检查用户代码（题目配置 "lint": false 时跳过）
+    :param digest: 工程哈希，未提供时现场计算
+    :return: 错误信息列表
+    """
+    if not load_manifest(project_dir)["lint"]:
+        return []
+    if digest is None:
+        digest = verdict_cache.project_hash(project_dir)
+    return lint_code(code, expected_interface(project_dir, digest))
@@ -0,0 +1,125 @@
+"""
+题目判题配置
+题目可以在 project/judge.json 中声明判题方式，未提供的字段使用默认值：
+{
+    "simulator": "icarus",      // 仿真器后端：icarus / verilator / fake，默认由 JUDGE_SIMULATOR 决定
+    "timeout": 6,               // 编译与仿真各自的超时时间（秒）
+    "lint": true,               // 是否在编译前检查用户代码（见 lint.py）
+    "golden": null,             // 参考波形模式配置（见 golden.py）
+    "cases": null,              // 测试用例列表（见 cases.py），未配置时只有一个使用 sim_file_list.f 的用例
+    "stop_on_failure": true,    // 任一用例失败后是否终止其余用例
+    "fail_markers": ["MISMATCH", "ERROR"]   // TEST FAILED 之外判为失败的输出标记（整词匹配），[] 为只认 TEST FAILED
+}
+配置文件位于 project 目录中，修改后题目哈希随之变化，旧的判题缓存自动失效。
+"""
+import json
+import re
+import threading
+from pathlib import Path
+from app_submit.simulators import FILE_LIST
+from app_submit.output_scan import FAIL_MARKERS
+
+MANIFEST_NAME = "judge.json"
+DEFAULTS = {
+    "simulator": None,
+    "timeout": 6,
+    "lint": True,
+    "golden": None,
+    "cases": None,
+    "stop_on_failure": True,
+    "fail_markers": None,
+}
+# 参考波形模式的默认配置
+GOLDEN_DEFAULTS = {
+    "file_list": "trace_file_list.f",
+    "reference": "ref_module.v",
+    "module": "ref_module",
+}
+# 用例名用于文件名，只允许字母、数字、下划线、点和连字符
+CASE_NAME_RE = re.compile(r"^[A-Za-z0-9_.-]{1,50}$")
+
+_cache = {}     # {配置文件路径: ((大小, 修改时间), 配置)}
+_cache_lock = threading.Lock()
+
+
+def load_manifest(project_dir):
+    """
+    读取题目判题配置（按文件大小与修改时间缓存）
+    :raises ValueError: 配置文件不是合法的 JSON 对象
+    """
+    path = Path(project_dir) / MANIFEST_NAME
+    try:
+        stat = path.stat()
+    except OSError:
+        return dict(DEFAULTS)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached and cached[0] == signature:
+            return dict(cached[1])
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} 应为 JSON 对象")
+    manifest = dict(DEFAULTS)
+    manifest.update(data)
+    with _cache_lock:
+        _cache[path] = (signature, manifest)
+    return dict(manifest)
+
+
+def golden_config(manifest):
+    """题目的参考波形配置，未开启时返回 None"""
+    value = manifest.get("golden")
+    if not value:
+        return None
+    config = dict(GOLDEN_DEFAULTS)
+    if isinstance(value, dict):
+        config.update(value)
+    return config
+
+
+def fail_markers(manifest):
+    """
+    TEST FAILED 之外判为失败的输出标记，未配置时为 output_scan.FAIL_MARKERS
+    :raises ValueError: 配置不是字符串列表
+    """
+    value = manifest.get("fail_markers")
+    if value is None:
+        return FAIL_MARKERS
+    if not isinstance(value, list) or not all(isinstance(marker, str) and marker.strip() for marker in value):
+        raise ValueError("fail_markers 应为非空字符串的列表")
+    return tuple(value)
+
+
+def load_cases(manifest):
+    """
+    题目的测试用例列表，未配置 cases 时为一个名为 default 的用例
+    :return: [{"name", "file_list", "defines", "timeout", "hidden"}]
+    :raises ValueError: 用例配置不合法
+    """
+    golden = golden_config(manifest)
+    default_file_list = golden["file_list"] if golden else FILE_LIST
+    items = manifest.get("cases") or [{"name": "default"}]
+    if not isinstance(items, list):
+        raise ValueError("cases 应为列表")
+    cases = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise ValueError(f"第 {index + 1} 个用例应为 JSON 对象")
+        name = str(item.get("name") or f"case{index + 1}")
+        if not CASE_NAME_RE.match(name):
+            raise ValueError(f"用例名不合法: {name}")
+        if any(case["name"] == name for case in cases):
+            raise ValueError(f"用例名重复: {name}")
+        defines = item.get("defines") or {}
+        if not isinstance(defines, dict):
+            raise ValueError(f"用例 {name} 的 defines 应为 JSON 对象")
+        cases.append({
+            "name": name,
+            "file_list": item.get("file_list") or default_file_list,
+            "defines": defines,
+            "timeout": item.get("timeout") or manifest["timeout"],
+            "hidden": bool(item.get("hidden", False)),
+        })
+    return cases
@@ -0,0 +1,101 @@
+"""
+判题耗时与资源统计
+记录各阶段耗时（毫秒），以及 iverilog/vvp 子进程的 CPU 时间与峰值内存。
+子进程由判题引擎以 os.wait4 回收（见 sim_engine._Child），资源使用是该子进程自身的，
+并行运行的用例各自记录，不会互相计入；Windows 下对应字段为空。
+子进程由判题进程 vfork 后 exec，Linux 在 exec 时把判题进程的内存高水位计入子进程的 ru_maxrss，
+因此峰值内存取判题引擎在子进程运行期间采样的 VmHWM（子进程及其后代进程中的最大值）；
+没有 /proc 的平台只在 ru_maxrss 超过判题进程自身的内存高水位时记录。
+"""
+import sys
+import time
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+from contextlib import contextmanager
+
+# 判题各阶段，对应 JudgeMetrics 表中的同名 *_ms 字段
+PHASES = ("setup", "compile", "simulate", "check", "artifact")
+
+
+class RunMetrics:
+    """单次判题的统计数据"""
+
+    def __init__(self):
+        self.phase_ms = {}
+        self.child_cpu_ms = None
+        self.peak_rss_kb = None
+        self._started = time.perf_counter()
+        self._total_ms = None
+
+    @classmethod
+    def from_dict(cls, data):
+        """由 as_dict 的结果还原统计数据（远程判题节点上报的结果），total_ms 取上报值"""
+        metrics = cls()
+        for name in PHASES:
+            if data.get(f"{name}_ms") is not None:
+                metrics.phase_ms[name] = data[f"{name}_ms"]
+        metrics.child_cpu_ms = data.get("child_cpu_ms")
+        metrics.peak_rss_kb = data.get("peak_rss_kb")
+        metrics._total_ms = data.get("total_ms")
+        return metrics
+
+    @contextmanager
+    def phase(self, name):
+        """统计一个阶段的耗时，同名阶段多次进入时累加"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.phase_ms[name] = self.phase_ms.get(name, 0) + elapsed
+
+    def add_child_usage(self, rusage, hwm_kb=None):
+        """
+        累加一个已回收子进程的资源使用
+        :param rusage: os.wait4 的返回值
+        :param hwm_kb: 运行期间采样的内存高水位（KB），无法采样时为 None
+        """
+        if hwm_kb is not None:
+            self.peak_rss_kb = max(self.peak_rss_kb or 0, hwm_kb)
+        if rusage is None:
+            return
+        self.child_cpu_ms = (self.child_cpu_ms or 0) + (rusage.ru_utime + rusage.ru_stime) * 1000
+        rss_kb = _maxrss_kb(rusage)
+        if resource is not None and rss_kb > _maxrss_kb(resource.getrusage(resource.RUSAGE_SELF)):
+            self.peak_rss_kb = max(self.peak_rss_kb or 0, rss_kb)
+
+    def merge_parallel(self, others):
+        """
+        合并并行运行的多个子任务（测试用例）的统计：同一阶段的耗时取各子任务中的最大值，
+        子进程 CPU 时间累加，峰值内存取最大值
+        """
+        for name in PHASES:
+            values = [other.phase_ms[name] for other in others if name in other.phase_ms]
+            if values:
+                self.phase_ms[name] = self.phase_ms.get(name, 0) + max(values)
+        cpu = [other.child_cpu_ms for other in others if other.child_cpu_ms is not None]
+        if cpu:
+            self.child_cpu_ms = (self.child_cpu_ms or 0) + sum(cpu)
+        rss = [other.peak_rss_kb for other in others if other.peak_rss_kb is not None]
+        if rss:
+            self.peak_rss_kb = max([self.peak_rss_kb or 0] + rss)
+
+    @property
+    def total_ms(self):
+        if self._total_ms is not None:
+            return self._total_ms
+        return (time.perf_counter() - self._started) * 1000
+
+    def as_dict(self):
+        data = {f"{name}_ms": round(self.phase_ms[name]) for name in PHASES if name in self.phase_ms}
+        data["child_cpu_ms"] = round(self.child_cpu_ms) if self.child_cpu_ms is not None else None
+        data["peak_rss_kb"] = self.peak_rss_kb
+        return data
+
+
+def _maxrss_kb(rusage):
+    # Linux 下 ru_maxrss 单位为 KB，macOS 下为字节
+    return rusage.ru_maxrss // 1024 if sys.platform == "darwin" else rusage.ru_maxrss
+
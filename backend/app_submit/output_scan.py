@@ -0,0 +1,75 @@
+"""
+仿真输出流式扫描
+逐行检查 vvp 的输出：出现判定标记后只再读取少量摘要行即可结束仿真；
+输出超过字节上限时立即终止，防止 $display 死循环占满磁盘和 CPU。
+除 TEST FAILED 外，测试平台报告不匹配或错误的行（默认为 MISMATCH、ERROR，题目可在 judge.json 的 fail_markers 中配置）
+同样判为失败，不必等到仿真结束时的汇总。
+"""
+import functools
+import os
+import re
+
+PASS_MARKER = "TEST PASSED"
+FAIL_MARKER = "TEST FAILED"
+# 默认的附加失败标记，按整词、区分大小写匹配（MISMATCHES、ERRORS、mismatch 等不会命中）
+FAIL_MARKERS = ("MISMATCH", "ERROR")
+# 仿真输出字节上限
+MAX_OUTPUT_BYTES = int(os.environ.get("JUDGE_MAX_OUTPUT_BYTES", 1024 * 1024))
+# 出现判定标记后继续读取的行数，用于保留测试文件打印的摘要信息（首次不匹配时间等）
+DRAIN_LINES = 20
+# 出现判定标记后最多再等待的时间（秒）
+DRAIN_SECONDS = 0.5
+
+
+@functools.lru_cache(maxsize=64)
+def _fail_pattern(markers):
+    return re.compile("|".join(rf"(?<!\w){re.escape(marker)}(?!\w)" for marker in (FAIL_MARKER,) + markers))
+
+
+class OutputScanner:
+    """逐行扫描仿真输出，并将其写入日志"""
+
+    def __init__(self, log, max_bytes=MAX_OUTPUT_BYTES, drain_lines=DRAIN_LINES, fail_markers=FAIL_MARKERS):
+        self.log = log
+        self._fail_re = _fail_pattern(tuple(fail_markers))
+        self.max_bytes = max_bytes
+        self.drain_lines = drain_lines
+        self.bytes_seen = 0
+        self.passed = False
+        self.failed = False
+        self.overflow = False
+        self._drain_left = None
+
+    @property
+    def decided(self):
+        """是否已经得到判定结论"""
+        return self.passed or self.failed
+
+    def mark_overflow(self):
+        """输出超过上限"""
+        self.overflow = True
+        self.log.write(f"ERROR: Output limit exceeded ({self.max_bytes} bytes), simulation aborted\n")
+
+    def feed(self, raw_line):
+        """
+        处理一行输出
+        :param raw_line: 原始字节行
+        :return: 是否应当立即结束仿真
+        """
+        self.bytes_seen += len(raw_line)
+        if self.bytes_seen > self.max_bytes:
+            self.mark_overflow()
+            return True
+        line = raw_line.decode("utf-8", errors="replace")
+        self.log.write(line if line.endswith("\n") else line + "\n")
+        if self._fail_re.search(line):
+            self.failed = True
+        elif PASS_MARKER in line:
+            self.passed = True
+        if self.decided:
+            if self._drain_left is None:
+                self._drain_left = self.drain_lines
+                return False
+            self._drain_left -= 1
+            return self._drain_left <= 0
+        return False
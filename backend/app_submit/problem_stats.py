@@ -0,0 +1,221 @@
+"""
+题目统计与用户完成状态
+ProblemStats 保存各题目的提交用户数、通过用户数、提交次数与平均判题耗时，
+UserProblemStatus 保存每个用户对各题目的最好结果、最近一次提交的状态、提交次数与首次通过时间。
+两者在提交时与写回判题结果时在同一事务中增量更新，题目列表只需读取 ProblemStats 与当前用户的 UserProblemStatus。
+
+计数使用 UPDATE ... SET x = x + n 原子更新；用户是否首次提交、是否首次通过由对 UserProblemStatus 行的
+条件插入/条件更新是否生效判断，多个 Web 进程与判题进程同时写入时不会重复计数。
+统计与提交记录不一致时（如升级前的数据、直接修改数据库）可用 manage.py rebuild-problem-stats 重新统计。
+"""
+from sqlalchemy import func, or_
+from sqlalchemy.exc import IntegrityError
+from exts import db
+from models import ProblemStats, UserProblemStatus, Submission, SubmissionStatus, JudgeMetrics
+
+
+def _ensure_row(problem_id):
+    if db.session.get(ProblemStats, problem_id) is not None:
+        return
+    try:
+        with db.session.begin_nested():
+            db.session.add(ProblemStats(problem_id=problem_id))
+    except IntegrityError:
+        # 其他进程已创建
+        pass
+
+
+def _bump(problem_id, **deltas):
+    """原子地累加题目统计字段"""
+    deltas = {key: value for key, value in deltas.items() if value}
+    if not deltas:
+        return
+    _ensure_row(problem_id)
+    ProblemStats.query.filter_by(problem_id=problem_id).update(
+        {getattr(ProblemStats, key): getattr(ProblemStats, key) + value for key, value in deltas.items()},
+        synchronize_session=False
+    )
+
+
+def _user_row(submission):
+    return UserProblemStatus.query.filter_by(user_id=submission.user_id, problem_id=submission.problem_id)
+
+
+def _insert_user_row(submission):
+    """用户首次提交该题时创建完成状态记录，已存在时返回 False"""
+    try:
+        with db.session.begin_nested():
+            db.session.add(UserProblemStatus(
+                user_id=submission.user_id,
+                problem_id=submission.problem_id,
+                latest_submission_id=submission.id,
+                latest_status=submission.status,
+                attempts=1
+            ))
+        return True
+    except IntegrityError:
+        return False
+
+
+def _update_best(submission):
+    """按本次判定更新用户的最好结果，返回通过用户数的变化（首次通过时为 1）"""
+    if submission.status == SubmissionStatus.SUCCESS:
+        changed = _user_row(submission).filter(or_(
+            UserProblemStatus.best_status.is_(None),
+            UserProblemStatus.best_status != SubmissionStatus.SUCCESS
+        )).update({
+            UserProblemStatus.best_status: SubmissionStatus.SUCCESS,
+            UserProblemStatus.first_solved_at: submission.created_at
+        }, synchronize_session=False)
+        return 1 if changed else 0
+    if submission.status == SubmissionStatus.FAILED:
+        _user_row(submission).filter(UserProblemStatus.best_status.is_(None)).update(
+            {UserProblemStatus.best_status: SubmissionStatus.FAILED}, synchronize_session=False)
+    return 0
+
+
+def _revoke_pass(submission):
+    """
+    通过的提交经重新判题未通过时，按用户其余通过的提交更新最好结果与首次通过时间
+    :return: 通过用户数的变化（用户不再有通过的提交时为 -1）
+    """
+    first_solved_at = db.session.query(func.min(Submission.created_at)).filter(
+        Submission.user_id == submission.user_id,
+        Submission.problem_id == submission.problem_id,
+        Submission.status == SubmissionStatus.SUCCESS,
+        Submission.id != submission.id
+    ).scalar()
+    if first_solved_at is not None:
+        _user_row(submission).update({UserProblemStatus.first_solved_at: first_solved_at}, synchronize_session=False)
+        return 0
+    changed = _user_row(submission).filter(UserProblemStatus.best_status == SubmissionStatus.SUCCESS).update({
+        UserProblemStatus.best_status: SubmissionStatus.FAILED,
+        UserProblemStatus.first_solved_at: None
+    }, synchronize_session=False)
+    return -1 if changed else 0
+
+
+def record_submission(submission):
+    """
+    新提交写入当前事务后调用（提交时的编译前检查之后）：
+    提交次数加一，用户首次提交该题时提交用户数加一，编译前检查已给出判定时一并记录
+    """
+    db.session.flush()
+    created = _insert_user_row(submission)
+    if not created:
+        _user_row(submission).update({UserProblemStatus.attempts: UserProblemStatus.attempts + 1},
+                                     synchronize_session=False)
+        # 并发提交时只保留最新一次提交
+        _user_row(submission).filter(or_(
+            UserProblemStatus.latest_submission_id.is_(None),
+            UserProblemStatus.latest_submission_id < submission.id
+        )).update({
+            UserProblemStatus.latest_submission_id: submission.id,
+            UserProblemStatus.latest_status: submission.status
+        }, synchronize_session=False)
+    _bump(submission.problem_id, attempts=1, submitted_users=1 if created else 0,
+          passed_users=_update_best(submission))
+
+
+def record_status(submission):
+    """提交状态变化（排队中、运行中）时更新用户最近一次提交的状态"""
+    _user_row(submission).filter(UserProblemStatus.latest_submission_id == submission.id).update(
+        {UserProblemStatus.latest_status: submission.status}, synchronize_session=False)
+
+
+def record_verdict(submission, previous_status, judge_ms=None):
+    """
+    写回判题结果时调用（与结果在同一事务中提交）
+    :param previous_status: 写回前的提交状态，重新判题时可能由通过变为未通过
+    :param judge_ms: 本次判题耗时，计入平均判题耗时
+    """
+    record_status(submission)
+    passed_delta = _update_best(submission)
+    if previous_status == SubmissionStatus.SUCCESS and submission.status != SubmissionStatus.SUCCESS:
+        passed_delta += _revoke_pass(submission)
+    _bump(submission.problem_id, passed_users=passed_delta,
+          judged_count=1 if judge_ms is not None else 0, judge_ms_total=judge_ms or 0)
+
+
+def load_stats():
+    """所有题目的统计 {problem_id: ProblemStats.to_dict()}"""
+    return {row.problem_id: row.to_dict() for row in ProblemStats.query.all()}
+
+
+def load_completion(user_id):
+    """用户对各题目的完成状态 {problem_id: 完成状态字符串}，没有提交过的题目不在其中"""
+    return {
+        row.problem_id: row.completion_status()
+        for row in UserProblemStatus.query.filter_by(user_id=user_id).all()
+    }
+
+
+def _rebuild_problem_stats():
+    rows = {}
+
+    def row(problem_id):
+        return rows.setdefault(problem_id, ProblemStats(problem_id=problem_id, submitted_users=0, passed_users=0,
+                                                        attempts=0, judged_count=0, judge_ms_total=0))
+
+    for problem_id, users, attempts in db.session.query(
+            Submission.problem_id, func.count(func.distinct(Submission.user_id)), func.count(Submission.id)
+    ).group_by(Submission.problem_id):
+        row(problem_id).submitted_users = users
+        row(problem_id).attempts = attempts
+    for problem_id, users in db.session.query(
+            Submission.problem_id, func.count(func.distinct(Submission.user_id))
+    ).filter(Submission.status == SubmissionStatus.SUCCESS).group_by(Submission.problem_id):
+        row(problem_id).passed_users = users
+    for problem_id, judged, total in db.session.query(
+            Submission.problem_id, func.count(JudgeMetrics.total_ms), func.coalesce(func.sum(JudgeMetrics.total_ms), 0)
+    ).join(JudgeMetrics, JudgeMetrics.submission_id == Submission.id).group_by(Submission.problem_id):
+        row(problem_id).judged_count = judged
+        row(problem_id).judge_ms_total = total
+    rows.pop(None, None)
+    ProblemStats.query.delete(synchronize_session=False)
+    db.session.add_all(rows.values())
+    return len(rows)
+
+
+def _rebuild_user_status():
+    rows = {}
+    key = (Submission.user_id, Submission.problem_id)
+    for user_id, problem_id, attempts, latest_id in db.session.query(
+            *key, func.count(Submission.id), func.max(Submission.id)
+    ).group_by(*key):
+        rows[(user_id, problem_id)] = UserProblemStatus(user_id=user_id, problem_id=problem_id, attempts=attempts,
+                                                        latest_submission_id=latest_id)
+    latest = db.session.query(func.max(Submission.id).label("id")).group_by(*key).subquery()
+    for user_id, problem_id, status in db.session.query(*key, Submission.status).join(
+            latest, latest.c.id == Submission.id):
+        rows[(user_id, problem_id)].latest_status = status
+    for user_id, problem_id in db.session.query(*key).filter(
+            Submission.status == SubmissionStatus.FAILED).group_by(*key):
+        rows[(user_id, problem_id)].best_status = SubmissionStatus.FAILED
+    for user_id, problem_id, first_solved_at in db.session.query(*key, func.min(Submission.created_at)).filter(
+            Submission.status == SubmissionStatus.SUCCESS).group_by(*key):
+        rows[(user_id, problem_id)].best_status = SubmissionStatus.SUCCESS
+        rows[(user_id, problem_id)].first_solved_at = first_solved_at
+    rows = {k: v for k, v in rows.items() if None not in k}
+    UserProblemStatus.query.delete(synchronize_session=False)
+    db.session.add_all(rows.values())
+    return len(rows)
+
+
+def rebuild_stats():
+    """
+    按提交记录与判题统计重新计算题目统计与用户完成状态
+    :return: (有统计的题目数, 用户完成状态记录数)
+    """
+    problems = _rebuild_problem_stats()
+    users = _rebuild_user_status()
+    db.session.commit()
+    return problems, users
+
+
+def ensure_stats():
+    """统计表为空而已有提交时（升级前的数据库）重新统计"""
+    if Submission.query.first() is None:
+        return
+    if ProblemStats.query.first() is None or UserProblemStatus.query.first() is None:
+        rebuild_stats()
@@ -0,0 +1,167 @@
+"""
+批量重新判题
+按题目、状态、错误码和提交时间筛选已完成的提交，分发到独立的进程池中用 sim_run_verilog 重新判题。
+进度逐条追加到状态文件（JSON Lines），中断后以相同条件再次运行会跳过已完成的提交。
+"""
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+import multiprocessing
+from exts import db
+from models import Submission, SubmissionStatus
+from app_submit.judge_pool import create_worker_app, WORKER_CONFIG_KEYS
+
+# 重新判题进程的 nice 值，让出 CPU 给在线判题
+DEFAULT_NICE = 10
+
+# 进程池中的 Flask 应用，由 _init_worker 创建
+_worker_app = None
+
+
+def select_submissions(problems=(), statuses=(), error_codes=(), since=None, until=None):
+    """
+    按条件筛选提交
+    :return: [(submission_id, 原错误码)]，按提交ID排序
+    """
+    query = Submission.query.with_entities(Submission.id, Submission.error_code)
+    if problems:
+        query = query.filter(Submission.problem_id.in_(problems))
+    # 默认只处理已完成的提交，排队中/运行中的提交由在线判题负责
+    query = query.filter(Submission.status.in_(statuses or (SubmissionStatus.SUCCESS, SubmissionStatus.FAILED)))
+    if error_codes:
+        query = query.filter(Submission.error_code.in_(error_codes))
+    if since:
+        query = query.filter(Submission.created_at >= since)
+    if until:
+        query = query.filter(Submission.created_at < until)
+    return [(row.id, row.error_code) for row in query.order_by(Submission.id).all()]
+
+
+class RejudgeState:
+    """
+    状态文件：首行记录筛选条件，之后每行记录一个已完成的提交
+    {"id": 1, "old": "ERROR_MISMATCH", "new": "SUCCESS"}
+    全部完成后追加一行 {"finished_at": ...}，之后再次运行将从头开始
+    """
+
+    def __init__(self, path, filters):
+        self.path = path
+        self.filters = filters
+        self.done = {}      # {submission_id: (原错误码, 新错误码)}
+
+    def load(self):
+        """读取未完成的进度；文件不存在、筛选条件不一致或上次已全部完成时返回 False"""
+        if not os.path.exists(self.path):
+            return False
+        with open(self.path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+        try:
+            if not lines or json.loads(lines[0]).get("filters") != self.filters:
+                return False
+        except ValueError:
+            return False
+        done = {}
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # 中断时可能留下不完整的最后一行
+                continue
+            if "finished_at" in entry:
+                return False
+            done[entry["id"]] = (entry["old"], entry["new"])
+        self.done = done
+        return True
+
+    def reset(self):
+        self.done = {}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps({"filters": self.filters, "started_at": datetime.now().isoformat()}) + "\n")
+
+    def record(self, submission_id, old, new):
+        self.done[submission_id] = (old, new)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"id": submission_id, "old": old, "new": new}) + "\n")
+
+    def finish(self):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"finished_at": datetime.now().isoformat()}) + "\n")
+
+    def changes(self):
+        """判题结果发生变化的提交 {(原错误码, 新错误码): [submission_id]}"""
+        result = {}
+        for submission_id, (old, new) in sorted(self.done.items()):
+            if old != new:
+                result.setdefault((old, new), []).append(submission_id)
+        return result
+
+
+def _init_worker(config, root_path, instance_path, niceness):
+    global _worker_app
+    if niceness and hasattr(os, "nice"):
+        try:
+            os.nice(niceness)
+        except OSError:
+            pass
+    _worker_app = create_worker_app(config, root_path, instance_path)
+
+
+def _rejudge_one(submission_id, use_cache):
+    """在进程池中重新判题并写回结果（同时写入状态事件，正在查看该提交的页面会收到新结果），返回新的错误码"""
+    from app_submit.run_sim import sim_run_verilog, apply_result, commit_result
+    with _worker_app.app_context():
+        try:
+            submission = db.session.get(Submission, submission_id)
+            if submission is None:
+                return None
+            started_at = datetime.now()
+            sim_result = sim_run_verilog(submission_id, use_cache=use_cache)
+            # 重新判题不经过判题队列，排队时间记为 0，而不是从提交时间算起
+            apply_result(submission, sim_result, started_at, queued_at=started_at)
+            commit_result(submission)
+            return submission.error_code
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+def run_rejudge(app, targets, state, workers, use_cache=True, niceness=DEFAULT_NICE, on_progress=None):
+    """
+    重新判题
+    :param targets: [(submission_id, 原错误码)]，已在 state 中完成的会被跳过
+    :param on_progress: 每完成一个提交时调用 on_progress(submission_id, 原错误码, 新错误码或异常)
+    :return: 失败的提交ID列表
+    """
+    pending = [(sid, old) for sid, old in targets if sid not in state.done]
+    config = {k: app.config[k] for k in WORKER_CONFIG_KEYS if k in app.config}
+    failed = []
+    with ProcessPoolExecutor(
+        max_workers=max(1, workers),
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(config, app.root_path, app.instance_path, niceness)
+    ) as executor:
+        futures = {executor.submit(_rejudge_one, sid, use_cache): (sid, old) for sid, old in pending}
+        try:
+            for future in as_completed(futures):
+                sid, old = futures[future]
+                try:
+                    new = future.result()
+                except Exception as e:
+                    failed.append(sid)
+                    if on_progress:
+                        on_progress(sid, old, e)
+                    continue
+                if new is not None:
+                    state.record(sid, old, new)
+                if on_progress:
+                    on_progress(sid, old, new)
+        except KeyboardInterrupt:
+            # 中断时丢弃尚未开始的任务，已完成的进度保留在状态文件中
+            executor.shutdown(wait=True, cancel_futures=True)
+            raise
+    return failed
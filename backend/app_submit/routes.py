@@ -1,17 +1,30 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file, Response
 from flask_login import login_user, logout_user, current_user
 from flask_cors import CORS
-from models import User, UserCode, Problem, Submission, SubmissionStatus, ErrorCode, SimulationResult, login_required
+from models import User, UserCode, Problem, Submission, SubmissionStatus, ErrorCode, SimulationResult, JudgeMetrics, JudgeCase, VerdictCache, login_required
+from models import BASE_DIR
 from threading import Lock
 from exts import db
 import os
-from app_submit.run_sim import sim_run_verilog
+import json
+import time
+from queue import Empty
+from app_submit.run_sim import sim_run_verilog, ensure_waveform, live_log_path
+from app_submit.events import status_hub, FINAL_STATUSES
+from app_submit.waveform import read_waveform_text, load_index, query_waveform, is_compressed, compress_legacy_waveform
+from app_submit.waveform_jobs import WaveformPending, RETRY_AFTER_SECONDS
 
 submit_bp = Blueprint('submission', __name__)
 CORS(submit_bp, resources={r"/*": {"origins": "http://localhost:5173", "supports_credentials": True}})
 
 simulation_lock = Lock()
 
+# 单次请求最多返回的日志字节数
+LOG_CHUNK_BYTES = 1024 * 1024
+# 状态推送连接的心跳间隔与最长保持时间（秒），超时后由客户端自动重连
+EVENT_KEEPALIVE_SECONDS = 15
+EVENT_STREAM_SECONDS = 600
+
 # ---------- 获取用户历史提交记录 ----------
 @submit_bp.route('/', methods=['GET'])
 @login_required
@@ -46,25 +59,135 @@ def getSubmission(submission_id):
     return _format_response(submission)
 
 
+# ---------- 订阅提交状态 ----------
+@submit_bp.route('/<int:submission_id>/events', methods=['GET'])
+def getSubmissionEvents(submission_id):
+    """
+    以 Server-Sent Events 推送提交状态变化（QUEUED → RUNNING → SUCCESS/FAILED）及排队位置
+    连接建立时先发送一次当前状态，之后只在状态变化时推送，不再查询数据库；进入最终状态后关闭连接
+    """
+    # 先订阅再读取当前状态，避免两者之间发生的状态变化丢失
+    queue = status_hub.subscribe(submission_id)
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        status_hub.unsubscribe(submission_id, queue)
+        return jsonify({"error": "提交记录不存在"}), 404
+    current = {
+        "submission_id": submission_id,
+        "status": submission.status,
+        "error_code": submission.error_code,
+        "position": status_hub.position(submission_id) if submission.status == SubmissionStatus.QUEUED else None
+    }
+    db.session.remove()
+
+    def generate():
+        try:
+            event = current
+            deadline = time.monotonic() + EVENT_STREAM_SECONDS
+            while True:
+                if event is not None:
+                    yield f"event: status\ndata: {json.dumps(event)}\n\n"
+                    if event["status"] in FINAL_STATUSES:
+                        return
+                if time.monotonic() >= deadline:
+                    return
+                try:
+                    event = queue.get(timeout=EVENT_KEEPALIVE_SECONDS)
+                except Empty:
+                    event = None
+                    yield ": keepalive\n\n"
+        finally:
+            status_hub.unsubscribe(submission_id, queue)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+
 # ---------- 获取日志文件内容 ----------
 @submit_bp.route('/<int:submission_id>/log', methods=['GET'])
 def getLog(submission_id):
-    """获取指定提交的日志文件内容"""
+    """
+    获取指定提交的日志文件内容
+    支持 offset/length/tail 参数按字节读取部分内容，支持 ETag/If-None-Match；
+    stream=1 时以 text/plain 流式返回原始文件，并支持 Range 请求。
+    判题期间返回正在写入的日志（running 为 true），客户端可从 next_offset 继续读取
+    """
     submission = Submission.query.get(submission_id)
     if not submission:
         return jsonify({"error": "提交记录不存在"}), 404
-    log_path = submission.log_path
-    if not log_path or not os.path.exists(log_path):
+    running = submission.status == SubmissionStatus.RUNNING
+    if running:
+        log_file = live_log_path(BASE_DIR / "sub_data", submission.id)
+    elif submission.log_path:
+        log_file = BASE_DIR / submission.log_path
+    else:
+        log_file = None
+    if log_file is None or not log_file.exists():
         return jsonify({"error": "日志文件不存在"}), 404
+    if request.args.get('stream'):
+        # 由 werkzeug 处理 Range、ETag 与 304
+        return send_file(log_file, mimetype='text/plain; charset=utf-8', conditional=True, etag=True, max_age=0)
     try:
-        # 读取日志文件内容
-        with open(log_path, 'r', encoding='utf-8') as f:
-            log_content = f.read()
-        return jsonify({"status": "success", "log_content": log_content})
+        offset = request.args.get('offset', type=int)
+        length = request.args.get('length', default=LOG_CHUNK_BYTES, type=int)
+        tail = request.args.get('tail', type=int)
+    except ValueError:
+        return jsonify({"error": "参数格式错误"}), 400
+    length = max(0, min(length, LOG_CHUNK_BYTES))
+    try:
+        stat = log_file.stat()
+        # 返回内容随读取范围变化，ETag 包含范围参数
+        etag = f"{stat.st_size:x}-{stat.st_mtime_ns:x}-{offset}-{length}-{tail}"
+        if request.if_none_match.contains(etag):
+            return Response(status=304, headers={"ETag": f'"{etag}"'})
+        size = stat.st_size
+        if tail is not None:
+            start = max(0, size - max(0, tail))
+        else:
+            start = min(max(0, offset or 0), size)
+        with open(log_file, 'rb') as f:
+            f.seek(start)
+            data = f.read(length)
+        # 按 UTF-8 字符边界对齐，避免把一个字符拆到两次请求中
+        skipped = _utf8_lead_skip(data) if tail is not None or offset else 0
+        text, used = _utf8_decode_prefix(data[skipped:])
+        next_offset = start + skipped + used
+        response = jsonify({
+            "status": "success",
+            "log_content": text,
+            "offset": start + skipped,
+            "next_offset": next_offset,
+            "size": size,
+            "eof": next_offset >= size,
+            "running": running
+        })
+        response.set_etag(etag)
+        return response
     except Exception as e:
         return jsonify({"error": f"无法读取日志文件: {str(e)}"}), 500
 
 
+def _utf8_lead_skip(data):
+    """从字符中间开始读取时，跳过开头的 UTF-8 续字节"""
+    skipped = 0
+    while skipped < min(3, len(data)) and (data[skipped] & 0xC0) == 0x80:
+        skipped += 1
+    return skipped
+
+
+def _utf8_decode_prefix(data):
+    """解码最长的完整 UTF-8 前缀，返回 (文本, 使用的字节数)"""
+    for cut in range(0, min(4, len(data) + 1)):
+        try:
+            end = len(data) - cut
+            return data[:end].decode('utf-8'), end
+        except UnicodeDecodeError:
+            continue
+    return data.decode('utf-8', errors='replace'), len(data)
+
+
 # ---------- 获取波形文件内容 ----------
 @submit_bp.route('/<int:submission_id>/waveform', methods=['GET'])
 def getWaveform(submission_id):
@@ -72,26 +195,130 @@ def getWaveform(submission_id):
     submission = Submission.query.get(submission_id)
     if not submission:
         return jsonify({"error": "提交记录不存在"}), 404
-    waveform_path = submission.waveform_path
-    if not waveform_path or not os.path.exists(waveform_path):
+    waveform_path = _ensure_waveform(submission)
+    if not waveform_path:
         return jsonify({"error": "波形文件不存在"}), 404
     try:
-        # 读取波形文件内容
-        with open(waveform_path, 'r', encoding='utf-8') as f:
-            waveform_content = f.read()
+        # 读取波形文件内容（压缩存储的波形在此解压）
+        waveform_content = read_waveform_text(BASE_DIR / waveform_path)
         return jsonify({"status": "success", "waveform_content": waveform_content})
     except Exception as e:
         return jsonify({"error": f"无法读取波形文件: {str(e)}"}), 500
 
 
+# ---------- 获取波形信号列表 ----------
+@submit_bp.route('/<int:submission_id>/waveform/index', methods=['GET'])
+def getWaveformIndex(submission_id):
+    """获取波形的时间单位、时间范围和信号列表"""
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        return jsonify({"error": "提交记录不存在"}), 404
+    waveform_file = _indexed_waveform(submission)
+    if waveform_file is None:
+        return jsonify({"error": "波形文件不存在"}), 404
+    try:
+        index = load_index(waveform_file)
+    except Exception as e:
+        return jsonify({"error": f"无法读取波形索引: {str(e)}"}), 500
+    return jsonify({
+        "status": "success",
+        "timescale": index["timescale"],
+        "start_time": index["start_time"],
+        "end_time": index["end_time"],
+        "signals": [{
+            "name": signal["name"],
+            "width": signal["width"],
+            "type": signal["type"]
+        } for signal in index["signals"]]
+    })
+
+
+# ---------- 按信号和时间窗口查询波形 ----------
+@submit_bp.route('/<int:submission_id>/waveform/query', methods=['GET'])
+def queryWaveform(submission_id):
+    """返回指定信号在时间窗口内的变化，可按点数抽稀"""
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        return jsonify({"error": "提交记录不存在"}), 404
+    names = [name.strip() for name in request.args.get('signals', '').split(',') if name.strip()]
+    if not names:
+        return jsonify({"error": "需要指定信号"}), 400
+    try:
+        start = request.args.get('start', type=int)
+        end = request.args.get('end', type=int)
+        max_points = request.args.get('max_points', type=int)
+    except ValueError:
+        return jsonify({"error": "参数格式错误"}), 400
+    waveform_file = _indexed_waveform(submission)
+    if waveform_file is None:
+        return jsonify({"error": "波形文件不存在"}), 404
+    try:
+        index = load_index(waveform_file)
+        signals = query_waveform(waveform_file, index, names, start, end, max_points)
+    except KeyError as e:
+        return jsonify({"error": f"信号不存在: {e.args[0]}"}), 404
+    except Exception as e:
+        return jsonify({"error": f"无法读取波形文件: {str(e)}"}), 500
+    return jsonify({
+        "status": "success",
+        "timescale": index["timescale"],
+        "start": index["start_time"] if start is None else start,
+        "end": index["end_time"] if end is None else end,
+        "signals": signals
+    })
+
+
+@submit_bp.errorhandler(WaveformPending)
+def _waveform_pending(e):
+    """波形由判题端生成，生成期间各波形接口返回 202，客户端按 Retry-After 重新请求"""
+    response = jsonify({"status": "pending", "message": "波形生成中，请稍后重试"})
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response, 202
+
+
+def _ensure_waveform(submission):
+    """返回提交的波形路径，判题时未保存波形的提交在此请求判题端生成（生成期间抛出 WaveformPending）"""
+    try:
+        return ensure_waveform(submission)
+    except WaveformPending:
+        raise
+    except Exception as e:
+        db.session.rollback()
+        print(f"生成提交 {submission.id} 的波形失败: {e}")
+        return None
+
+
+def _indexed_waveform(submission):
+    """返回带索引的压缩波形路径；旧的未压缩波形在首次查询时转换"""
+    waveform_path = _ensure_waveform(submission)
+    if not waveform_path:
+        return None
+    waveform_file = BASE_DIR / waveform_path
+    if not is_compressed(waveform_file):
+        waveform_file = compress_legacy_waveform(waveform_file)
+        # 引用同一波形文件的提交（判题缓存命中）一并更新路径
+        Submission.query.filter_by(waveform_path=waveform_path).update(
+            {Submission.waveform_path: str(waveform_file.relative_to(BASE_DIR))},
+            synchronize_session=False)
+        VerdictCache.query.filter_by(waveform_path=waveform_path).update(
+            {VerdictCache.waveform_path: str(waveform_file.relative_to(BASE_DIR))},
+            synchronize_session=False)
+        db.session.commit()
+    return waveform_file
+
+
 def _format_response(submission):
     """统一响应格式化"""
+    metrics = JudgeMetrics.query.get(submission.id)
+    cases = JudgeCase.query.filter_by(submission_id=submission.id).order_by(JudgeCase.case_index).all()
     response_data = {
         "problem_id": submission.problem_id,
         "status": submission.status,
         "error_code": submission.error_code,
         "log_path": submission.log_path,
         "waveform_path": submission.waveform_path,
-        "created_at": submission.created_at.isoformat()
+        "created_at": submission.created_at.isoformat(),
+        "metrics": metrics.to_dict() if metrics else None,
+        "cases": [case.to_dict() for case in cases] or None
     }
     return jsonify(response_data)
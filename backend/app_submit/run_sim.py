@@ -3,60 +3,298 @@ from models import ErrorCode, SimulationResult
 from models import SubmissionStatus
 from flask import current_app
 from pathlib import Path
-import shutil
-import subprocess
-import tempfile
 from datetime import datetime
-from models import BASE_DIR, PROB_DIR, IVERILOG, VVP
-from queue import Queue
+from models import BASE_DIR, PROB_DIR
+import os
+import threading
+import time
 from exts import db
-from models import Problem
+from sqlalchemy import text
+from models import Problem, JudgeJob, JudgeMetrics, JudgeCase, WaveformJobStatus
+from app_submit.judge_pool import JudgePool
+from app_submit import verdict_cache
+from app_submit.workspace import get_workspace_manager, write_run_file, replacing, link_artifact, MAX_IDLE_PER_PROBLEM
+from app_submit.metrics import RunMetrics
+from app_submit.sim_engine import run_simulation
+from app_submit.manifest import load_manifest, load_cases
+from app_submit.simulators import get_backend
+from app_submit.lint import check_project_code, expected_interface
+from app_submit import cases
+from app_submit import problem_stats
+from app_submit.waveform import store_waveform, index_path_for, is_compressed
+from app_submit.job_queue import requeue_expired_jobs, finish_job, worker_identity, LEASE_SECONDS
+from app_submit.waveform_jobs import (request_waveform, claim_waveform_job, finish_waveform_job, release_waveform_job,
+                                     reset_waveform_job, WaveformPending, WAVEFORM_POLL_INTERVAL)
+from app_submit.events import record_event, prune_events, EventTail, EventSignal, is_enqueue
 
-# 创建任务队列
-simulation_queue = Queue()
+def _recover_jobs(app):
+    """回收租约过期的任务并清理过期的状态事件，返回重新排队的任务数"""
+    with app.app_context():
+        try:
+            requeued = requeue_expired_jobs()
+            prune_events()
+        except Exception as e:
+            db.session.rollback()
+            print(f"回收判题任务失败: {e}")
+            return 0
+        finally:
+            db.session.remove()
+    if requeued:
+        print(f"已重新排队 {requeued} 个未完成的判题任务")
+    return requeued
 
-def simulation_worker(app):
-    """后台线程：从队列中获取任务并执行仿真"""
-    with app.app_context():  # 手动激活应用上下文
-        while True:
-            try:
-                print("等待仿真任务...")
-                # 从队列中获取 submission_id
-                submission_id = simulation_queue.get()
-                if submission_id is None:
-                    break  # 退出线程
-                # 获取 submission 对象
-                submission = Submission.query.get(submission_id)
-                if not submission:
-                    continue
-                # 更新状态为 RUNNING
-                submission.status = SubmissionStatus.RUNNING
-                db.session.commit()
-                print(f"开始仿真任务: {submission_id}")
-                # 执行仿真
+def run_judge(app, workers, stop=None):
+    """
+    判题端主循环（manage.py judge，开发时由 python app.py 在后台线程中运行）：
+    启动判题进程池，读取状态事件，有新任务时唤醒判题进程，并定期回收崩溃进程（或失联的判题节点）遗留的任务；
+    另有一个波形线程执行 Web 进程入队的按需生成波形任务（见 waveform_jobs.py）。
+    workers 为 0 时不启动判题进程，任务只由远程判题节点领取，仍负责回收任务和生成波形
+    :param stop: threading.Event，设置后退出
+    """
+    stop = stop or threading.Event()
+    tail = EventTail()
+    event_signal = EventSignal()
+    with app.app_context():
+        event_signal.start()
+        tail.start()
+    _recover_jobs(app)
+    pool = None
+    if workers != 0:
+        pool = JudgePool(app, workers)
+        pool.start()
+    # 按需生成波形的任务只在判题端执行（workers 为 0 时同样运行）
+    waveform_thread = threading.Thread(target=_waveform_loop, args=(app, stop), name="waveform-jobs", daemon=True)
+    waveform_thread.start()
+    # 启动前已在排队的任务
+    if pool is not None:
+        pool.notify()
+    recovered_at = time.monotonic()
+    print("等待仿真任务...")
+    try:
+        while not event_signal.wait(stop):
+            with app.app_context():
                 try:
-                    sim_result = sim_run_verilog(submission_id)
-                    submission.status = SubmissionStatus.SUCCESS if sim_result.error_code == ErrorCode.SUCCESS else SubmissionStatus.FAILED
-                    submission.error_code = sim_result.error_code.name
-                    submission.log_path = sim_result.log_path
-                    submission.waveform_path = sim_result.waveform_path
+                    events = tail.poll()
                 except Exception as e:
-                    # 仿真失败
-                    submission.status = SubmissionStatus.FAILED
-                    submission.error_code = str(e)
-                    submission.log_path = ""
-                    submission.waveform_path = ""
-                    print(f"仿真任务异常: {e}")
+                    db.session.rollback()
+                    print(f"读取状态事件失败: {e}")
+                    events = []
                 finally:
-                    db.session.commit()
-                    print(f"仿真任务完成: {submission_id}, 状态: {submission.status}")
-            except Exception as e:
-                print(f"仿真任务执行失败: {e}")
-            finally:
-                simulation_queue.task_done()
+                    db.session.remove()
+            wakeups = sum(1 for event in events if is_enqueue(event))
+            if time.monotonic() - recovered_at >= LEASE_SECONDS:
+                recovered_at = time.monotonic()
+                # 重新排队的任务同样会产生入队事件，在下一次读取时唤醒
+                _recover_jobs(app)
+            if pool is not None:
+                for _ in range(wakeups):
+                    pool.notify()
+    finally:
+        event_signal.close()
+        if pool is not None:
+            pool.shutdown()
+
+def warm_up():
+    """
+    判题进程启动时的预热：建立数据库连接，解析各题目的工程哈希、判题配置、仿真工具路径和模块接口，
+    并为每个测试用例预先构建工作目录，之后的任务只需写入用户代码即可开始编译
+    :return: 完成预热的题目数
+    """
+    db.session.execute(text("SELECT 1"))
+    manager = get_workspace_manager()
+    warmed = 0
+    for problem in Problem.query.order_by(Problem.id).all():
+        project_dir = PROB_DIR / problem.folder_path / "project"
+        if not project_dir.exists():
+            continue
+        try:
+            digest = verdict_cache.project_hash(project_dir)
+            manifest = load_manifest(project_dir)
+            get_backend(manifest["simulator"])
+            if manifest["lint"]:
+                expected_interface(project_dir, digest)
+            manager.prepare(project_dir, digest, len(load_cases(manifest)))
+            warmed += 1
+        except Exception as e:
+            print(f"预热题目 {problem.id} 失败: {e}")
+    return warmed
+
+def judge_submission(submission_id: int, lease=None):
+    """
+    在判题进程中执行单个提交的仿真，并写回结果
+    :param submission_id: 提交ID
+    :param lease: (job_id, owner)，写回结果前确认租约仍有效，避免重复判题覆盖结果
+    """
+    # 获取 submission 对象
+    submission = Submission.query.get(submission_id)
+    if not submission:
+        if lease:
+            finish_job(*lease)
+            db.session.commit()
+        return
+    started_at = start_submission(submission)
+    # 执行仿真
+    try:
+        sim_result = sim_run_verilog(submission_id)
+        apply_result(submission, sim_result, started_at, lease)
+    except Exception as e:
+        # 仿真失败（异常信息只输出到日志，error_code 列只保存错误码）
+        previous_status = submission.status
+        submission.status = SubmissionStatus.FAILED
+        submission.error_code = ErrorCode.ERROR_UNKNOWN.name
+        submission.log_path = ""
+        submission.waveform_path = ""
+        problem_stats.record_verdict(submission, previous_status)
+        print(f"仿真任务异常: {e}")
+    commit_result(submission, lease)
+
+def start_submission(submission):
+    """将提交标记为运行中并推送，返回开始时间"""
+    submission.status = SubmissionStatus.RUNNING
+    started_at = datetime.now()
+    problem_stats.record_status(submission)
+    record_event(submission.id, SubmissionStatus.RUNNING)
+    db.session.commit()
+    print(f"开始仿真任务: {submission.id}")
+    return started_at
+
+def apply_result(submission, sim_result, started_at, lease=None, queued_at=None):
+    """
+    将判题结果、统计与各用例结果写入当前事务（不提交）
+    :param queued_at: 排队起点，默认取判题任务的入队时间，没有任务时取提交时间（重新判题时传入开始时间）
+    """
+    previous_status = submission.status
+    submission.status = SubmissionStatus.SUCCESS if sim_result.error_code == ErrorCode.SUCCESS else SubmissionStatus.FAILED
+    submission.error_code = sim_result.error_code.name
+    submission.log_path = sim_result.log_path
+    submission.waveform_path = sim_result.waveform_path
+    # 重新判题后按新的结果重新生成波形
+    reset_waveform_job(submission.id)
+    judge_ms = _save_metrics(submission, sim_result, started_at, lease, queued_at)
+    _save_cases(submission, sim_result)
+    problem_stats.record_verdict(submission, previous_status, judge_ms)
 
-def sim_run_verilog(submission_id: int) -> SimulationResult:
+def commit_result(submission, lease=None):
+    """
+    结束任务并提交判题结果
+    :return: 租约已失效、结果被丢弃时返回 False
+    """
+    if lease and not finish_job(*lease):
+        # 租约已过期并被其他进程重新领取，放弃本次结果
+        db.session.rollback()
+        print(f"仿真任务 {submission.id} 的租约已失效，丢弃结果")
+        return False
+    record_event(submission.id, submission.status, submission.error_code)
+    db.session.commit()
+    print(f"仿真任务完成: {submission.id}, 状态: {submission.status}")
+    return True
+
+def _save_metrics(submission, sim_result, started_at, lease=None, queued_at=None):
+    """写入判题统计（随判题结果在同一事务中提交），返回判题总耗时"""
+    if sim_result.metrics is None:
+        return None
+    queued_from = queued_at or submission.created_at
+    worker = None
+    if lease:
+        job = db.session.get(JudgeJob, lease[0])
+        if job is not None:
+            queued_from = job.created_at or queued_from
+            started_at = job.claimed_at or started_at
+        worker = lease[1]
+    record = db.session.get(JudgeMetrics, submission.id) or JudgeMetrics(submission_id=submission.id)
+    for key, value in sim_result.metrics.as_dict().items():
+        setattr(record, key, value)
+    record.queued_ms = max(0, round((started_at - queued_from).total_seconds() * 1000)) if queued_from else None
+    record.total_ms = round(sim_result.metrics.total_ms)
+    record.cache_hit = sim_result.cache_hit
+    record.worker = worker
+    record.created_at = datetime.now()
+    db.session.add(record)
+    return record.total_ms
+
+def _save_cases(submission, sim_result):
+    """写入各测试用例的判定与耗时；命中缓存时复制首次判题的记录"""
+    JudgeCase.query.filter_by(submission_id=submission.id).delete(synchronize_session=False)
+    if sim_result.cases is not None:
+        for run in sim_result.cases:
+            timings = run.metrics.as_dict()
+            db.session.add(JudgeCase(
+                submission_id=submission.id,
+                case_index=run.index,
+                name=run.name,
+                hidden=run.hidden,
+                error_code=run.verdict,
+                compile_ms=timings.get("compile_ms"),
+                simulate_ms=timings.get("simulate_ms"),
+                child_cpu_ms=timings.get("child_cpu_ms"),
+                peak_rss_kb=timings.get("peak_rss_kb")
+            ))
+    elif sim_result.cache_hit and sim_result.source_submission_id:
+        for row in JudgeCase.query.filter_by(submission_id=sim_result.source_submission_id).all():
+            db.session.add(JudgeCase(
+                submission_id=submission.id,
+                case_index=row.case_index,
+                name=row.name,
+                hidden=row.hidden,
+                error_code=row.error_code,
+                compile_ms=row.compile_ms,
+                simulate_ms=row.simulate_ms,
+                child_cpu_ms=row.child_cpu_ms,
+                peak_rss_kb=row.peak_rss_kb
+            ))
+
+def write_lint_log(submission_id, errors):
+    """写入编译前检查的日志，格式与仿真日志一致，返回相对路径"""
+    save_dir = BASE_DIR / "sub_data"
+    save_dir.mkdir(parents=True, exist_ok=True)
+    dest_log = save_dir / f"sim_{str(submission_id)}.log"
+    with replacing(dest_log) as tmp, open(tmp, "w", encoding="utf-8") as log:
+        log.write(f"INFO: Start Sim at {datetime.now().isoformat()}\n")
+        log.write("[1/3] Checking source...\n")
+        for error in errors:
+            log.write(f"{error}\n")
+        log.write("ERROR: Compilation failed\n")
+    return str(dest_log.relative_to(BASE_DIR))
+
+def precheck_submission(submission, problem):
+    """
+    提交时的编译前检查：明显无法编译的代码直接判为编译错误，不进入判题队列
+    :return: 是否已判为编译错误
+    """
+    project_dir = PROB_DIR / problem.folder_path / "project"
+    if not project_dir.exists():
+        return False
+    try:
+        errors = check_project_code(project_dir, submission.code)
+    except Exception as e:
+        print(f"编译前检查失败: {e}")
+        return False
+    if not errors:
+        return False
+    submission.status = SubmissionStatus.FAILED
+    submission.error_code = ErrorCode.ERROR_COMPILE_FAIL.name
+    db.session.flush()
+    submission.log_path = write_lint_log(submission.id, errors)
+    submission.waveform_path = ""
+    return True
+
+def default_waveform():
+    """判题时是否保存波形，由 JUDGE_WAVEFORM 决定（on_demand 时不保存，查看时再生成）"""
+    return current_app.config.get('JUDGE_WAVEFORM', 'on_demand') == 'always'
+
+def sim_run_verilog(submission_id: int, use_cache: bool = True, waveform: bool = None) -> SimulationResult:
+    """
+    对提交执行仿真
+    :param submission_id: 提交ID
+    :param use_cache: 是否查询判题结果缓存
+    :param waveform: 是否保存波形，默认由 JUDGE_WAVEFORM 决定
+    :return: SimulationResult
+    """
+    if waveform is None:
+        waveform = default_waveform()
     result = SimulationResult()
+    metrics = RunMetrics()
+    result.metrics = metrics
     submission = Submission.query.get(submission_id)
     if not submission:
         result.error_code = ErrorCode.ERROR_UNKNOWN
@@ -72,124 +310,279 @@ def sim_run_verilog(submission_id: int) -> SimulationResult:
     if not project_dir.exists():
         result.error_code = ErrorCode.ERROR_UNKNOWN
         return result
-        
-    # 创建临时文件夹
-    with tempfile.TemporaryDirectory(dir=BASE_DIR) as temp_dir:
-        temp_dir_path = Path(BASE_DIR/temp_dir)
-        # 将项目文件夹内容复制到临时文件夹
-        shutil.copytree(project_dir, temp_dir_path, dirs_exist_ok=True)
-        # 创建 user_module.v 文件，将用户代码写入
-        user_module_path = temp_dir_path / "user_module.v"
-        with open(user_module_path, 'w', encoding='utf-8') as f:
-            f.write(submission.code)
-        # 准备目标存储目录
-        save_dir = BASE_DIR / "sub_data"
-        save_dir.mkdir(parents=True, exist_ok=True)
+
+    with metrics.phase("setup"):
+        problem_digest = verdict_cache.project_hash(project_dir)
+    decided = quick_verdict(submission, project_dir, problem_digest, metrics, use_cache)
+    if decided is not None:
+        return decided
+
+    result = execute(project_dir, problem_digest, submission.code, BASE_DIR / "sub_data", submission_id,
+                     waveform, metrics)
+    result.log_path = _relative(result.log_path)
+    result.waveform_path = _relative(result.waveform_path)
+    verdict_cache.store(problem.id, problem_digest, verdict_cache.code_hash(submission.code), result, submission_id)
+    return result
+
+def _relative(path):
+    return str(Path(path).relative_to(BASE_DIR)) if path else ""
+
+def quick_verdict(submission, project_dir, problem_digest, metrics, use_cache=True):
+    """
+    不运行仿真即可给出的结果：编译前检查未通过，或命中判题结果缓存
+    :return: SimulationResult，需要仿真时返回 None
+    """
+    # 明显无法编译的代码不启动编译器
+    with metrics.phase("setup"):
+        lint_errors = check_project_code(project_dir, submission.code, problem_digest)
+    if lint_errors:
+        result = SimulationResult()
+        result.metrics = metrics
+        result.error_code = ErrorCode.ERROR_COMPILE_FAIL
+        result.log_path = write_lint_log(submission.id, lint_errors)
+        return result
+
+    # 相同代码在相同工程版本下的判题结果可直接复用
+    with metrics.phase("setup"):
+        code_digest = verdict_cache.code_hash(submission.code)
+        cached = verdict_cache.lookup(problem_digest, code_digest) if use_cache else None
+    if cached is not None:
+        print(f"仿真任务 {submission.id} 命中判题缓存")
+        cached.metrics = metrics
+        try:
+            with metrics.phase("artifact"):
+                _adopt_artifacts(cached, submission.id)
+        except OSError as e:
+            # 首次判题的产物已被清理，按未命中处理
+            print(f"仿真任务 {submission.id} 复用缓存产物失败: {e}")
+            return None
+    return cached
+
+def _adopt_artifacts(result, submission_id):
+    """
+    将缓存中首次判题的日志与波形链接为本提交自己的文件
+    首次判题的提交之后被重新判题时会替换它的文件，命中缓存的提交仍保留与其判定一致的日志与波形
+    """
+    save_dir = BASE_DIR / "sub_data"
+    if result.log_path:
+        dest_log = save_dir / f"sim_{str(submission_id)}.log"
+        if BASE_DIR / result.log_path != dest_log:
+            link_artifact(BASE_DIR / result.log_path, dest_log)
+        result.log_path = _relative(dest_log)
+    if result.waveform_path:
+        src_vcd = BASE_DIR / result.waveform_path
+        if not src_vcd.exists():
+            # 波形已被清理，查看时按需重新生成
+            result.waveform_path = ""
+            return
+        compressed = is_compressed(src_vcd)
+        dest_vcd = save_dir / f"wave_{str(submission_id)}{'.vcd.gz' if compressed else '.vcd'}"
+        if src_vcd != dest_vcd:
+            link_artifact(src_vcd, dest_vcd)
+            if compressed:
+                link_artifact(index_path_for(src_vcd), index_path_for(dest_vcd))
+        result.waveform_path = _relative(dest_vcd)
+
+def execute(project_dir, problem_digest, code, save_dir, submission_id, waveform, metrics) -> SimulationResult:
+    """
+    在工作目录中仿真用户代码，不访问数据库（远程判题节点也使用此函数）
+    :param save_dir: 日志与波形的保存目录
+    :return: SimulationResult，log_path/waveform_path 为绝对路径，未生成时为空
+    """
+    result = SimulationResult()
+    result.metrics = metrics
+    # 按题目配置选择仿真器后端、超时时间与测试用例
+    try:
+        manifest = load_manifest(project_dir)
+        backend = get_backend(manifest["simulator"])
+        test_cases = load_cases(manifest)
+    except Exception as e:
+        print(e)
+        result.error_code = ErrorCode.ERROR_UNKNOWN
+        return result
+
+    # 从工作目录池中为每个用例取出一个工作目录（位于判题临时目录，不在源码目录下）
+    manager = get_workspace_manager()
+    with metrics.phase("setup"):
+        workspaces = [manager.acquire(project_dir, problem_digest) for _ in test_cases]
+    try:
+        with metrics.phase("setup"):
+            # 创建 user_module.v 文件，将用户代码写入
+            for workspace in workspaces:
+                write_run_file(workspace.path / "user_module.v", code)
+            # 准备目标存储目录
+            save_dir = Path(save_dir)
+            save_dir.mkdir(parents=True, exist_ok=True)
         try:
-            # 调用 run_simulation 函数执行仿真
-            error_code = run_simulation(temp_dir_path, timeout_sec=6)
-            result.error_code = error_code
+            # 参考波形模式只仿真用户模块，与录制的参考输出逐周期比较
+            runs = [
+                cases.CaseRun(index, case, workspace.path,
+                              cases.run_options(project_dir, problem_digest, manifest, backend, case))
+                for index, (case, workspace) in enumerate(zip(test_cases, workspaces))
+            ]
+            # 第一个公开用例的日志直接写入 sub_data 中的 sim_<id>.log.part，判题期间可通过 getLog 实时查看
+            live = next((run for run in runs if not run.hidden), None)
+            if live is not None:
+                live.log_file = live_log_path(save_dir, submission_id)
+            # 并行仿真各用例，任一用例失败时按配置终止其余用例
+            cases.run_cases(runs, backend, waveform, manifest["stop_on_failure"], metrics)
+            result.error_code = cases.overall_code(runs)
+            if manifest.get("cases"):
+                result.cases = runs
             # 处理生成的文件
-            src_log = temp_dir_path / "simulation.log"
-            src_vcd = temp_dir_path / "waveform.vcd"
-            if src_log.exists():
+            with metrics.phase("artifact"):
                 dest_log = save_dir / f"sim_{str(submission_id)}.log"
-                shutil.move(str(src_log), str(dest_log))
-                result.log_path = str(dest_log.relative_to(BASE_DIR))
-            if src_vcd.exists():
-                dest_vcd = save_dir / f"wave_{str(submission_id)}.vcd"
-                shutil.move(str(src_vcd), str(dest_vcd))
-                result.waveform_path = str(dest_vcd.relative_to(BASE_DIR))
+                if cases.write_log(runs, dest_log):
+                    result.log_path = str(dest_log)
+                # 波形取自第一个失败的公开用例（全部通过时为第一个公开用例）
+                shown = cases.waveform_case(test_cases, {run.name: run.verdict for run in runs})
+                src_vcd = runs[shown].path / "waveform.vcd" if shown is not None else None
+                if src_vcd is not None and src_vcd.exists():
+                    # 波形分块压缩保存，并生成信号与时间索引
+                    dest_vcd = save_dir / f"wave_{str(submission_id)}.vcd.gz"
+                    store_waveform(src_vcd, dest_vcd)
+                    result.waveform_path = str(dest_vcd)
+                elif not waveform:
+                    # 重新判题时删除上次判题保存的波形，查看时按本次结果重新生成
+                    remove_waveform(save_dir / f"wave_{str(submission_id)}.vcd.gz")
         except Exception as e:
             print(e)
             result.error_code = ErrorCode.ERROR_UNKNOWN
             result.log_path = ""
             result.waveform_path = ""
+            result.cases = None
+    finally:
+        live_log_path(save_dir, submission_id).unlink(missing_ok=True)
+        for workspace in workspaces:
+            manager.release(workspace, max_idle=max(len(workspaces), MAX_IDLE_PER_PROBLEM))
     return result
 
-def run_simulation(base_dir: Path, timeout_sec: int = 6) -> ErrorCode:
-    """
-    Python 函数版本的仿真执行逻辑
-    :param base_dir: 仿真项目的根目录
-    :param timeout_sec: 仿真超时时间（秒）
-    :return: ErrorCode 枚举值
-    """
-    # 配置参数
-    tb_module = "test_bench"
-    log_file =  Path(base_dir/"simulation.log")
-    vcd_file =  Path(base_dir/"waveform.vcd")
-    obj_file =  Path(base_dir/"sim_exec")
-    error_code = ErrorCode.SUCCESS
-
-    # 清理旧文件
-    if vcd_file.exists():
-        vcd_file.unlink()
-    if log_file.exists():
-        log_file.unlink()
+def live_log_path(save_dir, submission_id):
+    """判题期间实时写入的日志，判题结束后合并为 sim_<id>.log 并删除"""
+    return Path(save_dir) / f"sim_{submission_id}.log.part"
 
-    # 编译阶段
-    with open(log_file, "a", encoding="utf-8") as log:
-        log.write(f"INFO: Start Sim at {datetime.now().isoformat()}\n")
-        log.write("[1/3] Compiling...\n")
-        try:
-            subprocess.run(
-                [IVERILOG, "-o", "sim_exec", "-s", tb_module, "-f", "sim_file_list.f"],
-                stdout=log,
-                stderr=subprocess.STDOUT,
-                timeout=timeout_sec,
-                check=True,
-                shell=True,
-                cwd=base_dir
-            )
-        except subprocess.CalledProcessError:
-            log.write("ERROR: Compilation failed\n")
-            return ErrorCode.ERROR_COMPILE_FAIL
-    # 仿真阶段（带超时）
-    with open(log_file, "a", encoding="utf-8") as log:
-        log.write(f"[2/3] Running simulation (timeout: {timeout_sec}s)...\n")
-        try:
-            subprocess.run(
-                [VVP, "-n", "sim_exec"],
-                stdout=log,
-                stderr=subprocess.STDOUT,
-                timeout=timeout_sec,
-                shell=True,
-                cwd=base_dir
-            )
-        except subprocess.TimeoutExpired:
-            log.write("ERROR: Simulation timeout\n")
-            return ErrorCode.ERROR_SIM_TIMEOUT
-        except subprocess.CalledProcessError:
-            log.write("ERROR: Simulation runtime error\n")
-            return ErrorCode.ERROR_SIM_RUN_FAIL
-
-    # 结果检查
-    with open(log_file, "a", encoding="utf-8") as log:
-        log.write("[3/3] Checking results...\n")
+def remove_waveform(waveform_file):
+    for path in (waveform_file, index_path_for(waveform_file)):
         try:
-            with open(log_file, "r", encoding="utf-8") as log_content:
-                log_data = log_content.read()
-                if "TEST FAILED" in log_data:
-                    log.write("ERROR: Output mismatch\n")
-                    return ErrorCode.ERROR_MISMATCH
-                if not vcd_file.exists():
-                    log.write("INFO: VCD file not generated\n")
-                    # return ErrorCode.ERROR_SIM_LOAD_FAIL
-                if "TEST PASSED" in log_data:
-                    log.write("INFO: Simulation PASSED\n")
-                    return ErrorCode.SUCCESS
-                else:
-                    log.write("ERROR: Unknown simulation result\n")
-                    return ErrorCode.ERROR_UNKNOWN
-        except Exception as e:
-            log.write(f"ERROR: Unexpected error during result check: {e}\n")
-            return ErrorCode.ERROR_SIM_RUN_FAIL
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+# 仿真确实运行过、可以重新仿真生成波形的判题结果
+WAVEFORM_CODES = {
+    ErrorCode.SUCCESS.name,
+    ErrorCode.ERROR_MISMATCH.name,
+    ErrorCode.ERROR_SIM_TIMEOUT.name,
+    ErrorCode.ERROR_SIM_RUN_FAIL.name,
+}
 
-    # 清理生成的文件
-    if obj_file.exists():
-        obj_file.unlink()
+def ensure_waveform(submission):
+    """
+    返回提交的波形路径；判题时未保存波形的提交在此请求判题端重新仿真生成，Web 进程不运行仿真
+    :return: 相对 BASE_DIR 的路径，无法生成时返回 None
+    :raises WaveformPending: 波形已入队或正在生成
+    """
+    if submission.waveform_path and (BASE_DIR / submission.waveform_path).exists():
+        return submission.waveform_path
+    if submission.status not in (SubmissionStatus.SUCCESS, SubmissionStatus.FAILED) \
+            or submission.error_code not in WAVEFORM_CODES:
+        return None
+    status = request_waveform(submission.id)
+    if status in (WaveformJobStatus.PENDING, WaveformJobStatus.LEASED):
+        raise WaveformPending()
+    if status == WaveformJobStatus.DONE:
+        # 任务刚完成，重新读取波形路径
+        db.session.refresh(submission)
+        if submission.waveform_path and (BASE_DIR / submission.waveform_path).exists():
+            return submission.waveform_path
+        raise WaveformPending()
+    return None
+
+def _waveform_loop(app, stop):
+    """判题端的波形线程：领取波形任务并重新仿真，同一时刻只生成一个波形"""
+    owner = worker_identity("waveform")
+    while not stop.is_set():
+        with app.app_context():
+            try:
+                submission_id = claim_waveform_job(owner)
+                if submission_id is not None:
+                    generate_waveform(submission_id, owner)
+            except Exception as e:
+                db.session.rollback()
+                print(f"生成波形失败: {e}")
+                submission_id = None
+            finally:
+                db.session.remove()
+        if submission_id is None:
+            stop.wait(WAVEFORM_POLL_INTERVAL)
 
-    with open(log_file, "a", encoding="utf-8") as log:
-        log.write(f"INFO: End Sim at {datetime.now().isoformat()}\n")
+def generate_waveform(submission_id, owner):
+    """
+    执行领取到的波形任务：重新仿真并保存到 sub_data
+    波形先写入带判题端标识的暂存文件，确认租约仍有效后（与任务状态更新在同一事务中）再替换到最终位置，
+    租约已失效的判题端不会覆盖其他判题端或重新判题保存的波形
+    """
+    submission = Submission.query.get(submission_id)
+    save_dir = BASE_DIR / "sub_data"
+    save_dir.mkdir(parents=True, exist_ok=True)
+    dest_vcd = save_dir / f"wave_{submission_id}.vcd.gz"
+    staged_vcd = save_dir / f".wave_{submission_id}.{os.getpid()}.vcd.gz"
+    staged = (staged_vcd, index_path_for(staged_vcd))
+    try:
+        generated = submission is not None and _generate_waveform(submission, staged_vcd)
+    except Exception as e:
+        db.session.rollback()
+        print(f"生成提交 {submission_id} 的波形失败: {e}")
+        for path in staged:
+            path.unlink(missing_ok=True)
+        release_waveform_job(submission_id, owner)
+        return
+    waveform_path = str(dest_vcd.relative_to(BASE_DIR)) if generated else None
+    if finish_waveform_job(submission_id, owner, waveform_path):
+        if generated:
+            # 先替换波形再替换索引，与 store_waveform 一致
+            os.replace(staged_vcd, dest_vcd)
+            os.replace(staged[1], index_path_for(dest_vcd))
+            print(f"已为提交 {submission_id} 重新生成波形")
+        db.session.commit()
+    else:
+        db.session.rollback()
+    for path in staged:
+        path.unlink(missing_ok=True)
 
-    return error_code
\ No newline at end of file
+def _generate_waveform(submission, dest_vcd):
+    """
+    在判题工作目录中重新仿真提交并将波形保存到 dest_vcd，仿真过程与判题相同，结果可复现
+    :return: 是否生成了波形
+    """
+    problem = Problem.query.get(submission.problem_id)
+    if not problem:
+        return False
+    project_dir = PROB_DIR / problem.folder_path / "project"
+    if not project_dir.exists():
+        return False
+    manifest = load_manifest(project_dir)
+    backend = get_backend(manifest["simulator"])
+    test_cases = load_cases(manifest)
+    # 只重新仿真判题时保存波形的那个用例
+    verdicts = {row.name: row.error_code for row in JudgeCase.query.filter_by(submission_id=submission.id)}
+    if not verdicts and len(test_cases) == 1:
+        verdicts = {test_cases[0]["name"]: submission.error_code}
+    shown = cases.waveform_case(test_cases, verdicts)
+    if shown is None:
+        return False
+    case = test_cases[shown]
+    digest = verdict_cache.project_hash(project_dir)
+    options = cases.run_options(project_dir, digest, manifest, backend, case)
+    code = submission.code
+    # 仿真期间不占用数据库连接
+    db.session.commit()
+    manager = get_workspace_manager()
+    with manager.workspace(project_dir, digest) as path:
+        write_run_file(path / "user_module.v", code)
+        run_simulation(path, timeout_sec=case["timeout"], backend=backend, waveform=True, **options)
+        src_vcd = path / "waveform.vcd"
+        if not src_vcd.exists():
+            return False
+        store_waveform(src_vcd, dest_vcd)
+    return True
@@ -0,0 +1,84 @@
+"""
+判题调度策略
+公平调度：按用户轮转领取任务，每个用户最早的等待任务优先，正在判题的任务计入该用户的份额；
+提交限流：每个用户一个令牌桶，超出速率的提交直接拒绝并告知需要等待的时间。
+令牌桶保存在数据库（SubmitBucket）中，多个 Web 进程与主机共享同一限额；
+取令牌是一条带条件的 UPDATE，令牌数在数据库中按时间补充后判断是否足够，并发请求不会多取。
+"""
+import math
+import time
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from exts import db
+from models import SubmitBucket
+
+# 超过该时间（秒）未使用的令牌桶视为已回满，新建令牌桶时删除
+BUCKET_TTL = 3600
+
+
+def fair_order(entries, running=None):
+    """
+    按公平调度规则排序
+    :param entries: [(key, user_id)]，按入队顺序排列
+    :param running: {user_id: 正在判题的任务数}
+    :return: 排序后的 key 列表
+    """
+    running = running or {}
+    ranks = {}
+    keyed = []
+    for index, (key, user_id) in enumerate(entries):
+        rank = ranks.get(user_id, 0)
+        ranks[user_id] = rank + 1
+        # 用户的第 n 个等待任务排在所有用户的第 n-1 个之后，同一轮内按入队先后
+        keyed.append((rank + running.get(user_id, 0), index, key))
+    keyed.sort()
+    return [key for _, _, key in keyed]
+
+
+class SubmitLimiter:
+    """按用户限制提交频率（各 Web 进程共享）"""
+
+    def __init__(self, kind):
+        self.kind = kind
+
+    def acquire(self, user_id, rate_per_minute, burst):
+        """
+        为一次提交取令牌（使用独立连接，不影响调用方的事务）
+        :return: 允许提交时返回 0，否则返回建议的重试等待秒数（向上取整）
+        """
+        if rate_per_minute <= 0 or burst <= 0:
+            return 0
+        rate = rate_per_minute / 60
+        table = SubmitBucket.__table__
+        key = (table.c.user_id == user_id) & (table.c.kind == self.kind)
+        for _ in range(2):
+            now = time.time()
+            # 补充后的令牌数：min(burst, tokens + 经过时间 * rate)
+            refilled = table.c.tokens + (now - table.c.updated) * rate
+            refilled = case((refilled > burst, burst), else_=refilled)
+            with db.engine.begin() as conn:
+                taken = conn.execute(
+                    update(table).where(key, refilled >= 1).values(tokens=refilled - 1, updated=now)
+                ).rowcount
+                if taken == 1:
+                    return 0
+                tokens = conn.execute(select(refilled).where(key)).scalar()
+            if tokens is not None:
+                if tokens < 1:
+                    return math.ceil((1 - tokens) / rate)
+                # 令牌在两条语句之间被补充，重新尝试
+                continue
+            # 首次提交：新建令牌桶并取出一个令牌，其他进程同时新建时重试
+            try:
+                with db.engine.begin() as conn:
+                    conn.execute(delete(table).where(table.c.updated < now - BUCKET_TTL))
+                    conn.execute(insert(table).values(user_id=user_id, kind=self.kind, tokens=burst - 1, updated=now))
+                return 0
+            except IntegrityError:
+                continue
+        return 1
+
+
+submit_limiter = SubmitLimiter("submit")
+# 语法检查接口的频率限制，与提交分开计数
+check_limiter = SubmitLimiter("check")
@@ -0,0 +1,431 @@
+"""
+异步判题引擎
+用 asyncio 直接启动仿真器后端给出的编译/运行命令（不经过 shell），每个子进程放在独立的进程组中，
+超时或得到结论后终止整个进程组，不会留下继续占用 CPU 和输出管道的后代进程。
+POSIX 下子进程由引擎自行以 os.wait4 回收，按子进程记录资源使用。
+一个事件循环可同时驱动多个仿真。本机同时运行的仿真数（判题进程池、波形线程、重新判题进程合计）
+由判题临时目录下的槽位锁文件限制为 MAX_CONCURRENCY，不随判题进程数和用例数成倍增加。
+"""
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import weakref
+from datetime import datetime
+from pathlib import Path
+from models import ErrorCode
+from app_submit.output_scan import DRAIN_SECONDS
+from app_submit.metrics import RunMetrics
+from app_submit.simulators import get_backend, FILE_LIST
+from app_submit.workspace import default_scratch_root
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+
+# 本机同时运行的仿真数，默认为 CPU 核心数
+MAX_CONCURRENCY = int(os.environ.get("JUDGE_SIM_SLOTS", 0)) or os.cpu_count() or 1
+# 槽位都被占用时重新尝试的间隔（秒）
+SLOT_POLL_INTERVAL = 0.05
+
+# 终止进程组后等待输出管道关闭的最长时间（秒）
+REAP_SECONDS = 1
+# 子进程运行期间采样内存高水位的间隔（秒），运行时间更短的子进程不记录峰值内存
+RSS_SAMPLE_INTERVAL = 0.02
+
+_semaphores = weakref.WeakKeyDictionary()   # {事件循环: 信号量}
+
+
+def _semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _semaphores[loop] = asyncio.Semaphore(MAX_CONCURRENCY)
+    return semaphore
+
+
+def _try_slot(slot_dir):
+    """尝试占用一个空闲槽位，返回持有排他锁的文件描述符，全部被占用时返回 None"""
+    start = os.getpid()
+    for i in range(MAX_CONCURRENCY):
+        fd = os.open(slot_dir / f"slot-{(start + i) % MAX_CONCURRENCY}.lock", os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except BlockingIOError:
+            os.close(fd)
+    return None
+
+
+class _Slot:
+    """
+    本机仿真槽位：槽位目录下 MAX_CONCURRENCY 个锁文件，持有其中一个的排他锁（flock）即占用一个槽位。
+    锁随文件描述符释放，进程异常退出也不会泄漏槽位。没有 fcntl 的平台退回单个事件循环内的信号量
+    """
+
+    def __init__(self):
+        self._fd = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        if fcntl is None:
+            self._semaphore = _semaphore()
+            await self._semaphore.acquire()
+            return self
+        slot_dir = default_scratch_root() / "sim-slots"
+        slot_dir.mkdir(parents=True, exist_ok=True)
+        while True:
+            self._fd = _try_slot(slot_dir)
+            if self._fd is not None:
+                return self
+            await asyncio.sleep(SLOT_POLL_INTERVAL)
+
+    async def __aexit__(self, *exc):
+        if self._semaphore is not None:
+            self._semaphore.release()
+        else:
+            os.close(self._fd)
+
+
+def _group_options():
+    """让子进程成为新进程组的组长，便于整组终止"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def _kill_group(process):
+    """终止子进程及其全部后代进程"""
+    if os.name == "nt":
+        if process.returncode is None:
+            subprocess.run(["taskkill", "/F", "/T", "/PID", str(process.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        return
+    try:
+        os.killpg(process.pid, signal.SIGKILL)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def _tree_hwm_kb(pid):
+    """
+    进程及其后代进程中最大的内存高水位（/proc/<pid>/status 的 VmHWM，KB）
+    :return: 没有 /proc 或进程已退出时返回 None
+    """
+    peak = None
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status", "rb") as f:
+                for line in f:
+                    if line.startswith(b"VmHWM:"):
+                        peak = max(peak or 0, int(line.split()[1]))
+                        break
+            with open(f"/proc/{current}/task/{current}/children", "rb") as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            continue
+    return peak
+
+
+class _Child:
+    """
+    由引擎自行回收的子进程（POSIX），接口与 asyncio.subprocess.Process 中用到的部分一致
+    asyncio 的子进程监视器用 waitpid 回收子进程，拿不到资源使用；这里以 os.wait4 回收，
+    得到的是该子进程自身的 CPU 时间与峰值内存，不含同一判题进程中并行运行的其他子进程。
+    退出通知优先使用 pidfd（Linux 5.3+），否则由一个线程阻塞在 os.wait4 上。
+    exec 时内核把判题进程的内存高水位计入子进程的 ru_maxrss，峰值内存因此在运行期间
+    按 RSS_SAMPLE_INTERVAL 采样子进程树的 VmHWM（exec 后重新计算，只增不减）
+    """
+
+    def __init__(self, popen, stdout, transport):
+        self.pid = popen.pid
+        self.stdout = stdout
+        self.returncode = None
+        self.rusage = None
+        self.hwm_kb = None
+        self._popen = popen
+        self._transport = transport
+        self._loop = asyncio.get_running_loop()
+        self._exited = self._loop.create_future()
+        try:
+            pidfd = os.pidfd_open(self.pid)
+        except (AttributeError, OSError):
+            threading.Thread(target=self._wait_blocking, daemon=True).start()
+        else:
+            self._loop.add_reader(pidfd, self._on_pidfd, pidfd)
+        # 刚 exec 时进程尚未载入，第一次采样在一个间隔之后
+        self._sampler = self._loop.call_later(RSS_SAMPLE_INTERVAL, self._sample_rss)
+
+    def _sample_rss(self):
+        self._sampler = None
+        if self.returncode is not None:
+            return
+        hwm_kb = _tree_hwm_kb(self.pid)
+        if hwm_kb is None:
+            return
+        self.hwm_kb = max(self.hwm_kb or 0, hwm_kb)
+        self._sampler = self._loop.call_later(RSS_SAMPLE_INTERVAL, self._sample_rss)
+
+    def _on_pidfd(self, pidfd):
+        self._loop.remove_reader(pidfd)
+        os.close(pidfd)
+        self._exit(*self._wait4(os.WNOHANG))
+
+    def _wait_blocking(self):
+        result = self._wait4(0)
+        self._loop.call_soon_threadsafe(self._exit, *result)
+
+    def _wait4(self, options):
+        try:
+            _, status, rusage = os.wait4(self.pid, options)
+            return os.waitstatus_to_exitcode(status), rusage
+        except ChildProcessError:
+            return 255, None
+
+    def _exit(self, returncode, rusage):
+        self.returncode = self._popen.returncode = returncode
+        self.rusage = rusage
+        if self._sampler is not None:
+            self._sampler.cancel()
+        if not self._exited.done():
+            self._exited.set_result(returncode)
+
+    async def wait(self):
+        return await asyncio.shield(self._exited)
+
+    def close(self):
+        """关闭输出管道（进程组已终止，剩余输出已读取或放弃）"""
+        if self._transport is not None:
+            self._transport.close()
+
+
+async def _spawn(command, cwd, stdout, limit=None):
+    """
+    启动子进程（独立进程组，stderr 合并到 stdout）
+    :param stdout: 日志文件或 asyncio.subprocess.PIPE，后者的输出由返回对象的 stdout（StreamReader）读取
+    """
+    if not hasattr(os, "wait4"):
+        # Windows：由 asyncio 回收，不记录资源使用
+        return await asyncio.create_subprocess_exec(
+            *command, cwd=cwd, stdout=stdout, stderr=subprocess.STDOUT,
+            **({"limit": limit} if limit else {}), **_group_options())
+    popen = subprocess.Popen(command, cwd=cwd, stdout=stdout, stderr=subprocess.STDOUT, **_group_options())
+    reader = transport = None
+    if stdout is asyncio.subprocess.PIPE:
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader(limit=limit or 2 ** 16, loop=loop)
+        transport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader, loop=loop), popen.stdout)
+    return _Child(popen, reader, transport)
+
+
+async def _reap(process, metrics):
+    """终止进程组、等待子进程退出并记录其资源使用"""
+    _kill_group(process)
+    if process.stdout is not None:
+        # 读完管道中剩余的输出：缓冲区已满时读取处于暂停状态，收不到管道关闭，wait 无法返回
+        try:
+            await asyncio.wait_for(process.stdout.read(), REAP_SECONDS)
+        except (asyncio.TimeoutError, ValueError):
+            pass
+    await process.wait()
+    if isinstance(process, _Child):
+        process.close()
+        metrics.add_child_usage(process.rusage, process.hwm_kb)
+
+
+async def compile_design(backend, base_dir, log, timeout_sec, metrics, waveform=True, file_list=FILE_LIST,
+                         defines=None):
+    """
+    编译仿真文件，编译器输出写入日志
+    :return: 返回码，超时返回 None
+    """
+    process = await _spawn(backend.compile_command(base_dir, waveform, file_list, defines), base_dir, log)
+    try:
+        return await asyncio.wait_for(process.wait(), timeout_sec)
+    except asyncio.TimeoutError:
+        return None
+    finally:
+        await _reap(process, metrics)
+
+
+async def _scan(stream, scanner):
+    """
+    逐行扫描输出，直到输出结束、应当停止，或（尚未得到结论时）得到结论
+    :return: 是否应当结束仿真
+    """
+    undecided = not scanner.decided
+    while True:
+        try:
+            raw_line = await stream.readline()
+        except ValueError:
+            scanner.mark_overflow()
+            return True
+        if not raw_line or scanner.feed(raw_line):
+            return True
+        if undecided and scanner.decided:
+            return False
+
+
+async def simulate(backend, base_dir, log, timeout_sec, metrics, waveform=True, scanner_factory=None):
+    """
+    运行仿真并逐行扫描输出，得到结论、输出超限或超时后立即终止仿真进程组
+    :param scanner_factory: 根据日志文件创建输出扫描器，默认使用后端的扫描器
+    :return: (OutputScanner, 是否超时)
+    """
+    scanner = (scanner_factory or backend.make_scanner)(log)
+    # 单行超过输出上限时 readline 抛出 ValueError，按输出超限处理
+    process = await _spawn(backend.run_command(base_dir, waveform), base_dir, asyncio.subprocess.PIPE,
+                           limit=scanner.max_bytes + 1)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout_sec
+    timed_out = False
+    try:
+        try:
+            # 读取到结论、输出结束或超限为止
+            if not await asyncio.wait_for(_scan(process.stdout, scanner), timeout_sec):
+                # 得到结论后再读取少量摘要输出
+                drain = min(DRAIN_SECONDS, deadline - loop.time())
+                if drain > 0:
+                    await asyncio.wait_for(_scan(process.stdout, scanner), drain)
+        except asyncio.TimeoutError:
+            # 已得到结论时只是摘要输出等待结束，不算超时
+            timed_out = not scanner.decided
+    finally:
+        await _reap(process, metrics)
+    return scanner, timed_out
+
+
+async def run_simulation_async(base_dir: Path, timeout_sec: int = 6, metrics: RunMetrics = None,
+                               backend=None, waveform: bool = True, file_list: str = FILE_LIST,
+                               defines: dict = None, scanner_factory=None, log_file: Path = None) -> ErrorCode:
+    """
+    在工作目录中编译并仿真
+    :param base_dir: 仿真项目的根目录
+    :param timeout_sec: 编译与仿真各自的超时时间（秒），后端自带编译超时时以后端为准
+    :param metrics: 记录各阶段耗时与子进程资源使用
+    :param backend: 仿真器后端，默认使用 JUDGE_SIMULATOR 指定的后端
+    :param waveform: 是否输出波形
+    :param file_list: 编译文件列表
+    :param defines: 编译时预定义的宏
+    :param scanner_factory: 仿真输出扫描器的工厂函数（参考波形模式使用逐周期比较器）
+    :param log_file: 日志文件，默认为工作目录中的 simulation.log（判题时第一个公开用例直接写入 sub_data 供实时查看）
+    :return: ErrorCode 枚举值
+    """
+    if metrics is None:
+        metrics = RunMetrics()
+    if backend is None:
+        backend = get_backend()
+    compile_timeout = max(timeout_sec, backend.compile_timeout or 0)
+    base_dir = Path(base_dir)
+    log_file = Path(log_file) if log_file else base_dir / "simulation.log"
+    vcd_file = base_dir / "waveform.vcd"
+
+    # 清理旧文件
+    if vcd_file.exists():
+        vcd_file.unlink()
+    if log_file.exists():
+        log_file.unlink()
+
+    async with _Slot():
+        with open(log_file, "a", encoding="utf-8") as log:
+            # 编译阶段
+            log.write(f"INFO: Start Sim at {datetime.now().isoformat()}\n")
+            log.write(f"[1/3] Compiling ({backend.name})...\n")
+            log.flush()
+            try:
+                with metrics.phase("compile"):
+                    returncode = await compile_design(backend, base_dir, log, compile_timeout, metrics, waveform,
+                                                      file_list, defines)
+            except OSError as e:
+                # 编译器无法启动属于判题环境问题，不判为编译错误（也不会进入判题结果缓存）
+                log.write(f"ERROR: Compiler not found: {e}\n")
+                return ErrorCode.ERROR_UNKNOWN
+            if returncode is None:
+                log.write("ERROR: Compilation timeout\n")
+                return ErrorCode.ERROR_COMPILE_FAIL
+            if returncode != 0:
+                log.write("ERROR: Compilation failed\n")
+                return ErrorCode.ERROR_COMPILE_FAIL
+
+            # 仿真阶段（带超时，流式扫描输出）
+            log.write(f"[2/3] Running simulation (timeout: {timeout_sec}s)...\n")
+            log.flush()
+            try:
+                with metrics.phase("simulate"):
+                    scanner, timed_out = await simulate(backend, base_dir, log, timeout_sec, metrics, waveform,
+                                                        scanner_factory)
+            except OSError:
+                log.write("ERROR: Simulation runtime error\n")
+                return ErrorCode.ERROR_SIM_RUN_FAIL
+
+            # 结果检查（扫描过程中已得到结论，无需重新读取日志）
+            with metrics.phase("check"):
+                return check_result(scanner, timed_out, vcd_file if waveform else None, log)
+
+
+async def compile_only_async(base_dir: Path, timeout_sec: int = 6, backend=None, max_output: int = 64 * 1024,
+                             file_list: str = FILE_LIST, defines: dict = None):
+    """
+    只编译不仿真（语法检查）
+    :return: (返回码, 编译器输出)，超时返回码为 None
+    """
+    if backend is None:
+        backend = get_backend()
+    base_dir = Path(base_dir)
+    log_file = base_dir / "compile.log"
+    timeout_sec = max(timeout_sec, backend.compile_timeout or 0)
+    with open(log_file, "w", encoding="utf-8") as log:
+        returncode = await compile_design(backend, base_dir, log, timeout_sec, RunMetrics(), waveform=False,
+                                          file_list=file_list, defines=defines)
+    with open(log_file, "r", encoding="utf-8", errors="replace") as log:
+        output = log.read(max_output)
+    return returncode, output
+
+
+def compile_only(base_dir: Path, timeout_sec: int = 6, backend=None, file_list: str = FILE_LIST,
+                 defines: dict = None):
+    """compile_only_async 的同步版本"""
+    return asyncio.run(compile_only_async(base_dir, timeout_sec, backend, file_list=file_list, defines=defines))
+
+
+def check_result(scanner, timed_out, vcd_file, log) -> ErrorCode:
+    """根据输出扫描结果给出判定，vcd_file 为 None 表示本次运行未输出波形"""
+    log.write("[3/3] Checking results...\n")
+    if scanner.failed:
+        log.write("ERROR: Output mismatch\n")
+        return ErrorCode.ERROR_MISMATCH
+    if scanner.passed:
+        if vcd_file is not None and not vcd_file.exists():
+            log.write("INFO: VCD file not generated\n")
+        log.write("INFO: Simulation PASSED\n")
+        return ErrorCode.SUCCESS
+    if timed_out:
+        log.write("ERROR: Simulation timeout\n")
+        return ErrorCode.ERROR_SIM_TIMEOUT
+    if scanner.overflow:
+        return ErrorCode.ERROR_SIM_RUN_FAIL
+    log.write("ERROR: Unknown simulation result\n")
+    return ErrorCode.ERROR_UNKNOWN
+
+
+def run_simulation(base_dir: Path, timeout_sec: int = 6, metrics: RunMetrics = None, backend=None,
+                   waveform: bool = True, **options) -> ErrorCode:
+    """run_simulation_async 的同步版本，供判题进程调用，options 为 file_list/defines/scanner_factory"""
+    return asyncio.run(run_simulation_async(base_dir, timeout_sec, metrics, backend, waveform, **options))
+
+
+def run_many(base_dirs, timeout_sec: int = 6, backend=None, waveform: bool = True):
+    """
+    在一个事件循环中并发仿真多个工作目录（并发数受本机槽位数 MAX_CONCURRENCY 限制）
+    :return: 与 base_dirs 一一对应的 (ErrorCode, RunMetrics) 列表
+    """
+    async def _run_all():
+        runs = [(base_dir, RunMetrics()) for base_dir in base_dirs]
+        codes = await asyncio.gather(*(run_simulation_async(d, timeout_sec, m, backend, waveform) for d, m in runs))
+        return [(code, metrics) for code, (_, metrics) in zip(codes, runs)]
+    return asyncio.run(_run_all())
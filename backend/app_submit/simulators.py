@@ -0,0 +1,170 @@
+"""
+仿真器后端
+每个后端给出编译命令、运行命令和判定用的输出扫描器，由判题引擎统一执行。
+waveform=False 时后端关闭测试平台中 $dumpfile/$dumpvars 的波形输出（波形按需重新仿真生成）：
+icarus    iverilog + vvp，工具路径依次取环境变量（IVERILOG/VVP）、随项目附带的 iverilog 目录、PATH
+verilator 将设计编译为本地可执行文件，编译较慢但仿真快，适合仿真量大的时序设计（需要 Verilator 5）
+fake      不依赖任何仿真器、结果确定的假后端，供测试与压测使用（见 fake_sim.py）
+"""
+import os
+import re
+import shutil
+import sys
+import threading
+from pathlib import Path
+from models import BASE_DIR
+from app_submit.output_scan import OutputScanner, FAIL_MARKERS
+
+TB_MODULE = "test_bench"
+# 默认的编译文件列表
+FILE_LIST = "sim_file_list.f"
+# 随项目附带的 iverilog
+BUNDLED_DIR = BASE_DIR / "iverilog" / "bin"
+# 未在题目配置中指定时使用的后端
+DEFAULT_SIMULATOR = os.environ.get("JUDGE_SIMULATOR", "icarus")
+
+
+def find_tool(name, env_key):
+    """查找仿真工具：环境变量 > 随项目附带的 iverilog 目录 > PATH，找不到时返回 None"""
+    configured = os.environ.get(env_key)
+    if configured:
+        return configured
+    bundled = BUNDLED_DIR / (f"{name}.exe" if os.name == "nt" else name)
+    if bundled.is_file():
+        return str(bundled)
+    return shutil.which(name)
+
+
+class SimulatorBackend:
+    """仿真器后端基类"""
+    name = None
+    # 编译超时（秒），None 表示与仿真超时相同
+    compile_timeout = None
+    # 编译器诊断信息的格式（iverilog：文件:行号: [error|warning:] 信息）
+    diagnostic_re = re.compile(
+        r"^(?P<file>[^\s:][^:]*):(?P<line>\d+):\s*(?:(?P<severity>error|warning|sorry)\s*:\s*)?(?P<message>.+)$")
+
+    def compile_command(self, base_dir, waveform=True, file_list=FILE_LIST, defines=None):
+        """
+        在工作目录中编译设计、生成可运行仿真的命令
+        :param file_list: 编译文件列表（相对工作目录）
+        :param defines: 预定义宏 {名称: 值}
+        """
+        raise NotImplementedError
+
+    def run_command(self, base_dir, waveform=True):
+        """运行仿真的命令"""
+        raise NotImplementedError
+
+    def make_scanner(self, log, fail_markers=FAIL_MARKERS):
+        """判定仿真结果的输出扫描器，fail_markers 为 TEST FAILED 之外的失败标记"""
+        return OutputScanner(log, fail_markers=fail_markers)
+
+    def parse_diagnostics(self, output):
+        """
+        解析编译器输出
+        :return: [{"file", "line", "severity", "message"}]，severity 为 error 或 warning
+        """
+        diagnostics = []
+        for raw_line in output.splitlines():
+            match = self.diagnostic_re.match(raw_line.strip())
+            if not match:
+                continue
+            severity = (match.group("severity") or "error").lower()
+            diagnostics.append({
+                "file": Path(match.group("file")).name,
+                "line": int(match.group("line")),
+                "severity": "warning" if severity == "warning" else "error",
+                "message": match.group("message").strip(),
+            })
+        return diagnostics
+
+    @staticmethod
+    def _require(tool, name):
+        if tool is None:
+            raise FileNotFoundError(f"未找到 {name}")
+        return str(tool)
+
+
+class IcarusBackend(SimulatorBackend):
+    name = "icarus"
+
+    def __init__(self, iverilog=None, vvp=None):
+        self.iverilog = iverilog or find_tool("iverilog", "IVERILOG")
+        self.vvp = vvp or find_tool("vvp", "VVP")
+
+    def compile_command(self, base_dir, waveform=True, file_list=FILE_LIST, defines=None):
+        command = [self._require(self.iverilog, "iverilog"), "-o", "sim_exec", "-s", TB_MODULE, "-f", file_list]
+        command.extend(f"-D{name}={value}" for name, value in (defines or {}).items())
+        return command
+
+    def run_command(self, base_dir, waveform=True):
+        command = [self._require(self.vvp, "vvp"), "-n", "sim_exec"]
+        if not waveform:
+            # vvp 扩展参数：忽略 $dumpfile/$dumpvars，不写波形文件
+            command.append("-none")
+        return command
+
+
+class VerilatorBackend(SimulatorBackend):
+    name = "verilator"
+    # 生成并编译 C++ 模型耗时较长
+    compile_timeout = 120
+    # %Error: 文件:行号:列号: 信息 / %Warning-类别: 文件:行号:列号: 信息
+    diagnostic_re = re.compile(
+        r"^%(?P<severity>Error|Warning)(?:-[A-Z0-9_]+)?:\s*(?P<file>[^:\s]+):(?P<line>\d+):(?:\d+:)?\s*(?P<message>.+)$")
+
+    def __init__(self, verilator=None):
+        self.verilator = verilator or find_tool("verilator", "VERILATOR")
+
+    def compile_command(self, base_dir, waveform=True, file_list=FILE_LIST, defines=None):
+        command = [
+            self._require(self.verilator, "verilator"),
+            "--binary", "--timing", "-Wno-fatal", "-Wno-lint", "-Wno-style",
+            "--top-module", TB_MODULE, "-f", file_list,
+            "--Mdir", "obj_dir", "-o", "sim_exec", "-j", "0",
+        ]
+        command.extend(f"-D{name}={value}" for name, value in (defines or {}).items())
+        if waveform:
+            # 不带 --trace 编译时 $dumpvars 被忽略，也省去生成跟踪代码的开销
+            command.insert(2, "--trace")
+        return command
+
+    def run_command(self, base_dir, waveform=True):
+        return [str(Path(base_dir) / "obj_dir" / "sim_exec")]
+
+
+class FakeBackend(SimulatorBackend):
+    name = "fake"
+    SCRIPT = Path(__file__).with_name("fake_sim.py")
+
+    def compile_command(self, base_dir, waveform=True, file_list=FILE_LIST, defines=None):
+        command = [sys.executable, str(self.SCRIPT), "compile"]
+        command.extend(f"-D{name}={value}" for name, value in (defines or {}).items())
+        return command
+
+    def run_command(self, base_dir, waveform=True):
+        command = [sys.executable, str(self.SCRIPT), "run"]
+        if not waveform:
+            command.append("--no-waveform")
+        return command
+
+
+BACKENDS = {backend.name: backend for backend in (IcarusBackend, VerilatorBackend, FakeBackend)}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """
+    获取后端实例（每个进程每种后端一个，工具路径只解析一次）
+    :raises ValueError: 未知的后端名称
+    """
+    name = (name or DEFAULT_SIMULATOR).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"未知的仿真器后端: {name}")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = BACKENDS[name]()
+        return _instances[name]
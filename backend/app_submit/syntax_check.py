@@ -0,0 +1,119 @@
+"""
+语法检查
+只编译不仿真，返回解析后的编译诊断信息，供编辑器即时提示。
+在 Web 进程中执行，不经过判题队列，与完整判题互不占用：并发数由 CHECK_WORKERS 限制，
+结果按 (工程哈希, 仿真器后端, 规范化代码哈希) 缓存在进程内（LRU）。
+"""
+import threading
+from collections import OrderedDict
+from app_submit import verdict_cache
+from app_submit.lint import check_project_code
+from app_submit.manifest import load_manifest
+from app_submit.cases import compile_options
+from app_submit.simulators import get_backend, SimulatorBackend
+from app_submit.sim_engine import compile_only
+from app_submit.workspace import get_workspace_manager, write_run_file
+
+CACHE_SIZE = 2048
+# 返回的诊断信息条数上限
+MAX_DIAGNOSTICS = 50
+# 检查通道已满时最多等待的时间（秒）
+LANE_WAIT_SECONDS = 5
+
+_lint_parser = SimulatorBackend()
+
+
+class LaneBusy(Exception):
+    """语法检查通道已满"""
+
+
+class CheckCache:
+    """语法检查结果的 LRU 缓存"""
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+
+check_cache = CheckCache()
+
+_lane = None
+_lane_lock = threading.Lock()
+
+
+def _get_lane(workers):
+    global _lane
+    with _lane_lock:
+        if _lane is None:
+            _lane = threading.BoundedSemaphore(max(1, workers))
+        return _lane
+
+
+def _compile(project_dir, digest, code, backend, timeout_sec, workers, options):
+    lane = _get_lane(workers)
+    if not lane.acquire(timeout=LANE_WAIT_SECONDS):
+        raise LaneBusy()
+    try:
+        with get_workspace_manager().workspace(project_dir, digest) as path:
+            write_run_file(path / "user_module.v", code)
+            return compile_only(path, timeout_sec, backend, **options)
+    finally:
+        lane.release()
+
+
+def check_code(project_dir, code, workers=2):
+    """
+    编译检查用户代码
+    :param workers: 同时进行的编译数上限
+    :return: {"ok": 是否编译通过, "diagnostics": [...], "cached": 是否命中缓存}
+    :raises LaneBusy: 检查通道已满
+    :raises FileNotFoundError: 编译器不存在
+    """
+    manifest = load_manifest(project_dir)
+    backend = get_backend(manifest["simulator"])
+    digest = verdict_cache.project_hash(project_dir)
+    key = (digest, backend.name, verdict_cache.code_hash(code))
+    cached = check_cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    # 编译前检查能发现的问题不必启动编译器
+    lint_errors = check_project_code(project_dir, code, digest)
+    if lint_errors:
+        result = {"ok": False, "diagnostics": _lint_parser.parse_diagnostics("\n".join(lint_errors))}
+        check_cache.put(key, result)
+        return {**result, "cached": False}
+
+    returncode, output = _compile(project_dir, digest, code, backend, manifest["timeout"], workers,
+                                  compile_options(manifest))
+    if returncode is None:
+        # 超时与机器负载有关，不缓存
+        return {
+            "ok": False,
+            "diagnostics": [{"file": None, "line": None, "severity": "error", "message": "编译超时"}],
+            "cached": False,
+        }
+    diagnostics = backend.parse_diagnostics(output)[:MAX_DIAGNOSTICS]
+    if returncode != 0 and not any(d["severity"] == "error" for d in diagnostics):
+        # 没有可解析的错误信息时返回编译器输出的最后一行
+        lines = [line.strip() for line in output.splitlines() if line.strip()]
+        diagnostics.append({"file": None, "line": None, "severity": "error",
+                            "message": lines[-1] if lines else "编译失败"})
+    result = {"ok": returncode == 0, "diagnostics": diagnostics}
+    check_cache.put(key, result)
+    return {**result, "cached": False}
@@ -0,0 +1,118 @@
+"""
+判题结果缓存
+以 (题目 project/ 目录内容哈希, 规范化用户代码哈希) 为键缓存判题结果。
+测试文件或参考模块变化时目录哈希随之变化，旧的缓存自然失效。
+命中时首次判题的日志与波形以硬链接（或复制）放置为本提交自己的文件（run_sim._adopt_artifacts），
+产物均以"写入临时文件后替换"的方式更新，首次判题的提交被重新判题时不会改变命中提交的文件。
+"""
+import hashlib
+import threading
+from datetime import datetime
+from pathlib import Path
+from sqlalchemy.exc import IntegrityError
+from exts import db
+from models import BASE_DIR, ErrorCode, SimulationResult, VerdictCache
+
+# 与运行环境无关、可复现的结果才会被缓存；超时等结果受机器负载影响，不缓存
+CACHEABLE_CODES = {
+    ErrorCode.SUCCESS,
+    ErrorCode.ERROR_COMPILE_FAIL,
+    ErrorCode.ERROR_MISMATCH,
+}
+
+_hash_lock = threading.Lock()
+_project_hashes = {}    # {project_dir: (文件签名, 哈希)}
+
+
+def normalize_code(code):
+    """规范化用户代码：统一换行符，去除行尾空白和首尾空行"""
+    lines = (code or "").replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip("\n")
+
+
+def code_hash(code):
+    """规范化后用户代码的 SHA-256"""
+    return hashlib.sha256(normalize_code(code).encode("utf-8")).hexdigest()
+
+
+def _project_signature(project_dir):
+    files = sorted(p for p in Path(project_dir).rglob("*") if p.is_file())
+    return tuple(
+        (str(p.relative_to(project_dir)), p.stat().st_size, p.stat().st_mtime_ns)
+        for p in files
+    ), files
+
+
+def project_hash(project_dir):
+    """
+    计算题目工程目录的内容哈希
+    文件的大小和修改时间未变化时直接返回上次的结果，避免重复读取文件
+    """
+    project_dir = Path(project_dir)
+    signature, files = _project_signature(project_dir)
+    with _hash_lock:
+        cached = _project_hashes.get(project_dir)
+        if cached and cached[0] == signature:
+            return cached[1]
+    digest = hashlib.sha256()
+    for path in files:
+        digest.update(str(path.relative_to(project_dir)).replace("\\", "/").encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(path.read_bytes())
+        digest.update(b"\0")
+    value = digest.hexdigest()
+    with _hash_lock:
+        _project_hashes[project_dir] = (signature, value)
+    return value
+
+
+def lookup(problem_digest, code_digest):
+    """
+    查询缓存
+    :return: 命中时返回 SimulationResult，否则返回 None
+    """
+    entry = db.session.get(VerdictCache, (problem_digest, code_digest))
+    if entry is None:
+        return None
+    # 缓存的日志已被清理时视为未命中
+    if entry.log_path and not (BASE_DIR / entry.log_path).exists():
+        db.session.delete(entry)
+        db.session.commit()
+        return None
+    VerdictCache.query.filter_by(
+        problem_hash=problem_digest,
+        code_hash=code_digest
+    ).update({VerdictCache.hit_count: VerdictCache.hit_count + 1}, synchronize_session=False)
+    db.session.commit()
+    result = SimulationResult()
+    result.error_code = ErrorCode[entry.error_code]
+    result.log_path = entry.log_path or ""
+    result.waveform_path = entry.waveform_path or ""
+    result.cache_hit = True
+    result.source_submission_id = entry.source_submission_id
+    return result
+
+
+def store(problem_id, problem_digest, code_digest, result, submission_id):
+    """写入缓存，同时清理该题目在旧工程版本下的缓存"""
+    if result.error_code not in CACHEABLE_CODES:
+        return
+    try:
+        VerdictCache.query.filter(
+            VerdictCache.problem_id == problem_id,
+            VerdictCache.problem_hash != problem_digest
+        ).delete(synchronize_session=False)
+        db.session.add(VerdictCache(
+            problem_hash=problem_digest,
+            code_hash=code_digest,
+            problem_id=problem_id,
+            error_code=result.error_code.name,
+            log_path=result.log_path,
+            waveform_path=result.waveform_path,
+            source_submission_id=submission_id,
+            created_at=datetime.now()
+        ))
+        db.session.commit()
+    except IntegrityError:
+        # 其他判题进程已写入相同的键
+        db.session.rollback()
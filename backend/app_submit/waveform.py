@@ -0,0 +1,287 @@
+"""
+波形压缩存储与查询
+VCD 按时间切分为若干块，每块单独压缩为一个 gzip 成员后依次写入 wave_<id>.vcd.gz
+（整个文件仍是合法的 gzip，可直接解压得到原始 VCD）。
+同目录下的 wave_<id>.idx.json 记录信号列表、时间范围以及每块的偏移、时间区间和块起始时刻的信号值快照，
+查询时只需解压与时间窗口重叠的块。
+"""
+import gzip
+import json
+from pathlib import Path
+from app_submit.workspace import replacing
+
+# 每块未压缩数据的大致大小
+BLOCK_BYTES = 256 * 1024
+COMPRESS_LEVEL = 6
+GZ_SUFFIX = ".vcd.gz"
+INDEX_SUFFIX = ".idx.json"
+
+
+def index_path_for(waveform_path):
+    """压缩波形对应的索引文件路径"""
+    waveform_path = Path(waveform_path)
+    name = waveform_path.name
+    if name.endswith(GZ_SUFFIX):
+        name = name[:-len(GZ_SUFFIX)]
+    return waveform_path.with_name(name + INDEX_SUFFIX)
+
+
+def is_compressed(waveform_path):
+    return str(waveform_path).endswith(GZ_SUFFIX)
+
+
+def _parse_var(tokens, scopes):
+    # $var <type> <width> <code> <reference> [range] $end
+    if len(tokens) < 5:
+        return None
+    reference = tokens[4]
+    if len(tokens) > 5 and tokens[5].startswith("["):
+        reference += tokens[5]
+    return {
+        "name": ".".join(scopes + [reference]),
+        "code": tokens[3],
+        "width": int(tokens[2]) if tokens[2].isdigit() else 1,
+        "type": tokens[1],
+    }
+
+
+def _parse_header(header_text):
+    """解析 VCD 头部，返回 (时间单位, 信号列表)"""
+    timescale = ""
+    signals = []
+    scopes = []
+    tokens = header_text.split()
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        end = i
+        while end < len(tokens) and tokens[end] != "$end":
+            end += 1
+        body = tokens[i:end]
+        if token == "$timescale":
+            timescale = "".join(body[1:])
+        elif token == "$scope" and len(body) >= 3:
+            scopes.append(body[2])
+        elif token == "$upscope" and scopes:
+            scopes.pop()
+        elif token == "$var":
+            var = _parse_var(body, scopes)
+            if var:
+                signals.append(var)
+        i = end + 1
+    return timescale, signals
+
+
+def _parse_change(line):
+    """解析一行数值变化，返回 (code, value)，不是数值变化时返回 None"""
+    head = line[0]
+    if head in "01xXzZ":
+        return line[1:], head.lower()
+    if head in "bBrR":
+        parts = line[1:].split()
+        if len(parts) == 2:
+            return parts[1], parts[0].lower()
+    return None
+
+
+class _BlockWriter:
+    def __init__(self, out):
+        self.out = out
+        self.offset = 0
+        self.blocks = []
+
+    def write(self, data, meta=None):
+        payload = gzip.compress(data.encode("utf-8"), compresslevel=COMPRESS_LEVEL)
+        self.out.write(payload)
+        entry = {"offset": self.offset, "length": len(payload)}
+        self.offset += len(payload)
+        if meta is not None:
+            entry.update(meta)
+            self.blocks.append(entry)
+        return entry
+
+
+def store_waveform(src_vcd, dest_gz):
+    """
+    将 VCD 分块压缩保存并生成索引（写入临时文件后替换，先替换波形再替换索引）
+    :param src_vcd: 原始 VCD 文件
+    :param dest_gz: 目标 .vcd.gz 文件
+    :return: 索引内容
+    """
+    src_vcd, dest_gz = Path(src_vcd), Path(dest_gz)
+    # 退出时内层先替换
+    with replacing(index_path_for(dest_gz)) as tmp_index, replacing(dest_gz) as tmp_gz:
+        index = _store(src_vcd, tmp_gz)
+        with open(tmp_index, "w", encoding="utf-8") as f:
+            json.dump(index, f, separators=(",", ":"))
+    return index
+
+
+def _store(src_vcd, dest_gz):
+    header_lines = []
+    values = {}
+    with open(src_vcd, "r", encoding="utf-8", errors="replace") as src, open(dest_gz, "wb") as out:
+        writer = _BlockWriter(out)
+        # 头部单独成块
+        for line in src:
+            header_lines.append(line)
+            if "$enddefinitions" in line:
+                break
+        header_text = "".join(header_lines)
+        header = writer.write(header_text)
+        timescale, signals = _parse_header(header_text)
+
+        buffer, size = [], 0
+        block_start, block_snapshot = None, {}
+        current_time = 0
+        start_time = None
+
+        def flush():
+            if buffer:
+                writer.write("".join(buffer), {
+                    "t0": block_start,
+                    "t1": current_time,
+                    "snapshot": block_snapshot,
+                })
+
+        for line in src:
+            stripped = line.strip()
+            if not stripped:
+                continue
+            if stripped[0] == "#":
+                try:
+                    time = int(stripped[1:])
+                except ValueError:
+                    continue
+                # 只在时间点边界切块，保证每块从一个完整的时间点开始
+                if size >= BLOCK_BYTES:
+                    flush()
+                    buffer, size = [], 0
+                if not buffer:
+                    block_start, block_snapshot = time, dict(values)
+                current_time = time
+                if start_time is None:
+                    start_time = time
+            else:
+                change = _parse_change(stripped)
+                if change:
+                    values[change[0]] = change[1]
+                if not buffer:
+                    block_start, block_snapshot = current_time, dict(values)
+            buffer.append(stripped + "\n")
+            size += len(stripped) + 1
+        flush()
+
+    index = {
+        "version": 1,
+        "timescale": timescale,
+        "start_time": start_time or 0,
+        "end_time": current_time,
+        "signals": signals,
+        "header": header,
+        "blocks": writer.blocks,
+    }
+    return index
+
+
+def load_index(waveform_path):
+    with open(index_path_for(waveform_path), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def read_waveform_text(waveform_path):
+    """读取完整的 VCD 文本，兼容未压缩的旧波形文件"""
+    if is_compressed(waveform_path):
+        with gzip.open(waveform_path, "rt", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    with open(waveform_path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def _decimate(changes, start, end, max_points):
+    """每个时间桶只保留最后一次变化，保证桶边界处的信号值正确"""
+    if not max_points or len(changes) <= max_points:
+        return changes
+    span = max(1, end - start)
+    kept = {}
+    for time, value in changes:
+        bucket = (time - start) * max_points // span
+        kept[bucket] = [time, value]
+    return [kept[k] for k in sorted(kept)]
+
+
+def query_waveform(waveform_path, index, names, start=None, end=None, max_points=None):
+    """
+    查询指定信号在时间窗口内的变化
+    :param names: 信号全名列表
+    :param start: 起始时间（含），默认为波形起点
+    :param end: 结束时间（含），默认为波形终点
+    :param max_points: 每个信号最多返回的变化点数，超过时抽稀
+    :return: [{"name", "width", "changes": [[time, value], ...]}]
+    """
+    start = index["start_time"] if start is None else start
+    end = index["end_time"] if end is None else end
+    by_name = {s["name"]: s for s in index["signals"]}
+    wanted = {}     # {code: [signal, ...]}
+    for name in names:
+        if name not in by_name:
+            raise KeyError(name)
+        wanted.setdefault(by_name[name]["code"], []).append(by_name[name])
+
+    blocks = index["blocks"]
+    # 选出与时间窗口重叠的块：最后一个 t0 <= start 的块及之后 t0 <= end 的块
+    first = 0
+    for i, block in enumerate(blocks):
+        if block["t0"] <= start:
+            first = i
+    selected = [b for b in blocks[first:] if b["t0"] <= end]
+
+    values = {code: None for code in wanted}
+    if selected:
+        for code in wanted:
+            values[code] = selected[0]["snapshot"].get(code)
+    changes = {code: [] for code in wanted}
+    time = selected[0]["t0"] if selected else start
+    with open(waveform_path, "rb") as f:
+        for block in selected:
+            f.seek(block["offset"])
+            text = gzip.decompress(f.read(block["length"])).decode("utf-8", errors="replace")
+            for line in text.splitlines():
+                if not line:
+                    continue
+                if line[0] == "#":
+                    try:
+                        time = int(line[1:])
+                    except ValueError:
+                        pass
+                    continue
+                change = _parse_change(line)
+                if not change or change[0] not in wanted:
+                    continue
+                code, value = change
+                if time < start:
+                    values[code] = value
+                elif time <= end:
+                    changes[code].append([time, value])
+            if time > end:
+                break
+
+    result = []
+    for code, signals in wanted.items():
+        series = changes[code]
+        # 窗口起点处的信号值
+        if values[code] is not None and (not series or series[0][0] > start):
+            series = [[start, values[code]]] + series
+        series = _decimate(series, start, end, max_points)
+        for signal in signals:
+            result.append({"name": signal["name"], "width": signal["width"], "changes": series})
+    return result
+
+
+def compress_legacy_waveform(vcd_path):
+    """将旧的未压缩波形转换为压缩格式，返回新路径"""
+    vcd_path = Path(vcd_path)
+    dest = vcd_path.with_name(vcd_path.stem + GZ_SUFFIX)
+    store_waveform(vcd_path, dest)
+    vcd_path.unlink()
+    return dest
@@ -0,0 +1,142 @@
+"""
+按需生成波形的任务队列
+JUDGE_WAVEFORM=on_demand 时判题不保存波形。首次请求波形时 Web 进程只在 WaveformJob 表中入队并返回“生成中”，
+判题端（run_sim.run_judge）的波形线程通过条件更新领取任务，在判题工作目录中重新仿真。
+同一提交同时只有一个判题端持有租约（跨进程、跨机器），租约过期的任务可被重新领取。
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_
+from sqlalchemy.exc import IntegrityError
+from exts import db
+from models import WaveformJob, WaveformJobStatus, Submission, VerdictCache
+from app_submit.job_queue import MAX_ATTEMPTS
+
+WAVEFORM_LEASE_SECONDS = 300    # 租约时长，应大于单个用例的仿真超时
+WAVEFORM_POLL_INTERVAL = 1      # 判题端波形线程空闲时查询任务的间隔（秒）
+RETRY_AFTER_SECONDS = 2         # 建议客户端重新请求波形的间隔
+
+
+class WaveformPending(Exception):
+    """波形已入队或正在生成，稍后重新请求"""
+
+
+def request_waveform(submission_id):
+    """
+    请求为提交生成波形（提交事务）
+    :return: 任务状态（WaveformJobStatus）
+    """
+    job = db.session.get(WaveformJob, submission_id)
+    if job is None:
+        now = datetime.now()
+        db.session.add(WaveformJob(submission_id=submission_id, status=WaveformJobStatus.PENDING,
+                                   created_at=now, updated_at=now))
+        try:
+            db.session.commit()
+            return WaveformJobStatus.PENDING
+        except IntegrityError:
+            # 其他 Web 进程已同时入队
+            db.session.rollback()
+            job = db.session.get(WaveformJob, submission_id)
+            if job is None:
+                return WaveformJobStatus.PENDING
+    if job.status == WaveformJobStatus.DONE:
+        # 已生成的波形文件被删除时重新生成
+        WaveformJob.query.filter_by(
+            submission_id=submission_id,
+            status=WaveformJobStatus.DONE
+        ).update({
+            WaveformJob.status: WaveformJobStatus.PENDING,
+            WaveformJob.attempts: 0,
+            WaveformJob.updated_at: datetime.now()
+        }, synchronize_session=False)
+        db.session.commit()
+        return WaveformJobStatus.PENDING
+    return job.status
+
+
+def reset_waveform_job(submission_id):
+    """提交被重新判题时删除其波形任务（不提交事务），之后的请求按新的判题结果重新生成"""
+    WaveformJob.query.filter_by(submission_id=submission_id).delete(synchronize_session=False)
+
+
+def _claimable(now):
+    return or_(
+        WaveformJob.status == WaveformJobStatus.PENDING,
+        and_(WaveformJob.status == WaveformJobStatus.LEASED, WaveformJob.lease_expires_at < now)
+    )
+
+
+def claim_waveform_job(owner):
+    """
+    原子地领取最早入队的波形任务（包括租约过期的任务）
+    :return: 提交ID，没有任务时返回 None
+    """
+    while True:
+        now = datetime.now()
+        candidate = db.session.query(WaveformJob.submission_id, WaveformJob.attempts).filter(
+            _claimable(now)
+        ).order_by(WaveformJob.created_at).first()
+        if candidate is None:
+            db.session.rollback()
+            return None
+        if (candidate.attempts or 0) >= MAX_ATTEMPTS:
+            values = {WaveformJob.status: WaveformJobStatus.FAILED}
+            print(f"提交 {candidate.submission_id} 的波形多次生成失败，不再重试")
+        else:
+            values = {
+                WaveformJob.status: WaveformJobStatus.LEASED,
+                WaveformJob.lease_owner: owner,
+                WaveformJob.lease_expires_at: now + timedelta(seconds=WAVEFORM_LEASE_SECONDS),
+                WaveformJob.attempts: WaveformJob.attempts + 1,
+            }
+        values[WaveformJob.updated_at] = now
+        # 仅当任务仍可领取时才会命中，多个判题端竞争时只有一个成功
+        claimed = WaveformJob.query.filter(
+            WaveformJob.submission_id == candidate.submission_id,
+            _claimable(now)
+        ).update(values, synchronize_session=False)
+        db.session.commit()
+        if claimed == 1 and values[WaveformJob.status] == WaveformJobStatus.LEASED:
+            return candidate.submission_id
+
+
+def finish_waveform_job(submission_id, owner, waveform_path):
+    """
+    结束波形任务，生成成功时记录波形路径（不提交事务）
+    :param waveform_path: 相对 BASE_DIR 的路径，无法生成时为 None
+    :return: 租约仍由 owner 持有时返回 True；任务已被删除（提交被重新判题）或被其他判题端领取时返回 False
+    """
+    finished = WaveformJob.query.filter_by(
+        submission_id=submission_id,
+        lease_owner=owner,
+        status=WaveformJobStatus.LEASED
+    ).update({
+        WaveformJob.status: WaveformJobStatus.DONE if waveform_path else WaveformJobStatus.FAILED,
+        WaveformJob.updated_at: datetime.now()
+    }, synchronize_session=False)
+    if finished != 1:
+        return False
+    if waveform_path:
+        Submission.query.filter_by(id=submission_id).update(
+            {Submission.waveform_path: waveform_path}, synchronize_session=False)
+        # 判题缓存命中时复用同一份波形
+        VerdictCache.query.filter(
+            VerdictCache.source_submission_id == submission_id,
+            or_(VerdictCache.waveform_path.is_(None), VerdictCache.waveform_path == "")
+        ).update({VerdictCache.waveform_path: waveform_path}, synchronize_session=False)
+    return True
+
+
+def release_waveform_job(submission_id, owner):
+    """生成过程出错时放回队列（提交事务），领取次数达到上限后不再重试"""
+    WaveformJob.query.filter_by(
+        submission_id=submission_id,
+        lease_owner=owner,
+        status=WaveformJobStatus.LEASED
+    ).update({
+        WaveformJob.status: WaveformJobStatus.PENDING,
+        WaveformJob.lease_owner: None,
+        WaveformJob.lease_expires_at: None,
+        WaveformJob.updated_at: datetime.now()
+    }, synchronize_session=False)
+    db.session.commit()
@@ -0,0 +1,247 @@
+"""
+判题工作目录管理
+每个判题进程在临时目录（优先使用 tmpfs）中为每道题目维护若干预先构建好的工作目录，
+题目文件只在构建时放置一次，之后每次判题只需清理本次运行产生的文件
+（user_module.v、sim_exec、日志、波形等）。
+"""
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+# 工作目录中题目文件的放置方式：copy 复制一次；link 硬链接；symlink 符号链接
+WORKSPACE_MODES = ("copy", "link", "symlink")
+# 每道题目保留的空闲工作目录数（多测试用例题目至少保留一次判题所需的数量）
+MAX_IDLE_PER_PROBLEM = 2
+
+
+def default_scratch_root():
+    """判题临时目录：JUDGE_SCRATCH_DIR > /dev/shm > 系统临时目录"""
+    configured = os.environ.get("JUDGE_SCRATCH_DIR")
+    if configured:
+        return Path(configured)
+    shm = Path("/dev/shm")
+    if shm.is_dir() and os.access(shm, os.W_OK):
+        return shm / "verilog-oj"
+    return Path(tempfile.gettempdir()) / "verilog-oj"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True
+    return True
+
+
+class Workspace:
+    """一个已构建好的题目工作目录"""
+
+    def __init__(self, path, project_dir, digest):
+        self.path = path
+        self.project_dir = project_dir
+        self.digest = digest
+        self.files = {}     # {相对路径: (大小, 修改时间)}，用于检测题目文件是否被改动
+
+    @property
+    def top_level_names(self):
+        return {Path(rel).parts[0] for rel in self.files}
+
+
+class WorkspaceManager:
+    """按题目缓存工作目录，每个判题进程一个实例"""
+
+    def __init__(self, root=None, mode=None):
+        mode = mode or os.environ.get("JUDGE_WORKSPACE_MODE", "copy")
+        if mode not in WORKSPACE_MODES:
+            raise ValueError(f"未知的工作目录模式: {mode}")
+        self.mode = mode
+        self.base = Path(root) if root else default_scratch_root()
+        self.root = self.base / f"worker-{os.getpid()}"
+        self._idle = {}     # {project_dir: [Workspace]}
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._remove_stale()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _remove_stale(self):
+        """清理已退出判题进程遗留的工作目录"""
+        if os.name != "posix" or not self.base.is_dir():
+            return
+        for entry in self.base.glob("worker-*"):
+            try:
+                pid = int(entry.name.split("-", 1)[1])
+            except ValueError:
+                continue
+            if pid != os.getpid() and not _pid_alive(pid):
+                shutil.rmtree(entry, ignore_errors=True)
+
+    def _place(self, src, dst):
+        """按配置的方式放置题目文件，硬链接/符号链接失败时退回复制"""
+        if self.mode == "link":
+            try:
+                os.link(src, dst)
+                return
+            except OSError:
+                pass
+        if self.mode in ("link", "symlink"):
+            try:
+                os.symlink(src, dst)
+                return
+            except OSError:
+                pass
+        shutil.copy2(src, dst)
+
+    def _build(self, project_dir, digest):
+        with self._lock:
+            self._counter += 1
+            name = f"{Path(project_dir).parent.name}-{digest[:12]}-{self._counter}"
+        workspace = Workspace(self.root / name, project_dir, digest)
+        workspace.path.mkdir(parents=True)
+        for src in sorted(Path(project_dir).rglob("*")):
+            rel = src.relative_to(project_dir)
+            dst = workspace.path / rel
+            if src.is_dir():
+                dst.mkdir(exist_ok=True)
+                continue
+            self._place(src, dst)
+            stat = dst.stat()
+            workspace.files[str(rel)] = (stat.st_size, stat.st_mtime_ns)
+        return workspace
+
+    def _reset(self, workspace):
+        """
+        清理本次运行产生的文件
+        :return: 题目文件未被改动时返回 True，否则返回 False（需要重建）
+        """
+        keep = workspace.top_level_names
+        for entry in workspace.path.iterdir():
+            if entry.name in keep:
+                continue
+            if entry.is_dir() and not entry.is_symlink():
+                shutil.rmtree(entry, ignore_errors=True)
+            else:
+                entry.unlink()
+        for rel, signature in workspace.files.items():
+            try:
+                stat = (workspace.path / rel).stat()
+            except OSError:
+                return False
+            if (stat.st_size, stat.st_mtime_ns) != signature:
+                return False
+        return True
+
+    def _destroy(self, workspace):
+        shutil.rmtree(workspace.path, ignore_errors=True)
+
+    def acquire(self, project_dir, digest):
+        """取出一个与当前题目版本一致的工作目录，没有空闲目录时新建"""
+        project_dir = Path(project_dir)
+        with self._lock:
+            idle = self._idle.setdefault(project_dir, [])
+            while idle:
+                workspace = idle.pop()
+                if workspace.digest == digest:
+                    return workspace
+                # 题目文件已更新，旧工作目录作废
+                self._destroy(workspace)
+        return self._build(project_dir, digest)
+
+    def prepare(self, project_dir, digest, count=1):
+        """预先构建题目的空闲工作目录，直到数量达到 count，返回新建的数量"""
+        project_dir = Path(project_dir)
+        with self._lock:
+            idle = self._idle.setdefault(project_dir, [])
+            stale = [workspace for workspace in idle if workspace.digest != digest]
+            idle[:] = [workspace for workspace in idle if workspace.digest == digest]
+            missing = count - len(idle)
+        for workspace in stale:
+            self._destroy(workspace)
+        built = [self._build(project_dir, digest) for _ in range(max(0, missing))]
+        with self._lock:
+            self._idle[project_dir].extend(built)
+        return len(built)
+
+    def release(self, workspace, max_idle=MAX_IDLE_PER_PROBLEM):
+        """
+        归还工作目录
+        :param max_idle: 该题目最多保留的空闲工作目录数
+        """
+        try:
+            reusable = self._reset(workspace)
+        except OSError:
+            reusable = False
+        with self._lock:
+            idle = self._idle.setdefault(workspace.project_dir, [])
+            if reusable and len(idle) < max_idle:
+                idle.append(workspace)
+                return
+        self._destroy(workspace)
+
+    @contextmanager
+    def workspace(self, project_dir, digest):
+        """上下文管理器形式：进入时获取工作目录路径，退出时归还"""
+        workspace = self.acquire(project_dir, digest)
+        try:
+            yield workspace.path
+        finally:
+            self.release(workspace)
+
+    def cleanup(self):
+        """删除本进程的全部工作目录"""
+        with self._lock:
+            self._idle.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_workspace_manager():
+    """获取当前进程的工作目录管理器"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = WorkspaceManager()
+            atexit.register(_manager.cleanup)
+        return _manager
+
+
+def write_run_file(path, content):
+    """写入本次运行的文件；先删除同名文件，避免通过硬链接改写题目源文件"""
+    path = Path(path)
+    if path.exists() or path.is_symlink():
+        path.unlink()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+@contextmanager
+def replacing(dest):
+    """
+    产物的原子写入：在同一目录下写入临时文件，成功后替换 dest
+    读取方不会读到写了一半的文件，指向旧文件的硬链接（命中判题缓存的提交）也不受影响
+    """
+    dest = Path(dest)
+    tmp = dest.with_name(f".{dest.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, dest)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+
+
+def link_artifact(src, dest):
+    """将产物以硬链接（不支持时复制）放置到 dest，替换已有文件"""
+    with replacing(dest) as tmp:
+        try:
+            os.link(src, tmp)
+        except OSError:
+            shutil.copyfile(src, tmp)
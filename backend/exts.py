@@ -1,3 +1,62 @@
 from flask_sqlalchemy import SQLAlchemy
- 
-db = SQLAlchemy()
\ No newline at end of file
+from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import os
+import sqlite3
+
+db = SQLAlchemy()
+# 数据库迁移（Alembic），迁移脚本位于 migrations/versions
+migrate = Migrate()
+
+SQLITE_JOURNAL_MODES = ('WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY')
+SQLITE_SYNCHRONOUS = ('OFF', 'NORMAL', 'FULL', 'EXTRA')
+
+
+def database_uri():
+    """数据库地址，来自环境变量 DATABASE_URL，默认使用 SQLite（instance/example.db）"""
+    uri = os.environ.get('DATABASE_URL', 'sqlite:///example.db')
+    # 部分托管平台提供的地址使用 postgres://，SQLAlchemy 只接受 postgresql://
+    if uri.startswith('postgres://'):
+        uri = 'postgresql://' + uri[len('postgres://'):]
+    return uri
+
+
+def engine_options(uri):
+    """
+    数据库连接池配置（环境变量）：
+    DB_POOL_SIZE 常驻连接数，DB_MAX_OVERFLOW 高峰时额外连接数，DB_POOL_TIMEOUT 等待连接的秒数，
+    DB_POOL_RECYCLE 连接最长使用秒数；取出连接前先检测连接是否可用（pool_pre_ping）
+    """
+    options = {'pool_pre_ping': True}
+    # 内存 SQLite 数据库只能使用单个连接
+    if uri.startswith('sqlite') and (uri in ('sqlite://', 'sqlite:///') or ':memory:' in uri):
+        return options
+    options.update(
+        pool_size=int(os.environ.get('DB_POOL_SIZE', 5)),
+        max_overflow=int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+        pool_timeout=int(os.environ.get('DB_POOL_TIMEOUT', 30)),
+        pool_recycle=int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    )
+    return options
+
+
+@event.listens_for(Engine, 'connect')
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    SQLite 连接建立时设置（环境变量）：
+    SQLITE_JOURNAL_MODE 日志模式，默认 WAL，读写互不阻塞，Web 进程的查询不必等待判题进程提交；
+    SQLITE_BUSY_TIMEOUT_MS 遇到写锁时的等待时间，默认 5000，避免并发写入时立即报 database is locked；
+    SQLITE_SYNCHRONOUS 同步级别，默认 NORMAL，WAL 模式下只在检查点时同步，断电最多丢失最近的提交
+    """
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    journal_mode = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL').upper()
+    synchronous = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout={int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))}")
+    if journal_mode in SQLITE_JOURNAL_MODES:
+        cursor.execute(f"PRAGMA journal_mode={journal_mode}")
+    if synchronous in SQLITE_SYNCHRONOUS:
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+    cursor.close()
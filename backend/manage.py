@@ -1,9 +1,33 @@
 import click
+import os
+
 from flask.cli import FlaskGroup
-from app import app
-from models import User, db
+from app import create_app
+from models import User, ErrorCode, SubmissionStatus, db
+from app_judge.node import judge_node_command
+
+app = create_app()
+cli = FlaskGroup(create_app=lambda: app)
+cli.add_command(judge_node_command)
+
+@cli.command('setup')
+def setup():
+    """升级数据库表结构，按题目文件夹导入题目并补齐统计（部署或更新题目后运行）"""
+    from app import prepare_database
+    with app.app_context():
+        prepare_database()
+    click.echo('数据库已升级，题目已导入')
 
-cli = FlaskGroup(app)
+@cli.command('judge')
+@click.option('--workers', type=int, default=None,
+              help='判题进程数，默认为 JUDGE_WORKERS（CPU核心数）；0 为只回收任务，由远程判题节点判题')
+def judge(workers):
+    """作为判题端运行：启动判题进程池，领取 Web 端提交的判题任务"""
+    from app_submit.run_sim import run_judge
+    try:
+        run_judge(app, app.config['JUDGE_WORKERS'] if workers is None else max(0, workers))
+    except KeyboardInterrupt:
+        pass
 
 @cli.command('create-admin')
 @click.argument('username')
@@ -81,5 +105,92 @@ def remove_admin(username):
         db.session.commit()
         click.echo(f'已移除 {username} 的管理员权限')
 
+DATE_FORMATS = ['%Y-%m-%d', '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S']
+
+@cli.command('rejudge')
+@click.option('--problem', 'problems', type=int, multiple=True, help='题目ID，可重复指定')
+@click.option('--status', 'statuses', multiple=True,
+              type=click.Choice([SubmissionStatus.SUCCESS, SubmissionStatus.FAILED]),
+              help='提交状态，可重复指定，默认为全部已完成的提交')
+@click.option('--error-code', 'error_codes', multiple=True,
+              type=click.Choice([code.name for code in ErrorCode], case_sensitive=False),
+              help='原错误码，可重复指定')
+@click.option('--since', type=click.DateTime(DATE_FORMATS), default=None, help='提交时间不早于')
+@click.option('--until', type=click.DateTime(DATE_FORMATS), default=None, help='提交时间早于')
+@click.option('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), show_default=True,
+              help='并发判题进程数')
+@click.option('--no-cache', is_flag=True, help='不使用判题结果缓存')
+@click.option('--state-file', default=None, help='进度文件，默认为 instance/rejudge_state.jsonl')
+@click.option('--restart', is_flag=True, help='忽略已有进度，从头开始')
+@click.option('--dry-run', is_flag=True, help='只列出符合条件的提交数')
+def rejudge(problems, statuses, error_codes, since, until, workers, no_cache, state_file, restart, dry_run):
+    """按条件批量重新判题（修改测试文件后使用），中断后再次运行会从上次的进度继续"""
+    from app_submit.rejudge import select_submissions, RejudgeState, run_rejudge
+    error_codes = tuple(code.upper() for code in error_codes)
+    filters = {
+        "problems": sorted(problems),
+        "statuses": sorted(statuses),
+        "error_codes": sorted(error_codes),
+        "since": since.isoformat() if since else None,
+        "until": until.isoformat() if until else None,
+    }
+    with app.app_context():
+        targets = select_submissions(problems, statuses, error_codes, since, until)
+    click.echo(f'符合条件的提交: {len(targets)}')
+    if dry_run or not targets:
+        return
+
+    state = RejudgeState(state_file or os.path.join(app.instance_path, 'rejudge_state.jsonl'), filters)
+    if not restart and state.load():
+        click.echo(f'从上次进度继续，已完成 {len(state.done)} 个')
+    else:
+        state.reset()
+
+    remaining = sum(1 for sid, _ in targets if sid not in state.done)
+    failures = []
+    with click.progressbar(length=remaining, label='重新判题', show_pos=True) as bar:
+        def on_progress(submission_id, old, new):
+            if isinstance(new, Exception):
+                failures.append((submission_id, new))
+            bar.update(1)
+        try:
+            run_rejudge(app, targets, state, workers, use_cache=not no_cache, on_progress=on_progress)
+        except KeyboardInterrupt:
+            click.echo(f'\n已中断，进度保存在 {state.path}，再次运行相同命令即可继续')
+            return
+
+    if not failures:
+        state.finish()
+    changes = state.changes()
+    changed = sum(len(ids) for ids in changes.values())
+    click.echo(f'完成 {len(state.done)} 个，结果变化 {changed} 个，失败 {len(failures)} 个')
+    for (old, new), ids in sorted(changes.items(), key=lambda item: -len(item[1])):
+        preview = ', '.join(str(i) for i in ids[:20]) + (' ...' if len(ids) > 20 else '')
+        click.echo(f'  {old} -> {new}: {len(ids)} 个 ({preview})')
+    for submission_id, error in failures:
+        click.echo(f'  提交 {submission_id} 重新判题失败: {error}')
+
+@cli.command('rebuild-problem-stats')
+def rebuild_problem_stats():
+    """按提交记录重新统计各题目的提交用户数、通过用户数、提交次数、平均判题耗时与用户完成状态"""
+    from app_submit.problem_stats import rebuild_stats
+    with app.app_context():
+        problems, users = rebuild_stats()
+    click.echo(f'已重新统计 {problems} 个题目，{users} 条用户完成状态')
+
+@cli.command('bench-queries')
+@click.option('--submissions', type=int, default=1000000, show_default=True, help='合成的提交数')
+@click.option('--users', type=int, default=5000, show_default=True, help='合成的用户数')
+@click.option('--problems', type=int, default=100, show_default=True, help='合成的题目数')
+@click.option('--repeat', type=int, default=20, show_default=True, help='每个查询的执行次数（取中位数）')
+@click.option('--db-url', default=None, help='用于测试的空数据库地址，默认在临时目录新建 SQLite 数据库')
+def bench_queries(submissions, users, problems, repeat, db_url):
+    """在合成数据库上对比有无 submission 组合索引时常用查询的执行计划与耗时"""
+    from query_bench import run_benchmark
+    try:
+        run_benchmark(db_url, submissions, users, problems, repeat, echo=click.echo)
+    except ValueError as e:
+        click.echo(f'错误：{e}')
+
 if __name__ == '__main__':
     cli() 
\ No newline at end of file
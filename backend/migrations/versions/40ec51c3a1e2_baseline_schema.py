@@ -0,0 +1,180 @@
+"""baseline schema
+
+迁移系统引入前的表结构。此前数据库由 db.create_all() 建立，已存在的表与索引会被跳过，
+因此旧数据库可以直接升级，不需要先 stamp。
+
+Revision ID: 40ec51c3a1e2
+Revises: 
+Create Date: 2026-10-18 12:48:47.742639
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '40ec51c3a1e2'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def _create_table(name, *args):
+    if not sa.inspect(op.get_bind()).has_table(name):
+        op.create_table(name, *args)
+
+
+def _create_index(table, name, columns):
+    if name not in {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}:
+        op.create_index(name, table, columns, unique=False)
+
+
+def upgrade():
+    _create_table('problem',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('folder_path', sa.String(length=200), nullable=False),
+    sa.Column('title', sa.String(length=100), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('code_temp', sa.Text(), nullable=True),
+    sa.Column('difficulty', sa.String(length=20), nullable=True),
+    sa.Column('tags', sa.String(length=200), nullable=True),
+    sa.Column('pre_problems', sa.String(length=200), nullable=True),
+    sa.Column('next_problems', sa.String(length=200), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _create_table('user',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('username', sa.String(length=80), nullable=False),
+    sa.Column('email', sa.String(length=120), nullable=True),
+    sa.Column('password_hash', sa.String(length=128), nullable=False),
+    sa.Column('is_admin', sa.Boolean(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('email'),
+    sa.UniqueConstraint('username')
+    )
+    _create_table('problem_stats',
+    sa.Column('problem_id', sa.Integer(), nullable=False),
+    sa.Column('submitted_users', sa.Integer(), nullable=False),
+    sa.Column('passed_users', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('judged_count', sa.Integer(), nullable=False),
+    sa.Column('judge_ms_total', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['problem_id'], ['problem.id'], ),
+    sa.PrimaryKeyConstraint('problem_id')
+    )
+    _create_table('submission',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('problem_id', sa.Integer(), nullable=True),
+    sa.Column('code', sa.Text(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('error_code', sa.String(length=20), nullable=True),
+    sa.Column('log_path', sa.String(length=200), nullable=True),
+    sa.Column('waveform_path', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['problem_id'], ['problem.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _create_table('user_code',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('problem_id', sa.Integer(), nullable=False),
+    sa.Column('draft_code', sa.Text(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['problem_id'], ['problem.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'problem_id')
+    )
+    _create_table('user_problem_status',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('problem_id', sa.Integer(), nullable=False),
+    sa.Column('best_status', sa.String(length=20), nullable=True),
+    sa.Column('latest_submission_id', sa.Integer(), nullable=True),
+    sa.Column('latest_status', sa.String(length=20), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('first_solved_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['problem_id'], ['problem.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('user_id', 'problem_id')
+    )
+    _create_table('verdict_cache',
+    sa.Column('problem_hash', sa.String(length=64), nullable=False),
+    sa.Column('code_hash', sa.String(length=64), nullable=False),
+    sa.Column('problem_id', sa.Integer(), nullable=True),
+    sa.Column('error_code', sa.String(length=20), nullable=False),
+    sa.Column('log_path', sa.String(length=200), nullable=True),
+    sa.Column('waveform_path', sa.String(length=200), nullable=True),
+    sa.Column('source_submission_id', sa.Integer(), nullable=True),
+    sa.Column('hit_count', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['problem_id'], ['problem.id'], ),
+    sa.PrimaryKeyConstraint('problem_hash', 'code_hash')
+    )
+    _create_index('verdict_cache', 'ix_verdict_cache_problem_id', ['problem_id'])
+
+    _create_table('judge_case',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('submission_id', sa.Integer(), nullable=True),
+    sa.Column('case_index', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=50), nullable=False),
+    sa.Column('hidden', sa.Boolean(), nullable=True),
+    sa.Column('error_code', sa.String(length=20), nullable=True),
+    sa.Column('compile_ms', sa.Integer(), nullable=True),
+    sa.Column('simulate_ms', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['submission_id'], ['submission.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    _create_index('judge_case', 'ix_judge_case_submission_id', ['submission_id'])
+
+    _create_table('judge_job',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('submission_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('lease_owner', sa.String(length=100), nullable=True),
+    sa.Column('lease_expires_at', sa.DateTime(), nullable=True),
+    sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('claimed_at', sa.DateTime(), nullable=True),
+    sa.Column('finished_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['submission_id'], ['submission.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('submission_id')
+    )
+    _create_index('judge_job', 'ix_judge_job_status', ['status'])
+
+    _create_table('judge_metrics',
+    sa.Column('submission_id', sa.Integer(), nullable=False),
+    sa.Column('queued_ms', sa.Integer(), nullable=True),
+    sa.Column('setup_ms', sa.Integer(), nullable=True),
+    sa.Column('compile_ms', sa.Integer(), nullable=True),
+    sa.Column('simulate_ms', sa.Integer(), nullable=True),
+    sa.Column('check_ms', sa.Integer(), nullable=True),
+    sa.Column('artifact_ms', sa.Integer(), nullable=True),
+    sa.Column('total_ms', sa.Integer(), nullable=True),
+    sa.Column('child_cpu_ms', sa.Integer(), nullable=True),
+    sa.Column('peak_rss_kb', sa.Integer(), nullable=True),
+    sa.Column('cache_hit', sa.Boolean(), nullable=True),
+    sa.Column('worker', sa.String(length=100), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['submission_id'], ['submission.id'], ),
+    sa.PrimaryKeyConstraint('submission_id')
+    )
+
+
+def downgrade():
+    op.drop_table('judge_metrics')
+    op.drop_index('ix_judge_job_status', table_name='judge_job')
+    op.drop_table('judge_job')
+    op.drop_index('ix_judge_case_submission_id', table_name='judge_case')
+    op.drop_table('judge_case')
+    op.drop_index('ix_verdict_cache_problem_id', table_name='verdict_cache')
+    op.drop_table('verdict_cache')
+    op.drop_table('user_problem_status')
+    op.drop_table('user_code')
+    op.drop_table('submission')
+    op.drop_table('problem_stats')
+    op.drop_table('user')
+    op.drop_table('problem')
@@ -12,8 +12,6 @@ from flask_login import current_user
 # 项目根目录
 BASE_DIR = Path(__file__).resolve().parent
 PROB_DIR = BASE_DIR/"Prob"
-IVERILOG = BASE_DIR/"iverilog"/"bin"/"iverilog.exe"
-VVP = BASE_DIR/"iverilog"/"bin"/"vvp.exe"
 
 
 class ErrorCode(IntEnum):
@@ -30,7 +28,7 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)                        # 用户ID
     username = db.Column(db.String(80), unique=True, nullable=False)    # 用户名
     email = db.Column(db.String(120), unique=True, nullable=True)       # 新增邮箱字段
-    password_hash = db.Column(db.String(128), nullable=False)           # 密码哈希值
+    password_hash = db.Column(db.String(256), nullable=False)           # 密码哈希值（scrypt 哈希约 160 字符）
     is_admin = db.Column(db.Boolean, default=False)  # 新增管理员字段
     def get_id(self):
         return str(self.id)               
@@ -52,12 +50,17 @@ class SubmissionStatus():
     RUNNING = 'running'
     SUCCESS = 'success'
     FAILED = 'failed'
+    CANCELLED = 'cancelled'     # 被同一用户对同一题目的新提交取代，未判题
 
 class SimulationResult:
     def __init__(self):
         self.error_code = ErrorCode.ERROR_UNKNOWN
         self.log_path = ""
         self.waveform_path = ""
+        self.cache_hit = False          # 是否命中判题结果缓存
+        self.metrics = None             # 判题耗时与资源统计（RunMetrics）
+        self.cases = None               # 多测试用例题目各用例的结果（[CaseRun]）
+        self.source_submission_id = None    # 命中缓存时首次判题的提交ID
 
 
 class Problem(db.Model):
@@ -80,7 +83,178 @@ class Submission(db.Model):
     error_code = db.Column(db.String(20), nullable=True)            # 错误码（与ErrorCode对应）
     log_path = db.Column(db.String(200), nullable=True)             # 限制路径长度
     waveform_path = db.Column(db.String(200), nullable=True)        # 限制路径长度
-    created_at = db.Column(db.DateTime, default=datetime.now())     # 添加默认时间
+    created_at = db.Column(db.DateTime, default=datetime.now)       # 添加默认时间
+
+    __table_args__ = (
+        db.Index('ix_submission_user_created', 'user_id', 'created_at'),                    # 用户的提交历史
+        db.Index('ix_submission_user_problem_created', 'user_id', 'problem_id', 'created_at'),  # 用户对某题的提交
+        db.Index('ix_submission_problem_status_user', 'problem_id', 'status', 'user_id'),   # 按题目与状态统计用户
+        db.Index('ix_submission_status', 'status'),                                          # 排队中/运行中的提交
+    )
+
+class JudgeJobStatus():
+    PENDING = 'pending'     # 等待判题进程领取
+    LEASED = 'leased'       # 已被判题进程领取，租约有效期内由其负责
+    DONE = 'done'           # 已写回判题结果
+    CANCELLED = 'cancelled' # 等待期间被同一用户的新提交取代
+
+class JudgeJob(db.Model):
+    """持久化的判题任务，判题进程通过租约领取，租约过期的任务会被重新排队"""
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), unique=True, nullable=False)  # 对应的提交
+    status = db.Column(db.String(20), default=JudgeJobStatus.PENDING, index=True)   # 任务状态
+    lease_owner = db.Column(db.String(100), nullable=True)          # 持有租约的判题进程
+    lease_expires_at = db.Column(db.DateTime, nullable=True)        # 租约到期时间
+    heartbeat_at = db.Column(db.DateTime, nullable=True)            # 最近一次心跳
+    attempts = db.Column(db.Integer, default=0)                     # 领取次数
+    created_at = db.Column(db.DateTime, default=datetime.now)       # 入队时间
+    claimed_at = db.Column(db.DateTime, nullable=True)              # 最近一次领取时间
+    finished_at = db.Column(db.DateTime, nullable=True)             # 完成时间
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)  # 最近一次状态变化
+
+class WaveformJobStatus():
+    PENDING = 'pending'     # 等待判题端领取
+    LEASED = 'leased'       # 正在重新仿真生成波形
+    DONE = 'done'           # 已生成
+    FAILED = 'failed'       # 多次生成失败，不再重试（重新判题后可再次请求）
+
+class WaveformJob(db.Model):
+    """按需生成波形的任务：Web 进程请求波形时入队，由判题端领取并重新仿真，Web 进程不运行仿真"""
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), primary_key=True)  # 对应的提交
+    status = db.Column(db.String(20), default=WaveformJobStatus.PENDING, index=True)    # 任务状态
+    lease_owner = db.Column(db.String(100), nullable=True)          # 正在生成的判题端
+    lease_expires_at = db.Column(db.DateTime, nullable=True)        # 租约到期时间，过期后可被重新领取
+    attempts = db.Column(db.Integer, default=0)                     # 领取次数
+    created_at = db.Column(db.DateTime, default=datetime.now)       # 入队时间
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)  # 最近一次状态变化
+
+class JudgeEvent(db.Model):
+    """
+    提交状态变化事件，与状态变化在同一事务中写入，各 Web 进程与判题端按 id 顺序读取（见 app_submit/events.py）
+    只保留最近一段时间，不设外键，删除提交时无需清理
+    """
+    # SQLite 默认会在删除最大的 id 后重用，读取方按 id 递增读取，必须使用 AUTOINCREMENT
+    __table_args__ = {'sqlite_autoincrement': True}
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, nullable=False)           # 提交ID
+    user_id = db.Column(db.Integer, nullable=True)                  # 提交进入等待队列时记录，用于计算排队位置
+    status = db.Column(db.String(20), nullable=False)               # 新状态
+    error_code = db.Column(db.String(20), nullable=True)            # 错误码
+    created_at = db.Column(db.DateTime, default=datetime.now, index=True)
+
+class SubmitBucket(db.Model):
+    """
+    提交限流的令牌桶，各 Web 进程共享，以条件更新原子地取令牌（见 app_submit/scheduling.py）
+    不设外键，删除用户时无需清理，长时间未使用的令牌桶会被删除
+    """
+    user_id = db.Column(db.Integer, primary_key=True)               # 用户ID
+    kind = db.Column(db.String(20), primary_key=True)               # 限流类别：submit 提交 / check 语法检查
+    tokens = db.Column(db.Float, nullable=False)                    # 上次更新时的令牌数
+    updated = db.Column(db.Float, nullable=False, index=True)       # 上次更新时间（Unix 时间戳，秒）
+
+class JudgeMetrics(db.Model):
+    """单次判题的阶段耗时（毫秒）与子进程资源统计"""
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), primary_key=True)
+    queued_ms = db.Column(db.Integer, nullable=True)        # 排队时间
+    setup_ms = db.Column(db.Integer, nullable=True)         # 准备工作目录
+    compile_ms = db.Column(db.Integer, nullable=True)       # 编译
+    simulate_ms = db.Column(db.Integer, nullable=True)      # 仿真
+    check_ms = db.Column(db.Integer, nullable=True)         # 结果检查
+    artifact_ms = db.Column(db.Integer, nullable=True)      # 转移日志与波形
+    total_ms = db.Column(db.Integer, nullable=True)         # 判题总耗时（不含排队）
+    child_cpu_ms = db.Column(db.Integer, nullable=True)     # iverilog/vvp 子进程 CPU 时间
+    peak_rss_kb = db.Column(db.Integer, nullable=True)      # iverilog/vvp 子进程峰值内存
+    cache_hit = db.Column(db.Boolean, default=False)        # 是否命中判题结果缓存
+    worker = db.Column(db.String(100), nullable=True)       # 执行判题的进程
+    created_at = db.Column(db.DateTime, default=datetime.now)
+
+    def to_dict(self):
+        return {
+            "queued_ms": self.queued_ms,
+            "setup_ms": self.setup_ms,
+            "compile_ms": self.compile_ms,
+            "simulate_ms": self.simulate_ms,
+            "check_ms": self.check_ms,
+            "artifact_ms": self.artifact_ms,
+            "total_ms": self.total_ms,
+            "child_cpu_ms": self.child_cpu_ms,
+            "peak_rss_kb": self.peak_rss_kb,
+            "cache_hit": self.cache_hit
+        }
+
+class JudgeCase(db.Model):
+    """多测试用例题目中每个用例的判定与耗时"""
+    id = db.Column(db.Integer, primary_key=True)
+    submission_id = db.Column(db.Integer, db.ForeignKey('submission.id'), index=True)
+    case_index = db.Column(db.Integer, nullable=False)              # 用例在 judge.json 中的顺序
+    name = db.Column(db.String(50), nullable=False)                 # 用例名
+    hidden = db.Column(db.Boolean, default=False)                   # 是否为隐藏用例
+    error_code = db.Column(db.String(20), nullable=True)            # 错误码，为空表示被提前终止
+    compile_ms = db.Column(db.Integer, nullable=True)               # 编译耗时
+    simulate_ms = db.Column(db.Integer, nullable=True)              # 仿真耗时
+    child_cpu_ms = db.Column(db.Integer, nullable=True)             # 本用例 iverilog/vvp 子进程 CPU 时间
+    peak_rss_kb = db.Column(db.Integer, nullable=True)              # 本用例 iverilog/vvp 子进程峰值内存
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "hidden": self.hidden,
+            "error_code": self.error_code,
+            "compile_ms": self.compile_ms,
+            "simulate_ms": self.simulate_ms,
+            "child_cpu_ms": self.child_cpu_ms,
+            "peak_rss_kb": self.peak_rss_kb
+        }
+
+class ProblemStats(db.Model):
+    """题目统计，提交与写回判题结果时增量更新（见 app_submit/problem_stats.py）"""
+    problem_id = db.Column(db.Integer, db.ForeignKey('problem.id'), primary_key=True)  # ProbID
+    submitted_users = db.Column(db.Integer, nullable=False, default=0)  # 提交过的用户数
+    passed_users = db.Column(db.Integer, nullable=False, default=0)     # 通过的用户数
+    attempts = db.Column(db.Integer, nullable=False, default=0)         # 提交次数
+    judged_count = db.Column(db.Integer, nullable=False, default=0)     # 有耗时统计的判题次数（含重新判题）
+    judge_ms_total = db.Column(db.BigInteger, nullable=False, default=0)    # 判题总耗时
+
+    def to_dict(self):
+        return {
+            "submitted_users_count": self.submitted_users or 0,
+            "passed_users_count": self.passed_users or 0,
+            "attempts": self.attempts or 0,
+            "avg_judge_ms": round(self.judge_ms_total / self.judged_count) if self.judged_count else None
+        }
+
+class UserProblemStatus(db.Model):
+    """用户对各题目的完成情况，提交与写回判题结果时增量更新（见 app_submit/problem_stats.py）"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)         # 用户ID
+    problem_id = db.Column(db.Integer, db.ForeignKey('problem.id'), primary_key=True)   # ProbID
+    best_status = db.Column(db.String(20), nullable=True)       # 最好的判题结果：success/failed，尚无结果时为空
+    latest_submission_id = db.Column(db.Integer, nullable=True) # 最近一次提交
+    latest_status = db.Column(db.String(20), nullable=True)     # 最近一次提交的状态
+    attempts = db.Column(db.Integer, nullable=False, default=0) # 提交次数
+    first_solved_at = db.Column(db.DateTime, nullable=True)     # 首次通过的提交时间
+    updated_at = db.Column(db.DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def completion_status(self):
+        """完成状态字符串（"已完成"、"失败"、"运行中"、"未完成"）"""
+        if self.best_status == SubmissionStatus.SUCCESS:
+            return "已完成"
+        if self.latest_status == SubmissionStatus.FAILED:
+            return "失败"
+        if self.latest_status in (SubmissionStatus.QUEUED, SubmissionStatus.RUNNING):
+            return "运行中"
+        return "未完成"
+
+class VerdictCache(db.Model):
+    """判题结果缓存，以题目工程哈希与规范化后的用户代码哈希为键"""
+    problem_hash = db.Column(db.String(64), primary_key=True)       # project/ 目录内容哈希
+    code_hash = db.Column(db.String(64), primary_key=True)          # 规范化用户代码哈希
+    problem_id = db.Column(db.Integer, db.ForeignKey('problem.id'), index=True)  # ProbID
+    error_code = db.Column(db.String(20), nullable=False)           # 错误码（与ErrorCode对应）
+    log_path = db.Column(db.String(200), nullable=True)             # 首次判题生成的日志
+    waveform_path = db.Column(db.String(200), nullable=True)        # 首次判题生成的波形
+    source_submission_id = db.Column(db.Integer, nullable=True)     # 首次判题的提交ID
+    hit_count = db.Column(db.Integer, default=0)                    # 命中次数
+    created_at = db.Column(db.DateTime, default=datetime.now)
 
 
 def login_required(func):
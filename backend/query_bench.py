@@ -0,0 +1,154 @@
+"""
+常用查询的基准测试（manage.py bench-queries）
+在一个新的合成数据库中生成大量提交记录，分别在没有与有 submission 组合索引时
+输出各常用查询的执行计划与耗时，用于确认索引被使用以及评估新的查询。
+只在空数据库上运行，不会修改 Web 应用使用的数据库。
+"""
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, inspect, select, func, text
+from exts import db
+from models import User, Problem, Submission, SubmissionStatus
+
+# 被测的组合索引（与 models.Submission.__table_args__ 及迁移 9907b8b388e2 一致）
+INDEXES = [index for index in Submission.__table__.indexes if index.name.startswith("ix_submission_")]
+# 提交状态的分布
+STATUS_WEIGHTS = [
+    (SubmissionStatus.FAILED, 60),
+    (SubmissionStatus.SUCCESS, 35),
+    (SubmissionStatus.CANCELLED, 4),
+    (SubmissionStatus.QUEUED, 1),
+]
+BATCH_SIZE = 50000
+
+
+def _queries():
+    """(名称, 对应的接口或用途, 语句构造函数(user_id, problem_id))"""
+    s = Submission.__table__.c
+    return [
+        ("user_submissions", "GET /submission/",
+         lambda u, p: select(s.id, s.created_at, s.status).where(s.user_id == u).order_by(s.created_at.desc())),
+        ("submit_history", "GET /problem/<id>/submit_history",
+         lambda u, p: select(s.id, s.created_at, s.status).where(s.user_id == u, s.problem_id == p)
+         .order_by(s.created_at.desc())),
+        ("completion_success", "用户是否通过（重新判题后更新完成状态）",
+         lambda u, p: select(func.min(s.created_at)).where(s.user_id == u, s.problem_id == p,
+                                                           s.status == SubmissionStatus.SUCCESS)),
+        ("problem_submitted_users", "题目提交用户数（原题目列表逐题统计）",
+         lambda u, p: select(func.count(func.distinct(s.user_id))).where(s.problem_id == p)),
+        ("problem_passed_users", "题目通过用户数（原题目列表逐题统计）",
+         lambda u, p: select(func.count(func.distinct(s.user_id))).where(s.problem_id == p,
+                                                                         s.status == SubmissionStatus.SUCCESS)),
+        ("unfinished", "回收租约时查找排队中/运行中的提交",
+         lambda u, p: select(s.id).where(s.status.in_([SubmissionStatus.QUEUED, SubmissionStatus.RUNNING]))),
+    ]
+
+
+def _populate(engine, submissions, users, problems, seed):
+    rng = random.Random(seed)
+    statuses = [status for status, _ in STATUS_WEIGHTS]
+    weights = [weight for _, weight in STATUS_WEIGHTS]
+    start = datetime(2024, 1, 1)
+    table = Submission.__table__
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(),
+                     [{"id": i, "username": f"user{i}", "password_hash": ""} for i in range(1, users + 1)])
+        conn.execute(Problem.__table__.insert(),
+                     [{"id": i, "folder_path": f"exp{i}"} for i in range(1, problems + 1)])
+    for offset in range(0, submissions, BATCH_SIZE):
+        rows = []
+        for i in range(offset, min(offset + BATCH_SIZE, submissions)):
+            rows.append({
+                "id": i + 1,
+                "user_id": rng.randint(1, users),
+                "problem_id": rng.randint(1, problems),
+                "code": "",
+                "status": rng.choices(statuses, weights)[0],
+                "created_at": start + timedelta(seconds=i * 30),
+            })
+        with engine.begin() as conn:
+            conn.execute(table.insert(), rows)
+
+
+def _explain(conn, statement):
+    compiled = statement.compile(dialect=conn.dialect, compile_kwargs={"literal_binds": True})
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    rows = conn.execute(text(prefix + str(compiled))).fetchall()
+    # SQLite 返回 (id, parent, notused, detail)，其他数据库每行一列
+    return [row[-1] for row in rows]
+
+
+def _measure(engine, users, problems, repeat, seed):
+    """:return: {名称: (执行计划, 耗时中位数 ms)}"""
+    rng = random.Random(seed)
+    params = [(rng.randint(1, users), rng.randint(1, problems)) for _ in range(repeat)]
+    results = {}
+    with engine.connect() as conn:
+        for name, _, build in _queries():
+            plan = _explain(conn, build(*params[0]))
+            timings = []
+            for user_id, problem_id in params:
+                started = time.perf_counter()
+                conn.execute(build(user_id, problem_id)).fetchall()
+                timings.append((time.perf_counter() - started) * 1000)
+            results[name] = (plan, statistics.median(timings))
+    return results
+
+
+def _analyze(engine):
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+
+
+def run_benchmark(db_url=None, submissions=1000000, users=5000, problems=100, repeat=20, seed=1, echo=print):
+    """
+    在合成数据库上对比有无组合索引时常用查询的执行计划与耗时
+    :param db_url: 数据库地址，默认在临时目录新建 SQLite 数据库；必须是空数据库
+    :return: {名称: {"before": (计划, ms), "after": (计划, ms)}}
+    :raises ValueError: 数据库中已有表
+    """
+    tmp_path = None
+    if db_url is None:
+        fd, tmp_path = tempfile.mkstemp(prefix="query_bench_", suffix=".db")
+        os.close(fd)
+        db_url = f"sqlite:///{tmp_path}"
+    engine = create_engine(db_url)
+    try:
+        if inspect(engine).get_table_names():
+            raise ValueError("基准测试只能在空数据库上运行")
+        db.metadata.create_all(engine)
+        with engine.begin() as conn:
+            for index in INDEXES:
+                index.drop(conn)
+        echo(f"生成 {submissions} 条提交（{users} 个用户，{problems} 道题目）...")
+        started = time.perf_counter()
+        _populate(engine, submissions, users, problems, seed)
+        _analyze(engine)
+        echo(f"数据生成耗时 {time.perf_counter() - started:.1f} s")
+        before = _measure(engine, users, problems, repeat, seed)
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            for index in INDEXES:
+                index.create(conn)
+        _analyze(engine)
+        echo(f"创建索引耗时 {time.perf_counter() - started:.1f} s")
+        after = _measure(engine, users, problems, repeat, seed)
+    finally:
+        engine.dispose()
+        if tmp_path:
+            os.remove(tmp_path)
+
+    results = {}
+    for name, purpose, _ in _queries():
+        results[name] = {"before": before[name], "after": after[name]}
+        (plan_before, ms_before), (plan_after, ms_after) = before[name], after[name]
+        echo(f"\n[{name}] {purpose}")
+        echo(f"  无索引 {ms_before:9.2f} ms  " + " | ".join(plan_before))
+        echo(f"  有索引 {ms_after:9.2f} ms  " + " | ".join(plan_after))
+        if ms_after > 0:
+            echo(f"  加速 {ms_before / ms_after:.1f}x")
+    return results
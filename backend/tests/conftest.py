@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# 测试从 backend 目录导入应用模块
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,53 @@
+"""编译前检查：宏调用交由编译器判断，不误报括号不配对"""
+import pytest
+from app_submit.lint import lint_code, tokenize, LintSkipped
+
+
+def test_macro_in_condition():
+    code = """
+module top(input clk, input rst, output reg q);
+    always @(posedge clk) begin
+        if (`RESET_ACTIVE) begin
+            q <= 0;
+        end
+    end
+endmodule
+"""
+    assert lint_code(code) == []
+
+
+def test_macro_in_port_range():
+    code = """
+module top(
+    input [`W-1:0] in,
+    output [`W-1:0] out
+);
+    assign out = in;
+endmodule
+"""
+    assert lint_code(code) == []
+
+
+def test_macro_in_parameter_default():
+    code = """
+module top #(parameter W = `WIDTH) (input [W-1:0] a, output [W-1:0] y);
+    assign y = a;
+endmodule
+"""
+    assert lint_code(code) == []
+
+
+def test_macro_skips_lint():
+    with pytest.raises(LintSkipped):
+        tokenize("module top; wire [`W:0] a; endmodule")
+
+
+def test_line_directive_ignored():
+    code = """`timescale 1ns / 1ps
+`default_nettype none
+module top(input a, output y);
+    assign y = a;
+endmodule
+"""
+    assert lint_code(code) == []
+    assert lint_code("`timescale 1ns / 1ps\nmodule top(input a;\nendmodule\n")
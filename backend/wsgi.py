@@ -0,0 +1,8 @@
+"""
+Web 端入口，供 gunicorn 等 WSGI 服务器使用，例如：
+gunicorn -w 4 -k gthread --threads 32 -b 0.0.0.0:5000 wsgi:app
+判题端另行运行 python manage.py judge，部署前运行 python manage.py setup 升级数据库并导入题目
+"""
+from app import create_app
+
+app = create_app()
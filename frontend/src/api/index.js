@@ -35,6 +35,11 @@ export const problemApi = {
         return apiClient.post(`/problem/${id}/submit`, { code });
     },
 
+    // 语法检查（只编译不仿真）
+    checkSyntax(id, code) {
+        return apiClient.post(`/problem/${id}/check`, { code });
+    },
+
     // 获取题目状态
     getProblemStatus() {
         return apiClient.get('/problem/status');
@@ -93,12 +98,28 @@ export const userApi = {
     }
 };
 
+// 提交的最终状态，收到后服务端结束状态推送
+export const FINAL_STATUSES = ['success', 'failed', 'cancelled'];
+
 export const submissionApi = {
     // 获取提交状态
     getSubmission(submissionId) {
         return apiClient.get(`/submission/${submissionId}`);
     },
 
+    // 订阅提交状态变化（Server-Sent Events），onStatus 收到 { status, error_code, position }
+    subscribeSubmission(submissionId, onStatus) {
+        const source = new EventSource(`${apiClient.defaults.baseURL}/submission/${submissionId}/events`, { withCredentials: true });
+        source.addEventListener('status', (event) => {
+            const data = JSON.parse(event.data);
+            onStatus(data);
+            if (FINAL_STATUSES.includes(data.status)) {
+                source.close();
+            }
+        });
+        return source;
+    },
+
     // 获取日志
     getSubmissionLog(submissionId) {
         return apiClient.get(`/submission/${submissionId}/log`);
@@ -109,6 +130,18 @@ export const submissionApi = {
         return apiClient.get(`/submission/${submissionId}/waveform`);
     },
 
+    // 获取波形信号列表与时间范围
+    getWaveformIndex(submissionId) {
+        return apiClient.get(`/submission/${submissionId}/waveform/index`);
+    },
+
+    // 按信号和时间窗口查询波形
+    queryWaveform(submissionId, signals, { start, end, maxPoints } = {}) {
+        return apiClient.get(`/submission/${submissionId}/waveform/query`, {
+            params: { signals: signals.join(','), start, end, max_points: maxPoints }
+        });
+    },
+
     // 获取用户历史提交记录
     getUserSubmissions() {
         return apiClient.get('/submission');